@@ -0,0 +1,58 @@
+"""
+Compares compiling the pages of a query with and without a
+:py:class:`.FragmentCache`, with which a page only compiles its ordering and
+limits, e.g.
+
+::
+
+    $ python -m benchmarks.bench_pagination
+
+"""
+import timeit
+
+from sqlquery.queryapi import select, COUNT, DESC, FragmentCache
+
+
+NUMBER = 200
+
+PAGES = 50
+
+
+def _base():
+    return select("score", COUNT("id")).on_table("users").join(
+        "logins", "id", "user_id"
+    ).where(
+        ("tenant_id__eq", 7),
+        ("deleted__is", None),
+        ("kind__in", ["a", "b", "c", "d"]),
+        ("logins.day__gte", "2026-01-01"),
+        ("logins.country__in", ["de", "fr", "gb", "nl", "us"]),
+    ).group_by("score").having(("score__gt", 5))
+
+
+def _pages(query, **kwargs):
+    for page in range(PAGES):
+        query.order_by(DESC("score")).limit(20).offset(page * 20).sql(
+            **kwargs
+        )
+
+
+def main():
+    query = _base()
+    cache = FragmentCache()
+    page = query.order_by(DESC("score")).limit(20).offset(40)
+    assert page.sql() == page.sql(fragment_cache=cache)
+
+    for label, statement in (
+        ("QueryBuilder.sql()", lambda: _pages(query)),
+        ("with a FragmentCache", lambda: _pages(query, fragment_cache=cache)),
+    ):
+        seconds = timeit.timeit(statement, number=NUMBER)
+        print("{:<26} {:>8.2f} us/page".format(
+            label, seconds / NUMBER / PAGES * 1e6
+        ))
+    print("{:<26} {:>8.1%}".format("hit rate", cache.hit_rate))
+
+
+if __name__ == '__main__':
+    main()
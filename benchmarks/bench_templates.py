@@ -0,0 +1,42 @@
+"""
+Compares building a query with :py:meth:`.QueryBuilder.sql` against binding
+a compiled template, e.g.
+
+::
+
+    $ python -m benchmarks.bench_templates
+
+"""
+import timeit
+
+from sqlquery.queryapi import select, Param, DESC
+from sqlquery.templates import QueryTemplate
+
+
+NUMBER = 20000
+
+
+def _builder(name, limit):
+    return select("id", "name", "email").on_table("users").where(
+        ("name__eq", name), ("active__eq", 1), ("tenant_id__in", [1, 2, 3])
+    ).order_by(DESC("created")).limit(limit)
+
+
+def main():
+    template = QueryTemplate.from_builder(_builder(Param("name"), Param("n")))
+    bind = template.function()
+    assert bind(name="bob", n=10) == _builder("bob", 10).sql()
+
+    for label, statement in (
+        ("QueryBuilder.sql()", lambda: _builder("bob", 10).sql()),
+        ("QueryTemplate.bind()", lambda: template.bind(name="bob", n=10)),
+        ("QueryTemplate.function()", lambda: bind(name="bob", n=10)),
+    ):
+        seconds = timeit.timeit(statement, number=NUMBER)
+        print("{:<26} {:>8.2f} us/query".format(
+            label, seconds / NUMBER * 1e6
+        ))
+
+
+if __name__ == '__main__':
+    main()
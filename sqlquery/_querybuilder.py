@@ -1,11 +1,16 @@
 import string
 import itertools
 import collections
+import operator
+import threading
+from collections import OrderedDict
 from collections import namedtuple
 from sqlquery.sqlencoding import BasicEncodings
 from sqlquery.sqlencoding import Literal
+from sqlquery.rowdecoding import RowDecoder
+from sqlquery.bulkload import BulkLoad, BULK_LOAD_FORMATS
 
-from six import string_types
+from six import binary_type, integer_types, string_types, text_type
 
 
 class InvalidQueryException(Exception):
@@ -16,6 +21,19 @@ class InvalidQueryException(Exception):
     pass
 
 
+class QueryTooLargeException(InvalidQueryException):
+    """
+    Raised when a query exceeds the *max_bytes* or *max_args* given to
+    :py:meth:`.QueryBuilder.sql`. *estimate* is the :py:class:`.SizeEstimate`
+    which exceeded the limits. For an insert, *rows* is the number of rows
+    which fit within the limits, otherwise it's `None`.
+    """
+    def __init__(self, message, estimate, rows=None):
+        super(QueryTooLargeException, self).__init__(message)
+        self.estimate = estimate
+        self.rows = rows
+
+
 def logical_and(conditions):
     return _LogicalOperator(conditions, "and")
 
@@ -44,6 +62,18 @@ def sum(field):
     return SQLFunction("sum", field)
 
 
+def row_number():
+    return SQLFunction("row_number")
+
+
+def rank():
+    return SQLFunction("rank")
+
+
+def dense_rank():
+    return SQLFunction("dense_rank")
+
+
 def utcnow():
     return SQLFunction("utcnow")
 
@@ -52,6 +82,79 @@ def unix_timestamp():
     return SQLFunction("unix_timestamp")
 
 
+def parse_field_spec(field_spec):
+    """
+    Returns (field, op)
+    """
+    try:
+        field, op = field_spec.split('__')
+        return field, op
+    except ValueError:
+        raise InvalidQueryException(
+            "Invalid where clause <{}>".format(field_spec)
+        )
+
+
+def parse_condition(clause):
+    """
+    Returns (field, op, value) for a single `where`/`having` condition
+    """
+    if isinstance(clause, dict):
+        assert len(clause) == 1
+        clause = list(clause.items())[0]
+
+    if isinstance(clause, (tuple, list)):
+        if len(clause) == 3:
+            return clause
+        if len(clause) == 2:
+            field_op, value = clause
+            field, op = parse_field_spec(field_op)
+            return field, op, value
+
+    raise InvalidQueryException("Unknown where element %s" % (clause,))
+
+
+def extend_conditions(where, conditions):
+    """
+    Returns a condition requiring both the *where* condition, which may be
+    `None`, and all of *conditions*.
+    """
+    conditions = tuple(conditions)
+    if where is not None:
+        if where.operator == "and":
+            conditions = tuple(where.conditions) + conditions
+        else:
+            conditions = (where,) + conditions
+    return logical_and(conditions)
+
+
+def result_column_name(field):
+    """
+    Returns the name of the result column for a selected *field*
+    """
+    if isinstance(field, (_Field, _WindowFunction)):
+        return result_column_name(getattr(field, 'field', field.function))
+
+    if isinstance(field, _ArithmeticExpression):
+        return u"_".join(
+            result_column_name(operand) if isinstance(
+                operand, (string_types, _ArithmeticOperators)
+            ) else u"{}".format(operand)
+            for operand in (field.left, field.operator, field.right)
+        )
+
+    if isinstance(field, SQLFunction):
+        return u"_".join(
+            [field.function] +
+            [
+                result_column_name(sub_field) for sub_field in field.fields
+                if not isinstance(sub_field, Literal)
+            ]
+        )
+
+    return field.rsplit('.', 1)[-1]
+
+
 def order_descending(field):
     return _SQLOrdering(field, "desc")
 
@@ -61,16 +164,150 @@ def order_ascending(field):
 
 
 class _LogicalOperator(object):
+    # the SQL compiled for the node by compilation context, for interned
+    # nodes only, see `sqlquery.interning`
+    _fragments = None
+
     def __init__(self, conditions, operator):
         self.conditions = conditions
         self.operator = operator
 
 
-class SQLFunction(object):
+class _ArithmeticOperators(object):
+    """
+    Allows arithmetic on columns, functions and expressions with the python
+    operators, creating an :py:class:`._ArithmeticExpression`.
+    """
+    def __add__(self, other):
+        return _ArithmeticExpression("add", self, other)
+
+    def __radd__(self, other):
+        return _ArithmeticExpression("add", other, self)
+
+    def __sub__(self, other):
+        return _ArithmeticExpression("sub", self, other)
+
+    def __rsub__(self, other):
+        return _ArithmeticExpression("sub", other, self)
+
+    def __mul__(self, other):
+        return _ArithmeticExpression("mult", self, other)
+
+    def __rmul__(self, other):
+        return _ArithmeticExpression("mult", other, self)
+
+    def __truediv__(self, other):
+        return _ArithmeticExpression("div", self, other)
+
+    def __rtruediv__(self, other):
+        return _ArithmeticExpression("div", other, self)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __floordiv__(self, other):
+        return _ArithmeticExpression("idiv", self, other)
+
+    def __rfloordiv__(self, other):
+        return _ArithmeticExpression("idiv", other, self)
+
+    def __mod__(self, other):
+        return _ArithmeticExpression("mod", self, other)
+
+    def __rmod__(self, other):
+        return _ArithmeticExpression("mod", other, self)
+
+
+class _Field(_ArithmeticOperators):
+    def __init__(self, field):
+        self.field = field
+
+
+class _Inserted(_ArithmeticOperators):
+    """
+    The value an upsert tried to insert into the column *field*
+    """
+    def __init__(self, field):
+        self.field = field
+
+
+def _merge_expression(column, strategy):
+    if strategy == "replace":
+        return _Inserted(column)
+    if strategy == "add":
+        return _Field(column) + _Inserted(column)
+    if strategy == "max":
+        return SQLFunction("greatest", _Field(column), _Inserted(column))
+    if strategy == "min":
+        return SQLFunction("least", _Field(column), _Inserted(column))
+    if strategy == "coalesce":
+        return SQLFunction("coalesce", _Inserted(column), _Field(column))
+    if isinstance(strategy, string_types):
+        raise InvalidQueryException(
+            "Unknown merge strategy <{}> for <{}>".format(strategy, column)
+        )
+    return strategy
+
+
+class _ArithmeticExpression(_ArithmeticOperators):
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+class SQLFunction(_ArithmeticOperators):
     def __init__(self, function, *fields):
         self.function = function
         self.fields = fields
 
+    def over(self, partition_by=(), order_by=()):
+        """
+        Uses this function as a window function, e.g.
+
+        ::
+
+            ROW_NUMBER() OVER (PARTITION BY x ORDER BY y DESC)
+
+        *partition_by* and *order_by* are a column (or expression) or a tuple
+        of them, the items of *order_by* may also be created with
+        :py:func:`~.queryapi.ASC` or :py:func:`~.queryapi.DESC`.
+        """
+        if not isinstance(partition_by, (tuple, list)):
+            partition_by = (partition_by,)
+        if not isinstance(order_by, (tuple, list)):
+            order_by = (order_by,)
+        return _WindowFunction(self, tuple(partition_by), tuple(order_by))
+
+
+class _WindowFunction(_ArithmeticOperators):
+    def __init__(self, function, partition_by, order_by):
+        self.function = function
+        self.partition_by = partition_by
+        self.order_by = order_by
+
+
+class Param(object):
+    """
+    A named placeholder for a single value which is only given once the query
+    is bound, see :py:mod:`~sqlquery.templates`. It can be used in place of
+    any value of a condition, an update or an insert, or as a limit or
+    offset.
+    """
+    def __init__(self, name, adapt=None):
+        self.name = name
+        # applied to the value once bound, see `schema.Column`
+        self.adapt = adapt
+
+    def __repr__(self):
+        return "Param({!r})".format(self.name)
+
+
+def _adapted(adapt, value):
+    if isinstance(value, Param):
+        return Param(value.name, adapt)
+    return adapt(value)
+
 
 class _SQLOrdering(object):
     def __init__(self, field, direction):
@@ -117,6 +354,11 @@ QueryData = namedtuple(
         'insert_ignore',
         'insert_replace',
         'join',
+        'cte',
+        'union',
+        'bulk_update',
+        'rollup',
+        'route',
     ]
 )
 
@@ -124,6 +366,273 @@ QueryData = namedtuple(
 _empty_query_data = QueryData(**{field: None for field in QueryData._fields})
 
 
+IN_LIST_STRATEGIES = ("values", "temp_table")
+
+
+ROUTE_TARGETS = ("primary", "replica")
+
+
+SizeLimit = namedtuple(
+    'SizeLimit',
+    [
+        'max_bytes',
+        'max_args',
+    ]
+)
+
+
+class SizeEstimate(namedtuple('SizeEstimate',
+                              ['sql_bytes', 'args', 'arg_bytes'])):
+    """
+    The size of a compiled query: *sql_bytes* of query string, the number of
+    *args* and the estimated *arg_bytes* those arguments take once the DB
+    client library has encoded them into the statement. While a query is
+    compiled the size of its query string is estimated from its tokens,
+    without the spaces between them, so the estimate never exceeds the
+    actual size.
+    """
+    __slots__ = ()
+
+    @property
+    def total_bytes(self):
+        return self.sql_bytes + self.arg_bytes
+
+
+def estimate_value_size(value):
+    """
+    Estimates the number of bytes *value* takes once it's encoded as a
+    literal in a statement.
+    """
+    if value is None:
+        return 4
+    if isinstance(value, text_type):
+        return len(value.encode("utf-8")) + 2
+    if isinstance(value, binary_type):
+        return len(value) + 2
+    if isinstance(value, integer_types):
+        return len(str(value))
+    if isinstance(value, float):
+        return len(repr(value))
+    return len(str(value)) + 2
+
+
+def _measure(sizes, tokens, args):
+    # `sum` is shadowed by the SQL function in this module
+    for token in tokens:
+        sizes[0] += len(token)
+    sizes[1] += len(args)
+    for arg in args:
+        sizes[2] += estimate_value_size(arg)
+
+
+InListOptions = namedtuple(
+    'InListOptions',
+    [
+        'threshold',
+        'strategy',
+        'batch_size',
+        'column_type',
+    ]
+)
+
+
+class FragmentCache(object):
+    """
+    A bounded cache of the SQL compiled for conditions and joins, which can
+    be shared by any number of queries, see :py:meth:`.QueryBuilder.sql`.
+
+    A condition is cached by its shape, i.e. its operators, fields and the
+    number of values of each comparison, together with the table, join,
+    encoder and schema it was compiled for. A query containing a condition
+    of a cached shape reuses its tokens and only collects the arguments from
+    the condition. The clauses of a select are cached by the identity of the
+    query data they are compiled from, see :py:meth:`.QueryBuilder.sql`.
+    At most *max_size* fragments are kept, the least recently used are
+    evicted. *hits*, *misses* and *evictions* count lookups and evictions
+    since the cache was created or cleared.
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._fragments)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, count_miss=True):
+        """
+        Returns the tokens cached for *key*, or `None`. A miss isn't counted
+        unless *count_miss*, e.g. when the fragments of a clause are looked
+        up next, see :py:meth:`.count_miss`.
+        """
+        with self._lock:
+            tokens = self._fragments.pop(key, None)
+            if tokens is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._fragments[key] = tokens
+            self.hits += 1
+            return tokens
+
+    def count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, tokens):
+        with self._lock:
+            self._fragments.pop(key, None)
+            self._fragments[key] = tuple(tokens)
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+                self.evictions += 1
+
+
+_ARGUMENT = ("arg",)
+
+
+def _expression_shape(expression):
+    """
+    Returns the shape of a field or expression for a
+    :py:class:`.FragmentCache`, its constants being arguments, or `None` if it
+    can't be cached.
+    """
+    if isinstance(expression, string_types):
+        # a literal isn't encoded like a column
+        return type(expression), expression
+    if isinstance(expression, _Field):
+        return "col", expression.field
+    if isinstance(expression, SQLFunction):
+        fields = tuple(_expression_shape(field) for field in expression.fields)
+        return None if None in fields else ("fn", expression.function, fields)
+    if isinstance(expression, _ArithmeticExpression):
+        operands = [
+            _expression_shape(operand)
+            if isinstance(operand, _ArithmeticOperators) else _ARGUMENT
+            for operand in (expression.left, expression.right)
+        ]
+        return None if None in operands else (
+            "ar", expression.operator, operands[0], operands[1]
+        )
+    return None
+
+
+def _value_shape(value):
+    if isinstance(value, QueryBuilder):
+        return None
+    if isinstance(value, _ArithmeticOperators):
+        return _expression_shape(value)
+    if (
+        not isinstance(value, string_types) and
+        isinstance(value, collections.Iterable)
+    ):
+        # an iterator would be consumed
+        return ("list", len(value)) if hasattr(value, "__len__") else None
+    if value is None:
+        return "null",
+    return _ARGUMENT
+
+
+def _condition_shape(clause, shapes):
+    """
+    Returns the shape of the condition *clause*, or `None` if it can't be
+    cached. *shapes* memoizes the shapes of subtrees by their id.
+    """
+    if id(clause) in shapes:
+        return shapes[id(clause)]
+
+    parts = []
+    for sub_clause in clause.conditions:
+        if isinstance(sub_clause, _LogicalOperator):
+            part = _condition_shape(sub_clause, shapes)
+        else:
+            field, op, value = parse_condition(sub_clause)
+            field_shape, value_shape = (
+                _expression_shape(field), _value_shape(value)
+            )
+            part = None if None in (field_shape, value_shape) else (
+                field_shape, op, value_shape
+            )
+        if part is None:
+            shapes[id(clause)] = None
+            return None
+        parts.append(part)
+
+    shape = shapes[id(clause)] = (clause.operator, tuple(parts))
+    return shape
+
+
+def _expression_args(expression):
+    """
+    Returns the arguments of a field or expression in the order they are
+    compiled
+    """
+    args = []
+    if isinstance(expression, SQLFunction):
+        for field in expression.fields:
+            args.extend(_expression_args(field))
+    elif isinstance(expression, _ArithmeticExpression):
+        for operand in (expression.left, expression.right):
+            if isinstance(operand, _ArithmeticOperators):
+                args.extend(_expression_args(operand))
+            else:
+                args.append(operand)
+    return args
+
+
+class QueryPlan(namedtuple('QueryPlan', ['setup', 'query', 'teardown'])):
+    """
+    A query which needs more than a single statement to be executed. Each of
+    *setup* and *teardown* is a tuple of `(query_string, arguments)` pairs,
+    in the same format as returned by :py:meth:`.QueryBuilder.sql`, which must
+    be executed before and after the main *query* respectively.
+    """
+    def statements(self):
+        """
+        Returns every `(query_string, arguments)` pair in execution order.
+        """
+        return list(itertools.chain(self.setup, (self.query,), self.teardown))
+
+    def execute(self, cursor):
+        """
+        Executes the plan with a DB-API *cursor*. The result rows of the main
+        query are returned, or `None` if it does not return any rows. The
+        teardown statements are always executed, if a statement fails they
+        are executed ignoring their errors, as the failure may have happened
+        before all temporary tables were created.
+        """
+        try:
+            for sql, args in self.setup:
+                cursor.execute(sql, args)
+            cursor.execute(*self.query)
+            rows = cursor.fetchall() if cursor.description else None
+        except Exception:
+            self._execute_teardown(cursor, ignore_errors=True)
+            raise
+
+        self._execute_teardown(cursor)
+        return rows
+
+    def _execute_teardown(self, cursor, ignore_errors=False):
+        for sql, args in self.teardown:
+            try:
+                cursor.execute(sql, args)
+            except Exception:
+                if not ignore_errors:
+                    raise
+
+
 class QueryBuilder(object):
     """
     This is the main workhorse for modifying/creating queries.
@@ -158,6 +667,105 @@ class QueryBuilder(object):
         """
         return self._replace(update=data)
 
+    def bulk_update(self, key, updates, strategy="case"):
+        """
+        Updates many rows, each with its own values, in a single statement.
+        *key* is the column identifying the rows, usually the primary key.
+        *updates* maps each value of *key* to a dict of column/value to be set
+        on that row. It can also be a list of such `(key, values)` pairs.
+
+        With the default *strategy*, `"case"`, this creates
+
+        ::
+
+            UPDATE ... SET x = CASE key WHEN %s THEN %s ... ELSE x END, ...
+            WHERE ... AND key IN (...)
+
+        Rows which don't set a column keep their current value.
+
+        If *strategy* is `"upsert"` then an
+        `INSERT ... ON DUPLICATE KEY UPDATE` is created instead. All rows must
+        set the same columns, and note that keys which don't exist yet are
+        inserted rather than ignored.
+
+        Use :py:meth:`~.chunked` to split large updates into several queries.
+        """
+        if hasattr(updates, 'items'):
+            updates = updates.items()
+        updates = tuple((row_key, values) for row_key, values in updates)
+        assert updates and all(values for _, values in updates)
+
+        if strategy == "upsert":
+            rows = []
+            for row_key, values in updates:
+                row = dict(values)
+                row[key] = row_key
+                rows.append(row)
+            return self.insert(*rows).upsert(key)
+
+        if strategy != "case":
+            raise InvalidQueryException(
+                "Unknown bulk update strategy <{}>".format(strategy)
+            )
+
+        return self._replace(bulk_update=(key, updates))
+
+    def chunked(self, max_rows=None, max_args=None):
+        """
+        Splits an insert or a :py:meth:`~.bulk_update` into a list of queries
+        which each have at most *max_rows* rows and at most *max_args*
+        arguments for the values of their rows. Other queries are returned
+        unchanged in a list of their own.
+        """
+        query_data = self._query_data
+        if query_data.insert is not None:
+            rows = query_data.insert
+            count_args = len
+        elif query_data.bulk_update is not None:
+            rows = query_data.bulk_update[1]
+
+            def count_args(row):
+                # the key in the IN list and a WHEN/THEN pair per column
+                return 1 + 2 * len(row[1])
+        else:
+            return [self]
+        rebuild = self._with_rows
+
+        chunks, chunk, chunk_args = [], [], 0
+        for row in rows:
+            row_args = count_args(row)
+            if chunk and (
+                (max_rows is not None and len(chunk) >= max_rows) or
+                (max_args is not None and chunk_args + row_args > max_args)
+            ):
+                chunks.append(rebuild(chunk))
+                chunk, chunk_args = [], 0
+            chunk.append(row)
+            chunk_args += row_args
+        chunks.append(rebuild(chunk))
+
+        return chunks
+
+    def _rows(self):
+        """
+        Returns the rows of an insert or a bulk update, or `None`
+        """
+        query_data = self._query_data
+        if query_data.insert is not None:
+            return query_data.insert
+        if query_data.bulk_update is not None:
+            return query_data.bulk_update[1]
+        return None
+
+    def _with_rows(self, rows):
+        """
+        Returns this insert or bulk update with *rows* instead of its rows
+        """
+        if self._query_data.insert is not None:
+            return self._replace(insert=tuple(rows))
+        key = self._query_data.bulk_update[0]
+        return self._replace(bulk_update=(key, tuple(rows)))
+
     def insert(self, *data):
         """
         See :py:func:`~.queryapi.insert`
@@ -185,6 +793,20 @@ class QueryBuilder(object):
         """
         return self._replace(delete=True)
 
+    def union(self, *builders):
+        """
+        See :py:func:`~.queryapi.union`
+        """
+        assert builders
+        return self._replace(union=("union", builders))
+
+    def union_all(self, *builders):
+        """
+        See :py:func:`~.queryapi.union_all`
+        """
+        assert builders
+        return self._replace(union=("union_all", builders))
+
     def on_table(self, table, schema=None):
         """
         Identifies the main table the query should be executed upon. E.g. if
@@ -198,7 +820,7 @@ class QueryBuilder(object):
         if not self._query_data.table:
             table = TableOptions(name=table, schema=schema, alias=None)
         else:
-            table = self._query_data.table._replace(table=table, schema=schema)
+            table = self._query_data.table._replace(name=table, schema=schema)
         return self._replace(table=table)
 
     def on_duplicate_key_update(self, **col_values):
@@ -211,17 +833,81 @@ class QueryBuilder(object):
 
             INSERT ... ON DUPLICATE KEY UPDATE ...
 
-        *col_values* should be a list of columns/values to be updated. If
-        column/values is not given, then the main columns will be used
-        resulting in a query like:
+        *col_values* should be a list of columns/values to be updated, each
+        value being bound as an argument or an expression such as
+        `F("x") + 1`. If column/values is not given, then the main columns
+        will be used resulting in a query like:
 
         ::
 
             INSERT INTO table (x) VALUES (1)
-            ON DUPLICATE KEY UPDATE x = VALUES(1)
+            ON DUPLICATE KEY UPDATE x = VALUES(x)
+
+        See :py:meth:`~.upsert` for merging the inserted values into the
+        existing row.
+        """
+        return self._replace(duplicate_key_update=(None, col_values))
+
+    def upsert(self, key, **merge):
+        """
+        With one of the insertion statements, updates the existing row
+        instead when a row with the same *key*, a column or a tuple of
+        columns with a unique index, already exists. Generates
+
+        ::
+
+            INSERT ... ON DUPLICATE KEY UPDATE ...
+
+        or with :py:class:`~.sqlencoding.ANSIEncodings`
+
+        ::
+
+            INSERT ... ON CONFLICT (key) DO UPDATE SET ...
+
+        *merge* maps each column to update to how the inserted value is
+        merged into the existing row:
+
+        `"replace"`
+            the inserted value replaces the existing value
+        `"add"`
+            the inserted value is added to the existing value, e.g. for
+            counters
+        `"max"` / `"min"`
+            the greater/lesser of the existing and the inserted value
+        `"coalesce"`
+            the inserted value, unless it is `NULL`
+        an expression
+            e.g. `F("hits") + INSERTED("hits") * 2`, see
+            :py:func:`~.queryapi.F` and :py:func:`~.queryapi.INSERTED`
+
+        Any other value is set as a constant. Without *merge* all inserted
+        columns except *key* are replaced.
+        """
+        if isinstance(key, string_types):
+            key = (key,)
+        assert key
+        merge = dict(
+            (column, _merge_expression(column, strategy))
+            for column, strategy in merge.items()
+        )
+        return self._replace(duplicate_key_update=(tuple(key), merge))
 
+    def with_cte(self, name, builder):
         """
-        return self._replace(duplicate_key_update=(True, col_values))
+        Adds a common table expression named *name* to the query, generating
+        a `WITH` clause:
+
+        ::
+
+            WITH name AS (SELECT ...) SELECT ...
+
+        *builder* is the :py:class:`.QueryBuilder` for the body of the
+        expression. The rest of the query can refer to it by *name* like any
+        other table, e.g. with :py:meth:`~.on_table`, :py:meth:`~.join` or in a
+        subquery passed to :py:meth:`~.where`.
+        """
+        cte = (self._query_data.cte or ()) + ((name, builder),)
+        return self._replace(cte=cte)
 
     def where(self, *conditions):
         """
@@ -307,44 +993,77 @@ class QueryBuilder(object):
 
         """
         assert all(
-            [isinstance(field, (string_types, _SQLOrdering))
-             for field in fields]
+            [isinstance(
+                field, (string_types, _SQLOrdering, _ArithmeticOperators)
+            ) for field in fields]
         )
         return self._replace(order_by=tuple(fields))
 
     def group_by(self, *fields):
         """
         Used to create a `GROUP BY` clause. Each item in *fields* should be a
-        column name.
+        column name, a function such as :py:class:`.SQLFunction` or an
+        expression created with :py:func:`~.queryapi.F`.
         """
         assert all(
-            [isinstance(field, string_types) for field in fields]
+            [isinstance(field, (string_types, _ArithmeticOperators))
+             for field in fields]
         )
         return self._replace(group_by=tuple(fields))
 
+    def with_rollup(self):
+        """
+        Adds super-aggregate rows for each of the `GROUP BY` columns to the
+        result, i.e. `GROUP BY ... WITH ROLLUP` (`GROUP BY ROLLUP (...)` with
+        :py:class:`~.sqlencoding.ANSIEncodings`).
+        """
+        return self._replace(rollup=True)
+
+    def route_to(self, target):
+        """
+        Overrides where a :py:class:`~.routing.ReadWriteRouter` sends the
+        query, *target* being `"primary"` or `"replica"`. E.g. a read which
+        must see the latest writes can be sent to the primary, or a read
+        which tolerates replication lag to a replica even after the session
+        has written.
+        """
+        if target not in ROUTE_TARGETS:
+            raise InvalidQueryException(
+                "Unknown route target <{}>".format(target)
+            )
+        return self._replace(route=target)
+
     def offset(self, offset):
         """
         Used to create an `OFFSET` clause. Warning, this may result in an
         ineffecient query if a large offset is chosen.
         """
-        return self._replace(offset=int(offset))
+        if not isinstance(offset, Param):
+            offset = int(offset)
+        return self._replace(offset=offset)
 
     def limit(self, count):
         """
         Used to create an `LIMIT` clause. This reduces the number of rows that
         will be returned.
         """
-        return self._replace(limit=int(count))
+        if not isinstance(count, Param):
+            count = int(count)
+        return self._replace(limit=count)
 
-    def compiler(self, encoder=None):
+    def compiler(self, encoder=None, schema=None, fragment_cache=None):
         """
         Returns the compiler that will be used to generate the final query. In
         most cases you won't need to call this, and instead :py:meth:`~.sql`
         will all that's needed.
         """
-        return SQLCompiler(self._query_data, encoder=encoder)
+        return SQLCompiler(
+            self._query_data, encoder=encoder, schema=schema,
+            fragment_cache=fragment_cache
+        )
 
-    def sql(self, encoder=None):
+    def sql(self, encoder=None, schema=None, max_bytes=None, max_args=None,
+            fragment_cache=None):
         """
         Composes the current query and returns a tuple containing:
 
@@ -360,8 +1079,200 @@ class QueryBuilder(object):
         library. `arguments` is the list of arguments that are required for the
         query and should also be passed to the DB client library. Each argument
         will have a "%s" placeholder in the query string.
+
+        If a :py:class:`~.schema.SchemaRegistry` is given as *schema* then the
+        columns of the tables declared in it are validated.
+
+        *max_bytes* limits the :py:attr:`.SizeEstimate.total_bytes` of the
+        query, *max_args* its number of arguments. The size is estimated while
+        the query is compiled, so that the rows of a large insert aren't all
+        compiled before it fails with :py:class:`.QueryTooLargeException`.
+
+        Conditions and joins compiled before are reused from
+        *fragment_cache*, a :py:class:`.FragmentCache`, if it is given. The
+        clauses of a select are also cached by identity, so a query derived
+        from a compiled one with only a new ordering, limit or offset, e.g.
+        to paginate, only compiles those. Queries compiled with a cache must
+        not be modified afterwards.
+        """
+        return self.compiler(
+            encoder=encoder, schema=schema, fragment_cache=fragment_cache
+        ).sql(max_bytes=max_bytes, max_args=max_args)
+
+    def measure(self, encoder=None, schema=None):
+        """
+        Returns a tuple of the estimated and the actual
+        :py:class:`.SizeEstimate` of the compiled query, e.g. to find the
+        batch size which keeps inserts below the packet size limit of the
+        database.
+        """
+        compiler = self.compiler(encoder=encoder, schema=schema)
+        compiler.sql(measure=True)
+        return compiler.estimated_size, compiler.actual_size
+
+    def split_sql(self, encoder=None, schema=None, max_bytes=None,
+                  max_args=None):
+        """
+        The same as :py:meth:`~.sql` except an insert or a
+        :py:meth:`~.bulk_update` which exceeds *max_bytes* or *max_args* is
+        split, see :py:meth:`~.chunked`, into as many statements as needed.
+        Returns a list of `(query_string, arguments)`.
+
+        Raises :py:class:`.QueryTooLargeException` if a query can't be split
+        any further, e.g. a single row exceeds the limits.
+
+        Each statement is filled with rows until the next row would exceed
+        the limits, by the size each row adds to the compiled statement.
+        """
+        options = dict(
+            encoder=encoder, schema=schema, max_bytes=max_bytes,
+            max_args=max_args
+        )
+        try:
+            return [self.sql(**options)]
+        except QueryTooLargeException:
+            rows = self._rows()
+            if not rows or len(rows) == 1:
+                raise
+
+        def measured(rows):
+            return self._with_rows(rows).measure(encoder, schema)[1]
+
+        def exceeds(size):
+            return (
+                (max_bytes is not None and size.total_bytes > max_bytes) or
+                (max_args is not None and size.args > max_args)
+            )
+
+        if self._query_data.insert is not None:
+            # every row of an insert has the same columns
+            def shape(row):
+                return None
+        else:
+            def shape(row):
+                return tuple(sorted(
+                    (column, _value_shape(value))
+                    for column, value in row[1].items()
+                ))
+
+        # the query string a row adds only depends on its shape, and is
+        # measured as the second row of a statement; the rest of the
+        # statement is the same for any rows, or smaller if the rows of a
+        # bulk update don't all set the columns of the first one
+        compiler = self.compiler(encoder=encoder, schema=schema)
+        first = rows[0]
+        single = measured([first])
+        added_sql = {}
+
+        def added(row):
+            row_shape = shape(row)
+            if row_shape not in added_sql:
+                size = measured([first, row])
+                added_sql[row_shape] = (
+                    size.sql_bytes - single.sql_bytes, size.args - single.args
+                )
+            sql_bytes, args = added_sql[row_shape]
+            sizes = [0, 0, 0]
+            _measure(sizes, (), compiler.row_args(row))
+            return SizeEstimate(sql_bytes, args, sizes[2])
+
+        fixed = SizeEstimate(*map(operator.sub, single, added(first)))
+        chunks, chunk, size = [], [], fixed
+        for row in rows:
+            row_size = added(row)
+            total = SizeEstimate(*map(operator.add, size, row_size))
+            if chunk and exceeds(total):
+                chunks.append((chunk, size))
+                chunk = []
+                total = SizeEstimate(*map(operator.add, fixed, row_size))
+            chunk.append(row)
+            size = total
+        chunks.append((chunk, size))
+
+        statements = []
+        for chunk, size in chunks:
+            if exceeds(size):
+                # only a single row can exceed the limits, which raises if
+                # its statement does
+                self._with_rows(chunk).sql(**options)
+            # otherwise the statement is known to fit and isn't measured
+            statements.append(
+                self._with_rows(chunk).sql(encoder=encoder, schema=schema)
+            )
+        return statements
+
+    def bulk_load(self, rows=None, columns=None, format="tsv", encoder=None,
+                  schema=None):
+        """
+        Returns a :py:class:`~.bulkload.BulkLoad` which loads the rows of this
+        insert, or *rows*, a (possibly lazy) iterable of tuples of the values
+        of *columns*, into the table of the query. The data file is written
+        in *format*, `"tsv"` or `"csv"`, and loaded with `LOAD DATA LOCAL
+        INFILE` or, with :py:class:`~.sqlencoding.ANSIEncodings`,
+        `COPY ... FROM STDIN`.
+        """
+        return self.compiler(encoder=encoder, schema=schema).bulk_load(
+            rows=rows, columns=columns, format=format
+        )
+
+    def row_decoder(self, schema=None):
+        """
+        Returns a :py:class:`~.rowdecoding.RowDecoder` for the rows returned
+        by this select. Selected columns are named after the column, and
+        functions after the function and its columns, e.g. `COUNT(x)` is
+        named `count_x`. The types of the columns are taken from *schema*
+        if it is given.
         """
-        return self.compiler(encoder=encoder).sql()
+        query_data = self._query_data
+        if not query_data.select:
+            raise InvalidQueryException("Only a select returns rows")
+
+        declared = {}
+        if schema is not None:
+            tables = [query_data.table]
+            if query_data.join:
+                tables.append(query_data.join.table)
+            for index, table in enumerate(tables):
+                declared_table = schema.get_table(table.name, table.schema)
+                for column in getattr(declared_table, 'columns', ()):
+                    declared[table.name + '.' + column.name] = column.sql_type
+                    if index == 0:
+                        declared[column.name] = column.sql_type
+
+        return RowDecoder(
+            [result_column_name(field) for field in query_data.select],
+            [
+                declared.get(field) if isinstance(field, string_types)
+                else None
+                for field in query_data.select
+            ]
+        )
+
+    def plan(self, encoder=None, schema=None, **options):
+        """
+        The same as :py:meth:`~.sql` except a :py:class:`.QueryPlan` is
+        returned. `IN` lists with more than *in_list_threshold* values
+        (default 1000) are rewritten according to *in_list_strategy*:
+
+        `"values"`
+            the list is compared against a derived `VALUES` table, e.g.
+
+            ::
+
+                x IN (SELECT * FROM (VALUES ROW(%s), ROW(%s), ...) AS b)
+
+        `"temp_table"`
+            the plan's setup statements create a temporary table and load
+            the values into it in batches of *batch_size* (default 1000),
+            the teardown statements drop it again. The column type of the
+            temporary table is guessed from the first value unless
+            *column_type* is given, or declared in *schema*.
+        """
+        return self.compiler(encoder=encoder, schema=schema).plan(**options)
+
+
+# stands in for the main table name when sharing a compiled union select
+_UNION_TABLE_MARKER = u"\x00table\x00"
 
 
 def _query_joiner(query, iterable, join_with=", "):
@@ -372,7 +1283,8 @@ def _query_joiner(query, iterable, join_with=", "):
 
 
 class SQLCompiler(object):
-    def __init__(self, query_data, alias_gen=None, encoder=None):
+    def __init__(self, query_data, alias_gen=None, encoder=None, schema=None,
+                 fragment_cache=None):
         # generate the aliases
         self._encoder = encoder or BasicEncodings()
         if alias_gen:
@@ -380,9 +1292,10 @@ class SQLCompiler(object):
         else:
             self.alias_gen = itertools.cycle(string.ascii_lowercase)
 
-        query_data = query_data._replace(
-            table=query_data.table._replace(alias=next(self.alias_gen))
-        )
+        if query_data.table:
+            query_data = query_data._replace(
+                table=query_data.table._replace(alias=next(self.alias_gen))
+            )
         if query_data.join:
             query_data = query_data._replace(
                 join=query_data.join._replace(
@@ -393,6 +1306,116 @@ class SQLCompiler(object):
             )
         self.query_data = query_data
 
+        self._schema = schema
+        self._main_columns = self._join_columns = None
+        if schema is not None:
+            if query_data.table:
+                self._main_columns = schema.columns_for(
+                    query_data.table, self._encoder
+                )
+            if query_data.join:
+                self._join_columns = schema.columns_for(
+                    query_data.join.table, self._encoder
+                )
+
+        self._fragment_cache = fragment_cache
+        self._shapes = {}
+        # the number of fragments looked up, shared with the subcompilers
+        self._fragment_lookups = [0]
+
+        self._in_list_options = None
+        self._setup = []
+        self._teardown = []
+        self._subqueries = {}
+
+        self._size_limit = None
+        self._estimate = None
+        self.estimated_size = self.actual_size = None
+
+    def _subcompiler(self, query_data):
+        compiler = SQLCompiler(
+            query_data, self.alias_gen, self._encoder, self._schema,
+            self._fragment_cache
+        )
+        compiler._in_list_options = self._in_list_options
+        # statements needed by the subquery are part of the outer plan
+        compiler._setup = self._setup
+        compiler._teardown = self._teardown
+        compiler._subqueries = self._subqueries
+        compiler._fragment_lookups = self._fragment_lookups
+        return compiler
+
+    def _compile_union_branch(self, query_data, templates):
+        """
+        Returns the query string and arguments of a single select in a
+        `UNION`. Selects which only differ in their main table reuse the
+        query string of the first of them with the table name substituted,
+        if the tables are declared with the same columns in the schema.
+        Their conditions are compared by their shape and arguments, so the
+        selects needn't be derived from one another.
+        """
+        columns = None
+        if self._schema is not None:
+            # validates the table, even if the query string is reused
+            columns = self._schema.columns_for(query_data.table, self._encoder)
+        try:
+            key = (
+                query_data._replace(
+                    table=None,
+                    where=self._condition_key(query_data.where),
+                    having=self._condition_key(query_data.having),
+                ),
+                columns.table.columns if columns is not None else None
+            )
+            template = templates.get(key)
+        except TypeError:
+            # unhashable query data can't be shared
+            key = template = None
+
+        if template is None:
+            compiler = self._subcompiler(query_data)
+            sql, sql_args = compiler._raw_sql()
+            table = compiler._encode_main_table_name()
+            parts = self._encoder.serialize_query_tokens(
+                _UNION_TABLE_MARKER if token == table else token
+                for token in sql
+            ).split(_UNION_TABLE_MARKER)
+            template = (parts, compiler.query_data.table.alias, sql_args)
+            if key is not None:
+                templates[key] = template
+
+        parts, alias, sql_args = template
+        sql = self._encoder.encode_table_name(
+            query_data.table.name, alias, query_data.table.schema
+        ).join(parts)
+        if (
+            query_data.order_by or
+            query_data.limit is not None or
+            query_data.offset is not None
+        ):
+            if self._encoder.BRACKETED_SET_OPERANDS:
+                sql = u"({})".format(sql)
+            else:
+                sql = u"SELECT * FROM ({})".format(sql)
+
+        return sql, sql_args
+
+    def _compile_subquery(self, query_data):
+        """
+        Returns the tokens and arguments of a subquery. A subquery which
+        appears more than once in the query is only compiled once.
+        """
+        try:
+            return self._subqueries[id(query_data)][1:]
+        except KeyError:
+            pass
+
+        sql, sql_args = self._subcompiler(query_data)._raw_sql()
+        sql = list(sql)
+        # *query_data* is kept alive so that its id can't be reused
+        self._subqueries[id(query_data)] = (query_data, sql, sql_args)
+        return sql, sql_args
+
     # Encoding to valid SQL functions
     def _encode_main_table_name(self, include_alias=True):
         return self._encoder.encode_table_name(
@@ -411,6 +1434,12 @@ class SQLCompiler(object):
         )
 
     def _encode_field(self, field):
+        if self._main_columns is not None and not isinstance(field, Literal):
+            return (
+                self._quoted(self.query_data.table.alias) + '.' +
+                self._main_columns[field][0]
+            )
+
         return self._encoder.encode_field(
             field,
             self.query_data.table.name,
@@ -419,6 +1448,12 @@ class SQLCompiler(object):
         )
 
     def _encode_join_field(self, field):
+        if self._join_columns is not None and not isinstance(field, Literal):
+            return (
+                self._quoted(self.query_data.join.table.alias) + '.' +
+                self._join_columns[field][0]
+            )
+
         return self._encoder.encode_field(
             field,
             self.query_data.join.table.name,
@@ -439,50 +1474,142 @@ class SQLCompiler(object):
     def _quoted(self, value):
         return self._encoder.quoted(value)
 
+    def _encode_set_field(self, field):
+        if self._encoder.QUALIFY_SET_COLUMNS:
+            return self._encode_field(field)
+
+        if self._main_columns is not None:
+            return self._main_columns[field][0]
+
+        return self._encoder.encode_field(
+            field,
+            self.query_data.table.name,
+            self.query_data.table.alias,
+            include_alias=False
+        )
+
+    def _quoted_column(self, column):
+        if self._main_columns is not None:
+            return self._main_columns[column][0]
+
+        return self._quoted(column)
+
+    def _declared_column(self, field):
+        """
+        Returns the :py:class:`~.schema.Column` declared for *field*, or
+        `None` if it isn't known.
+        """
+        if not isinstance(field, string_types) or isinstance(field, Literal):
+            return None
+
+        if (
+            self._join_columns is not None and
+            field.startswith(self.query_data.join.table.name + '.')
+        ):
+            return self._join_columns[field][1]
+
+        if self._main_columns is not None:
+            return self._main_columns[field][1]
+
+        return None
+
+    def _adapter(self, field):
+        column = self._declared_column(field)
+        return column.adapt if column is not None else None
+
     # Parsing user-data functions
     @staticmethod
     def _parse_field_spec(field_spec):
         """
-        Returns (func, field, op)
+        Returns (field, op)
         """
-        try:
-            field, op = field_spec.split('__')
-            return field, op
-        except ValueError:
-            raise InvalidQueryException(
-                "Invalid where clause <{}>".format(field_spec)
-            )
+        return parse_field_spec(field_spec)
 
     def _parse_where_clause_spec(self, clause):
-        if isinstance(clause, dict):
-            assert len(clause) == 1
-            clause = clause.items()
-
-        if isinstance(clause, (tuple, list)):
-            if len(clause) == 3:
-                return clause
-            if len(clause) == 2:
-                field_op, value = clause
-                field, op = self._parse_field_spec(field_op)
-                return field, op, value
-
-        raise InvalidQueryException("Unknown where element %s" % clause)
+        return parse_condition(clause)
 
     # Generating sequences of valid SQL functions
     def _generate_field(self, field):
-        query = []
+        query, args = [], []
         if isinstance(field, SQLFunction):
             func = self._encoder.encode_func_name(field.function)
             query.append(func)
             with self._encoder.in_brackets(query):
                 for field in _query_joiner(query, field.fields):
-                    query.append(self._smart_encode_field(field))
+                    sub_query, sub_args = self._generate_field(field)
+                    query.extend(sub_query)
+                    args.extend(sub_args)
+        elif isinstance(field, _ArithmeticExpression):
+            for operand in (field.left, field.right):
+                if operand is field.right:
+                    query.append(self._encoder.encode_op(field.operator))
+
+                if not isinstance(operand, _ArithmeticOperators):
+                    query.append(self._encoder.encode_placeholder())
+                    args.append(operand)
+                    continue
+
+                sub_query, sub_args = self._generate_field(operand)
+                if isinstance(operand, _ArithmeticExpression):
+                    with self._encoder.in_brackets(query):
+                        query.extend(sub_query)
+                else:
+                    query.extend(sub_query)
+                args.extend(sub_args)
+        elif isinstance(field, _WindowFunction):
+            query, args = self._generate_field(field.function)
+            query.append(u"OVER")
+            with self._encoder.in_brackets(query):
+                if field.partition_by:
+                    query.append(u"PARTITION BY")
+                    for partition in _query_joiner(query, field.partition_by):
+                        sub_query, sub_args = self._generate_field(partition)
+                        query.extend(sub_query)
+                        args.extend(sub_args)
+                if field.order_by:
+                    query.append(u"ORDER BY")
+                    for order_by in _query_joiner(query, field.order_by):
+                        sub_query, sub_args = self._generate_ordering(
+                            order_by, self._smart_encode_field
+                        )
+                        query.extend(sub_query)
+                        args.extend(sub_args)
+        elif isinstance(field, _Field):
+            query.append(self._smart_encode_field(field.field))
+        elif isinstance(field, _Inserted):
+            query.append(self._encoder.encode_inserted(
+                self._quoted_column(field.field)
+            ))
         else:
             query.append(self._smart_encode_field(field))
 
-        return query
+        return query, args
+
+    def _generate_value(self, value, adapt=None):
+        """
+        Returns the tokens and arguments for a value which is either bound as
+        an argument or an expression such as `F("x") + 1`
+        """
+        if isinstance(value, _ArithmeticOperators):
+            return self._generate_field(value)
+
+        return (
+            [self._encoder.encode_placeholder()],
+            [_adapted(adapt, value) if adapt else value]
+        )
 
     def _generate_join(self):
+        if self._fragment_cache is None:
+            return self._generate_join_clause()
+
+        key = (self._fragment_context(), "join")
+        query = self._cached_fragment(key)
+        if query is None:
+            query = self._generate_join_clause()
+            self._fragment_cache.put(key, query)
+        return list(query)
+
+    def _generate_join_clause(self):
         query = [
             self._encoder.encode_join_type(self.query_data.join.join_type),
             self._encode_join_table_name(),
@@ -506,13 +1633,57 @@ class SQLCompiler(object):
         args = []
 
         for field in _query_joiner(query, self.query_data.update):
-            query.append(self._encode_field(field))
+            query.append(self._encode_set_field(field))
             query.append(u"=")
-            query.append(u"%s")
-            args.append(self.query_data.update[field])
+            value_query, value_args = self._generate_value(
+                self.query_data.update[field], self._adapter(field)
+            )
+            query.extend(value_query)
+            args.extend(value_args)
+
+        return query, args
+
+    def _generate_bulk_update(self):
+        key_column, updates = self.query_data.bulk_update
+        columns = sorted(set(
+            column for _, values in updates for column in values
+        ))
+
+        query = [
+            u"UPDATE",
+            self._encode_main_table_name(),
+        ]
+        if self.query_data.join:
+            query.extend(self._generate_join())
+
+        query.append(u"SET")
+        args = []
+        key = self._encode_field(key_column)
+        adapt_key = self._adapter(key_column)
+        placeholder = self._encoder.encode_placeholder()
+        for column in _query_joiner(query, columns):
+            field = self._encode_field(column)
+            adapt = self._adapter(column)
+            query.extend([self._encode_set_field(column), u"=", u"CASE", key])
+            for row_key, values in updates:
+                if column not in values:
+                    continue
+                query.extend([u"WHEN", placeholder, u"THEN"])
+                args.append(
+                    _adapted(adapt_key, row_key) if adapt_key else row_key
+                )
+                value_query, value_args = self._generate_value(
+                    values[column], adapt
+                )
+                query.extend(value_query)
+                args.extend(value_args)
+            query.extend([u"ELSE", field, u"END"])
 
         return query, args
 
+    def _generate_delete(self):
+        return [u"DELETE FROM", self._encode_main_table_name()], []
+
     def _generate_insert(self):
         if self.query_data.insert_ignore:
             insert = u"INSERT IGNORE INTO"
@@ -521,76 +1692,344 @@ class SQLCompiler(object):
         else:
             insert = u"INSERT INTO"
 
+        upsert = self.query_data.duplicate_key_update
         query = [
             insert,
-            self._encode_main_table_name(include_alias=False),
+            self._encode_main_table_name(
+                include_alias=bool(upsert) and self._encoder.INSERT_TABLE_ALIAS
+            ),
         ]
-        columns = self.query_data.insert[0].keys()
+        columns = self._insert_columns()
         with self._encoder.in_brackets(query):
-            query.append(u", ".join(map(self._quoted, columns)))
+            query.append(u", ".join(map(self._quoted_column, columns)))
         query.append(u"VALUES")
 
+        column_adapters = [(col, self._adapter(col)) for col in columns]
+
+        # the size of the rows is checked as they are generated, so that a
+        # huge insert fails before all of it has been compiled
+        sizes = None
+        if self._size_limit is not None:
+            sizes = [0, 0, 0]
+            _measure(sizes, query, ())
+
         args = []
-        for col_values in self.query_data.insert:
+        for index, col_values in enumerate(
+            _query_joiner(query, self.query_data.insert)
+        ):
             if len(col_values.keys()) != len(columns):
                 raise InvalidQueryException("Invalid number of column values")
 
+            row_start, row_args_start = len(query), len(args)
             with self._encoder.in_brackets(query):
-                for col in _query_joiner(query, columns):
-                    query.append(u"%s")
-                    args.append(col_values[col])
-
-        if self.query_data.duplicate_key_update:
-            query.append(u"ON DUPLICATE KEY UPDATE")
-            update_col_values = self.query_data.duplicate_key_update[1]
-            if not update_col_values:
-                for col in _query_joiner(query, columns):
-                    query.append(u"{0}=VALUES({0})".format(self._quoted(col)))
-            else:
-                for col in _query_joiner(query, update_col_values):
-                    query.append(u"{}=VALUES(%s)".format(self._quoted(col)))
-                    args.append(update_col_values[col])
+                for col, adapt in _query_joiner(query, column_adapters):
+                    query.append(self._encoder.encode_placeholder())
+                    value = col_values[col]
+                    args.append(_adapted(adapt, value) if adapt else value)
+
+            if sizes is not None:
+                _measure(sizes, query[row_start:], args[row_args_start:])
+                self._check_size(
+                    SizeEstimate(*map(operator.add, self._estimate, sizes)),
+                    rows=index
+                )
+
+        if upsert:
+            upsert_query, upsert_args = self._generate_upsert(columns)
+            query.extend(upsert_query)
+            args.extend(upsert_args)
+
+        return query, args
+
+    def _generate_upsert(self, columns):
+        key, merge = self.query_data.duplicate_key_update
+        if not merge:
+            merge = OrderedDict(
+                (column, _Inserted(column))
+                for column in columns if column not in (key or ())
+            )
+
+        try:
+            query = self._encoder.encode_upsert(
+                [self._quoted_column(column) for column in key or ()]
+            )
+        except ValueError as error:
+            raise InvalidQueryException(str(error))
+
+        table = self.query_data.table
+        if not self._encoder.INSERT_TABLE_ALIAS:
+            # the table of an insert can't be aliased, so the existing values
+            # are qualified by the name of the table
+            self.query_data = self.query_data._replace(
+                table=table._replace(alias=table.name)
+            )
+
+        args = []
+        try:
+            for column in _query_joiner(query, sorted(merge)):
+                query.extend([self._quoted_column(column), u"="])
+                value_query, value_args = self._generate_value(
+                    merge[column], self._adapter(column)
+                )
+                query.extend(value_query)
+                args.extend(value_args)
+        finally:
+            self.query_data = self.query_data._replace(table=table)
 
         return query, args
 
+    def _insert_columns(self):
+        return list(self.query_data.insert[0].keys())
+
     def _generate_select(self):
-        query = [u"SELECT"]
+        query, args = [u"SELECT"], []
         for field in _query_joiner(query, self.query_data.select):
-            query.extend(self._generate_field(field))
+            field_query, field_args = self._generate_field(field)
+            query.extend(field_query)
+            args.extend(field_args)
 
         query.extend(["FROM", self._encode_main_table_name()])
         if self.query_data.join:
             query.extend(self._generate_join())
-        return query, []
+        return query, args
+
+    def _generate_union(self):
+        operation, builders = self.query_data.union
+        query, args = [], []
+        templates = {}
+        for builder in _query_joiner(
+            query,
+            builders,
+            self._encoder.encode_set_operation(operation)
+        ):
+            sql, sql_args = self._compile_union_branch(
+                builder._query_data, templates
+            )
+            query.append(sql)
+            args.extend(sql_args)
+
+        return query, args
 
     def _generate_single_where_clause(self, field, op, value):
+        adapt = self._adapter(field)
         clause = []
         with self._encoder.in_brackets(clause):
-            clause.extend(self._generate_field(field))
+            clause_field, field_args = self._generate_field(field)
+            clause.extend(clause_field)
             clause.append(self._encoder.encode_op(op))
             if isinstance(value, QueryBuilder):
                 with self._encoder.in_brackets(clause):
-                    sql, sql_args = SQLCompiler(value._query_data,
-                                                self.alias_gen)._raw_sql()
+                    sql, sql_args = self._compile_subquery(value._query_data)
                     clause.extend(sql)
                 args = list(sql_args)
+            elif isinstance(value, _ArithmeticOperators):
+                value_clause, args = self._generate_field(value)
+                clause.extend(value_clause)
             elif (
                 not isinstance(value, string_types) and
                 isinstance(value, collections.Iterable)
             ):
-                args = list(value)
-                clause.append(u"({})".format(u",".join([u"%s"] * len(args))))
+                args = (
+                    [_adapted(adapt, item) for item in value] if adapt
+                    else list(value)
+                )
+                if self._should_rewrite_in_list(op, args):
+                    rewrite, args = self._generate_in_list_rewrite(
+                        args, self._declared_column(field)
+                    )
+                    clause.extend(rewrite)
+                else:
+                    clause.append(u"({})".format(u",".join(
+                        [self._encoder.encode_placeholder()] * len(args)
+                    )))
             elif value is None:
                 clause.append(self._encoder.encode_null())
                 # we get rid of the value as it is represented as null
                 args = []
             else:
-                clause.append(u"%s")
-                args = [value]
+                clause.append(self._encoder.encode_placeholder())
+                args = [_adapted(adapt, value) if adapt else value]
 
+        if field_args:
+            args = field_args + args
         return clause, args
 
+    def _should_rewrite_in_list(self, op, values):
+        return (
+            self._in_list_options is not None and
+            op in ("in", "not_in") and
+            len(values) > self._in_list_options.threshold
+        )
+
+    def _generate_in_list_rewrite(self, values, column=None):
+        if self._in_list_options.strategy == "temp_table":
+            return self._generate_in_list_temp_table(values, column)
+
+        return self._generate_in_list_values(values)
+
+    def _generate_in_list_values(self, values):
+        query = []
+        with self._encoder.in_brackets(query):
+            query.append(u"SELECT * FROM")
+            with self._encoder.in_brackets(query):
+                query.append(u"VALUES")
+                row = self._encoder.encode_values_row()
+                query.append(u", ".join([row] * len(values)))
+            query.extend([u"AS", self._quoted(next(self.alias_gen))])
+
+        return query, values
+
+    def _generate_in_list_temp_table(self, values, declared_column=None):
+        options = self._in_list_options
+        table = u"_sqlquery_in_{}".format(len(self._teardown))
+        column = self._quoted(u"value")
+        column_type = (
+            options.column_type or
+            (declared_column and declared_column.sql_type) or
+            self._infer_column_type(values)
+        )
+
+        create = [u"CREATE TEMPORARY TABLE", self._quoted(table)]
+        with self._encoder.in_brackets(create):
+            create.extend([column, column_type])
+        self._setup.append((self._encoder.serialize_query_tokens(create), ()))
+
+        for start in range(0, len(values), options.batch_size):
+            batch = tuple(values[start:start + options.batch_size])
+            load = [u"INSERT INTO", self._quoted(table)]
+            with self._encoder.in_brackets(load):
+                load.append(column)
+            load.append(u"VALUES")
+            load.append(u", ".join(
+                [u"({})".format(self._encoder.encode_placeholder())] *
+                len(batch)
+            ))
+            self._setup.append(
+                (self._encoder.serialize_query_tokens(load), batch)
+            )
+
+        self._teardown.append((
+            self._encoder.serialize_query_tokens(
+                self._encoder.encode_drop_temporary_table(table)
+            ),
+            ()
+        ))
+
+        query = []
+        with self._encoder.in_brackets(query):
+            query.extend([u"SELECT", column, u"FROM", self._quoted(table)])
+
+        # the values are now only arguments of the setup statements
+        return query, []
+
+    def _infer_column_type(self, values):
+        """
+        Returns the column type of the first value of *values* which isn't
+        `None`
+        """
+        for value in values:
+            if value is None:
+                continue
+            try:
+                return self._encoder.encode_column_type(value)
+            except ValueError as error:
+                raise InvalidQueryException(str(error))
+
+        raise InvalidQueryException(
+            "Can't infer the column type of an IN list of NULL values, "
+            "pass column_type"
+        )
+
+    def _cached_fragment(self, key):
+        self._fragment_lookups[0] += 1
+        return self._fragment_cache.get(key)
+
+    def _fragment_context(self):
+        """
+        What the SQL of a condition depends on besides the condition
+        """
+        return (
+            type(self._encoder),
+            self._schema,
+            # tables declared later change how columns are compiled
+            self._schema.generation if self._schema is not None else None,
+            self.query_data.table,
+            self.query_data.join,
+        )
+
     def _generate_where_tableclause(self, clause):
+        if clause._fragments is not None and self._in_list_options is None:
+            context = self._fragment_context()
+            fragment = clause._fragments.get(context)
+            if fragment is None:
+                query, args = self._generate_logical_clause(clause)
+                fragment = clause._fragments[context] = (
+                    tuple(query), tuple(args)
+                )
+            return list(fragment[0]), list(fragment[1])
+
+        if self._fragment_cache is not None and self._in_list_options is None:
+            shape = _condition_shape(clause, self._shapes)
+            if shape is not None:
+                key = (self._fragment_context(), shape)
+                query = self._cached_fragment(key)
+                if query is not None:
+                    return list(query), self._condition_args(clause)
+
+                query, args = self._generate_logical_clause(clause)
+                self._fragment_cache.put(key, query)
+                return query, args
+
+        return self._generate_logical_clause(clause)
+
+    def _condition_key(self, clause):
+        """
+        Returns what identifies the SQL and arguments of the condition
+        *clause* on tables with the same columns, its shape and values, or
+        *clause* itself if it has no shape.
+        """
+        if not clause:
+            return clause
+        shape = _condition_shape(clause, self._shapes)
+        if shape is None:
+            return clause
+        # `1`, `1.0` and `True` are equal, but not the same argument
+        return shape, tuple(
+            (type(arg), arg)
+            for arg in self._condition_args(clause, adapted=False)
+        )
+
+    def _condition_args(self, clause, adapted=True):
+        """
+        Returns the arguments of *clause* in the order
+        :py:meth:`._generate_logical_clause` would compile them, their values
+        not adapted to their columns unless *adapted*.
+        """
+        args = []
+        for sub_clause in clause.conditions:
+            if isinstance(sub_clause, _LogicalOperator):
+                args.extend(self._condition_args(sub_clause, adapted))
+                continue
+
+            field, op, value = self._parse_where_clause_spec(sub_clause)
+            args.extend(_expression_args(field))
+            adapt = self._adapter(field) if adapted else None
+            if isinstance(value, _ArithmeticOperators):
+                args.extend(_expression_args(value))
+            elif (
+                not isinstance(value, string_types) and
+                isinstance(value, collections.Iterable)
+            ):
+                args.extend(
+                    [_adapted(adapt, item) for item in value] if adapt
+                    else value
+                )
+            elif value is not None:
+                args.append(_adapted(adapt, value) if adapt else value)
+
+        return args
+
+    def _generate_logical_clause(self, clause):
         query, args = [], []
         for sub_clause in _query_joiner(
             query,
@@ -614,11 +2053,37 @@ class SQLCompiler(object):
 
         return query, args
 
+    def _generate_cte(self):
+        if not self.query_data.cte:
+            return [], []
+
+        query, args = [u"WITH"], []
+        for name, builder in _query_joiner(query, self.query_data.cte):
+            query.extend([self._quoted(name), u"AS"])
+            with self._encoder.in_brackets(query):
+                sql, sql_args = self._compile_subquery(builder._query_data)
+                query.extend(sql)
+            args.extend(sql_args)
+
+        return query, args
+
+    def _where_clause(self):
+        where = self.query_data.where
+        if self.query_data.bulk_update is None:
+            return where
+
+        # only the rows being updated should be touched
+        key_column, updates = self.query_data.bulk_update
+        return extend_conditions(
+            where, [(key_column, "in", [row_key for row_key, _ in updates])]
+        )
+
     def _generate_where(self):
-        if not self.query_data.where:
+        where = self._where_clause()
+        if not where:
             return [], []
 
-        clause, args = self._generate_where_tableclause(self.query_data.where)
+        clause, args = self._generate_where_tableclause(where)
         clause.insert(0, u"WHERE")
         return clause, args
 
@@ -626,41 +2091,68 @@ class SQLCompiler(object):
         if self.query_data.offset is None:
             return [], []
 
-        return [u"OFFSET %s"], [self.query_data.offset]
+        return (
+            [u"OFFSET", self._encoder.encode_placeholder()],
+            [self.query_data.offset]
+        )
 
     def _generate_limit(self):
         if self.query_data.limit is None:
             return [], []
 
-        return [u"LIMIT %s"], [self.query_data.limit]
+        return (
+            [u"LIMIT", self._encoder.encode_placeholder()],
+            [self.query_data.limit]
+        )
 
     def _generate_order_by(self):
         if not self.query_data.order_by:
             return [], []
 
-        query = [u"ORDER BY"]
+        if self.query_data.union:
+            # the result of a union can only be ordered by its column names
+            encode_field = self._quoted
+        else:
+            encode_field = self._smart_encode_field
+
+        query, args = [u"ORDER BY"], []
         for order_by in _query_joiner(query, self.query_data.order_by):
-            if isinstance(order_by, string_types):
-                query.append(self._smart_encode_field(order_by))
-            else:
-                query.extend(
-                    [
-                        self._smart_encode_field(order_by.field),
-                        self._encoder.encode_order_by_dir(order_by.direction)
-                    ]
-                )
+            order_query, order_args = self._generate_ordering(
+                order_by, encode_field
+            )
+            query.extend(order_query)
+            args.extend(order_args)
 
-        return query, []
+        return query, args
+
+    def _generate_ordering(self, order_by, encode_field):
+        direction = None
+        if isinstance(order_by, _SQLOrdering):
+            order_by, direction = order_by.field, order_by.direction
+
+        if isinstance(order_by, string_types):
+            query, args = [encode_field(order_by)], []
+        else:
+            query, args = self._generate_field(order_by)
+
+        if direction:
+            query.append(self._encoder.encode_order_by_dir(direction))
+        return query, args
 
     def _generate_group_by(self):
         if not self.query_data.group_by:
             return [], []
 
-        query = [u"GROUP BY"]
-        for field in _query_joiner(query, self.query_data.group_by):
-            query.append(self._smart_encode_field(field))
+        fields, args = [], []
+        for field in _query_joiner(fields, self.query_data.group_by):
+            field_query, field_args = self._generate_field(field)
+            fields.extend(field_query)
+            args.extend(field_args)
 
-        return query, []
+        if self.query_data.rollup:
+            fields = self._encoder.encode_rollup(fields)
+
+        return [u"GROUP BY"] + fields, args
 
     def _generate_having(self):
         if not self.query_data.having:
@@ -671,11 +2163,17 @@ class SQLCompiler(object):
         return clause, args
 
     def _generate_query_operation(self):
+        if self.query_data.union:
+            return self._generate_union()
+
         if self.query_data.select:
             return self._generate_select()
 
         if self.query_data.delete is True:
-            return u"DELETE", []
+            return self._generate_delete()
+
+        if self.query_data.bulk_update is not None:
+            return self._generate_bulk_update()
 
         if self.query_data.update is not None:
             return self._generate_update()
@@ -686,26 +2184,268 @@ class SQLCompiler(object):
         raise InvalidQueryException
 
     def _raw_sql(self):
-        if not self.query_data.table:
+        if self.query_data.union:
+            if (
+                self.query_data.where or
+                self.query_data.group_by or
+                self.query_data.having
+            ):
+                raise InvalidQueryException(
+                    "A union can only be ordered and limited"
+                )
+        elif not self.query_data.table:
             raise Exception("requires both select and from")
 
-        main = self._generate_query_operation()
-        where = self._generate_where()
-        group_by = self._generate_group_by()
-        having = self._generate_having()
-        order_by = self._generate_order_by()
-        offset = self._generate_offset()
-        limit = self._generate_limit()
+        sources = self._clause_sources()
+        clauses = []
+        for generate in (
+            self._generate_cte,
+            self._generate_query_operation,
+            self._generate_where,
+            self._generate_group_by,
+            self._generate_having,
+            self._generate_order_by,
+            self._generate_offset,
+            self._generate_limit,
+        ):
+            source = sources.get(generate.__name__)
+            if not source:
+                clause = generate()
+            else:
+                clause = self._generate_cached_clause(generate, source)
+            if self._size_limit is not None:
+                _measure(self._estimate, *clause)
+                self._check_size(SizeEstimate(*self._estimate))
+            clauses.append(clause)
 
-        sql, sql_args = zip(
-            main, where, group_by, having, order_by, offset, limit
-        )
+        sql, sql_args = zip(*clauses)
         return itertools.chain(*sql), tuple(itertools.chain(*sql_args))
 
-    def sql(self):
-        sql, sql_args = self._raw_sql()
+    def _clause_sources(self):
+        """
+        Returns the query data each clause before the ordering of a select is
+        compiled from, by name of its generator. With a fragment cache, the
+        SQL of these clauses is cached by the identity of their query data,
+        so that queries derived from one another, e.g. the pages of a query,
+        only compile their ordering and limits.
+        """
+        query_data = self.query_data
+        if (
+            self._fragment_cache is None or
+            self._in_list_options is not None or
+            not query_data.select or
+            query_data.union or
+            query_data.cte
+        ):
+            return {}
+
+        return {
+            "_generate_query_operation": query_data.select,
+            "_generate_where": query_data.where,
+            "_generate_group_by": query_data.group_by,
+            "_generate_having": query_data.having,
+        }
+
+    def _generate_cached_clause(self, generate, source):
+        key = (
+            "clause",
+            generate.__name__,
+            self._fragment_context(),
+            self.query_data.rollup,
+            id(source),
+        )
+        # on a miss the fragments of the clause are looked up, which count
+        cached = self._fragment_cache.get(key, count_miss=False)
+        if cached is not None and cached[0] is source:
+            # the values of the clause may have changed since it was cached
+            _, query, serialized = cached
+            args = self._clause_args(generate.__name__, source)
+            if serialized is not None and self._size_limit is None:
+                # the clause is spaced as it would be within the query
+                return [serialized], args
+            return list(query), args
+
+        subqueries, lookups = len(self._subqueries), self._fragment_lookups[0]
+        query, args = generate()
+        if self._fragment_lookups[0] == lookups:
+            self._fragment_cache.count_miss()
+        if (
+            # a subquery takes aliases, which the following clauses depend on
+            len(self._subqueries) == subqueries and
+            list(args) == self._clause_args(generate.__name__, source)
+        ):
+            self._fragment_cache.put(key, (
+                source, tuple(query), self._serialized_clause(query)
+            ))
+        return query, args
+
+    def _clause_args(self, name, source):
+        """
+        Returns the arguments of the clause compiled by the generator *name*
+        from *source*. A clause whose arguments differ from these, e.g. with
+        arguments in a window function, isn't cached.
+        """
+        if name in ("_generate_where", "_generate_having"):
+            return self._condition_args(source)
 
-        return (
-            self._encoder.serialize_query_tokens(sql),
-            sql_args
+        args = []
+        for field in source:
+            args.extend(_expression_args(field))
+        return args
+
+    def _serialized_clause(self, query):
+        """
+        Returns the clause *query* as a single token, or `None` if it is
+        spaced differently on its own than within a query.
+        """
+        encoder = self._encoder
+        if (
+            not query or
+            encoder.is_space(query[0]) or
+            encoder.is_space(query[-1]) or
+            encoder.is_function(query[-1])
+        ):
+            return None
+        return encoder.serialize_query_tokens(query)
+
+    def _check_size(self, estimate, rows=None):
+        max_bytes, max_args = self._size_limit
+        if max_bytes is not None and estimate.total_bytes > max_bytes:
+            raise QueryTooLargeException(
+                "Query of about {} bytes exceeds {} bytes".format(
+                    estimate.total_bytes, max_bytes
+                ),
+                estimate,
+                rows
+            )
+        if max_args is not None and estimate.args > max_args:
+            raise QueryTooLargeException(
+                "Query with {} arguments exceeds {} arguments".format(
+                    estimate.args, max_args
+                ),
+                estimate,
+                rows
+            )
+
+    def row_args(self, row):
+        """
+        Returns the arguments *row* of an insert or a bulk update adds to the
+        query, in no particular order.
+        """
+        if self.query_data.insert is not None:
+            columns = self._insert_columns()
+            if len(row.keys()) != len(columns):
+                raise InvalidQueryException("Invalid number of column values")
+            args = []
+            for column in columns:
+                adapt = self._adapter(column)
+                value = row[column]
+                args.append(_adapted(adapt, value) if adapt else value)
+            return args
+
+        key_column = self.query_data.bulk_update[0]
+        adapt_key = self._adapter(key_column)
+        row_key, values = row
+        key = _adapted(adapt_key, row_key) if adapt_key else row_key
+        # the key is in the `IN` list and in each `WHEN`
+        args = [key]
+        for column, value in values.items():
+            args.append(key)
+            args.extend(self._generate_value(value, self._adapter(column))[1])
+        return args
+
+    def sql(self, max_bytes=None, max_args=None, measure=False):
+        """
+        See :py:meth:`.QueryBuilder.sql`. With *measure*, or any limit, the
+        size of the query is estimated while it is compiled and kept in
+        :py:attr:`estimated_size`, the size of the result is kept in
+        :py:attr:`actual_size`.
+        """
+        if max_bytes is None and max_args is None and not measure:
+            sql, sql_args = self._raw_sql()
+            return self._encoder.serialize_query_tokens(sql), sql_args
+
+        self._size_limit = SizeLimit(max_bytes, max_args)
+        self._estimate = [0, 0, 0]
+        try:
+            sql, sql_args = self._raw_sql()
+            query = self._encoder.serialize_query_tokens(sql)
+            self.estimated_size = SizeEstimate(*self._estimate)
+            actual = [0, 0, 0]
+            _measure(actual, (), sql_args)
+            self.actual_size = SizeEstimate(
+                len(query.encode("utf-8")), actual[1], actual[2]
+            )
+            self._check_size(self.actual_size)
+        finally:
+            self._size_limit = self._estimate = None
+
+        return query, sql_args
+
+    def bulk_load(self, rows=None, columns=None, format="tsv"):
+        """
+        See :py:meth:`.QueryBuilder.bulk_load`
+        """
+        if format not in BULK_LOAD_FORMATS:
+            raise InvalidQueryException(
+                "Unknown bulk load format <{}>".format(format)
+            )
+        if rows is None:
+            if self.query_data.insert is None:
+                raise InvalidQueryException(
+                    "A bulk load requires an insert or rows"
+                )
+            rows = self.query_data.insert
+            if columns is None:
+                columns = self._insert_columns()
+        elif columns is None:
+            raise InvalidQueryException("A bulk load of rows requires columns")
+        if not self.query_data.table:
+            raise InvalidQueryException("A bulk load requires a table")
+
+        try:
+            query = self._encoder.encode_bulk_load(
+                self._encode_main_table_name(include_alias=False),
+                [self._quoted_column(column) for column in columns],
+                format
+            )
+        except ValueError as error:
+            raise InvalidQueryException(str(error))
+
+        return BulkLoad(
+            self._encoder.serialize_query_tokens(query),
+            columns,
+            rows,
+            format=format,
+            from_file=self._encoder.BULK_LOAD_FROM_FILE,
+            adapters=[self._adapter(column) for column in columns]
+        )
+
+    def plan(self, in_list_threshold=1000, in_list_strategy="values",
+             batch_size=1000, column_type=None):
+        """
+        See :py:meth:`.QueryBuilder.plan`
+        """
+        if in_list_strategy not in IN_LIST_STRATEGIES:
+            raise InvalidQueryException(
+                "Unknown IN list strategy <{}>".format(in_list_strategy)
+            )
+
+        self._in_list_options = InListOptions(
+            threshold=in_list_threshold,
+            strategy=in_list_strategy,
+            batch_size=batch_size,
+            column_type=column_type,
+        )
+        self._setup, self._teardown = [], []
+        self._subqueries = {}
+        try:
+            query = self.sql()
+        finally:
+            self._in_list_options = None
+
+        return QueryPlan(
+            setup=tuple(self._setup),
+            query=query,
+            teardown=tuple(self._teardown),
         )
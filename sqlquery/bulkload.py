@@ -0,0 +1,189 @@
+"""
+Bulk loading of rows with `LOAD DATA LOCAL INFILE` (MySQL) or
+`COPY ... FROM STDIN` (PostgreSQL, with
+:py:class:`~.sqlencoding.ANSIEncodings`), which the server parses much faster
+than the text of a multi-row `INSERT`.
+
+A :py:class:`BulkLoad` is created with :py:meth:`.QueryBuilder.bulk_load`,
+either from the rows of an insert or from any iterable of tuples, which are
+streamed into the data file without building a dict per row:
+
+::
+
+    >>> load = QueryBuilder().on_table("events").bulk_load(
+            rows=read_events(), columns=("id", "kind")
+        )
+    >>> path = load.temp_file()
+    >>> cursor.execute(*load.statement(path))
+
+"""
+import datetime
+import decimal
+import io
+import operator
+import re
+import tempfile
+
+from six import binary_type, integer_types, string_types, text_type
+
+
+BULK_LOAD_FORMATS = ("tsv", "csv")
+
+
+_TSV_ESCAPES = {
+    u"\\": u"\\\\",
+    u"\t": u"\\t",
+    u"\n": u"\\n",
+    u"\r": u"\\r",
+    u"\0": u"\\0",
+}
+
+_TSV_SPECIAL = re.compile(u"[\\\\\t\n\r\0]")
+
+
+def _text_field(value):
+    """
+    Returns *value* as text, or `None` if it's a string which needs quoting
+    or escaping.
+    """
+    if isinstance(value, bool):
+        return u"1" if value else u"0"
+    if isinstance(value, integer_types):
+        return text_type(int(value))
+    if isinstance(value, float):
+        return text_type(repr(value))
+    if isinstance(value, decimal.Decimal):
+        return text_type(value)
+    if isinstance(value, datetime.datetime):
+        return text_type(value.isoformat(" "))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return text_type(value.isoformat())
+    if isinstance(value, string_types):
+        return None
+    if isinstance(value, (binary_type, bytearray)):
+        raise ValueError("Binary values can't be bulk loaded as text")
+
+    raise ValueError("Can't bulk load <{!r}>".format(value))
+
+
+def tsv_field(value):
+    """
+    Encodes *value* for the tab separated text format which both `LOAD DATA`
+    and `COPY` read by default, `NULL` being `\\N`.
+    """
+    if value is None:
+        return u"\\N"
+    field = _text_field(value)
+    if field is not None:
+        return field
+    return _TSV_SPECIAL.sub(lambda match: _TSV_ESCAPES[match.group()], value)
+
+
+def csv_field(value):
+    """
+    Encodes *value* for CSV, strings being quoted and `NULL` the unquoted
+    word `NULL`.
+    """
+    if value is None:
+        return u"NULL"
+    field = _text_field(value)
+    if field is not None:
+        return field
+    return u'"{}"'.format(value.replace(u'"', u'""'))
+
+
+_SEPARATORS = {
+    "tsv": (u"\t", tsv_field),
+    "csv": (u",", csv_field),
+}
+
+
+class BulkLoad(object):
+    """
+    The statement *sql* which loads *rows*, dicts or tuples in the order of
+    *columns*, from a data file in *format*, `"tsv"` or `"csv"`. If
+    *from_file* is set the statement reads a file whose name is its
+    argument, otherwise it reads the data sent with it, e.g. with psycopg2's
+    `copy_expert`. *adapters* are the column adapters of the schema, `None`
+    for columns without one.
+    """
+    def __init__(self, sql, columns, rows, format="tsv", from_file=True,
+                 adapters=None):
+        if format not in BULK_LOAD_FORMATS:
+            raise ValueError("Unknown bulk load format <{}>".format(format))
+
+        self.sql = sql
+        self.columns = tuple(columns)
+        self.rows = rows
+        self.format = format
+        self.from_file = from_file
+        self.adapters = tuple(adapters or (None,) * len(self.columns))
+
+    def statement(self, filename=None):
+        """
+        Returns the `(query_string, arguments)` of the statement, which loads
+        the file *filename* if the statement reads from a file.
+        """
+        if not self.from_file:
+            return self.sql, ()
+        if filename is None:
+            raise ValueError("The statement loads a file, a name is required")
+        return self.sql, (filename,)
+
+    def _tuples(self):
+        get_values = operator.itemgetter(*self.columns)
+        single = len(self.columns) == 1
+        for row in self.rows:
+            if isinstance(row, dict):
+                row = get_values(row)
+                if single:
+                    row = (row,)
+            yield row
+
+    def lines(self):
+        """
+        Yields a line of the data file for each row.
+        """
+        separator, encode = _SEPARATORS[self.format]
+        adapters = self.adapters
+        adapt = any(adapters)
+        for row in self._tuples():
+            if len(row) != len(self.columns):
+                raise ValueError("Invalid number of column values")
+            if adapt:
+                row = [
+                    adapter(value) if adapter else value
+                    for adapter, value in zip(adapters, row)
+                ]
+            yield separator.join(map(encode, row)) + u"\n"
+
+    def write(self, output):
+        """
+        Writes the data file into the text file object *output* and returns
+        the number of rows written.
+        """
+        count = 0
+        for line in self.lines():
+            output.write(line)
+            count += 1
+        return count
+
+    def buffer(self):
+        """
+        Returns the data file in an `io.StringIO`
+        """
+        output = io.StringIO()
+        self.write(output)
+        output.seek(0)
+        return output
+
+    def temp_file(self, dir=None):
+        """
+        Writes the data file, encoded as UTF-8, into a new temporary file in
+        *dir* and returns its name. The caller should remove the file once
+        it has been loaded.
+        """
+        handle, name = tempfile.mkstemp(suffix="." + self.format, dir=dir)
+        with io.open(handle, "w", encoding="utf-8", newline="") as output:
+            self.write(output)
+        return name
@@ -0,0 +1,150 @@
+"""
+Mass deletes and updates executed as a series of small statements, so that
+each statement only holds its locks, and adds to replication lag, for a
+bounded number of rows:
+
+::
+
+    >>> mutation = ChunkedMutation(
+            delete().on_table("events").where(("created__lt", cutoff)),
+            key="id",
+            batch_size=500
+        )
+    >>> mutation.execute(cursor, pace=lambda affected, total: time.sleep(0.1))
+    1234567
+
+"""
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery._querybuilder import extend_conditions
+
+
+CHUNKING_STRATEGIES = ("limit", "keyset")
+
+
+class ChunkedMutation(object):
+    """
+    Splits the `DELETE` or `UPDATE` in *builder* into batches of at most
+    *batch_size* rows, ordered by the column *key* which should be unique
+    and indexed, usually the primary key.
+
+    With the `"limit"` *strategy* the same statement, ordered by *key* and
+    limited to *batch_size* rows, is executed until it affects no rows. An
+    update must therefore exclude the rows it has already updated in its
+    `WHERE` clause.
+
+    With the `"keyset"` *strategy* the keys of the next batch of matching
+    rows are selected first, and the statement is restricted to the range of
+    those keys. This also works for databases which don't support `LIMIT`
+    on a `DELETE` or `UPDATE`.
+
+    *encoder* and *schema* are passed to :py:meth:`.QueryBuilder.sql`.
+    """
+    def __init__(self, builder, key="id", batch_size=1000, strategy="limit",
+                 encoder=None, schema=None):
+        query_data = builder._query_data
+        if query_data.delete is not True and query_data.update is None:
+            raise InvalidQueryException(
+                "Only a delete or an update can be chunked"
+            )
+        if strategy not in CHUNKING_STRATEGIES:
+            raise InvalidQueryException(
+                "Unknown chunking strategy <{}>".format(strategy)
+            )
+
+        self.builder = builder
+        self.key = key
+        self.batch_size = int(batch_size)
+        self.strategy = strategy
+        self.encoder = encoder
+        self.schema = schema
+
+    def _sql(self, builder):
+        return builder.sql(encoder=self.encoder, schema=self.schema)
+
+    def _with_conditions(self, query_data, *conditions):
+        return QueryBuilder(query_data._replace(
+            where=extend_conditions(query_data.where, conditions)
+        ))
+
+    def limit_statement(self):
+        """
+        Returns the `(query_string, arguments)` executed by the `"limit"`
+        strategy.
+        """
+        return self._sql(
+            self.builder.order_by(self.key).limit(self.batch_size)
+        )
+
+    def keys_statement(self, after=None):
+        """
+        Returns the `(query_string, arguments)` selecting the keys of the next
+        batch, i.e. of the matching rows with a key greater than *after*.
+        """
+        query_data = self.builder._query_data._replace(
+            select=(self.key,),
+            update=None,
+            delete=None,
+            order_by=(self.key,),
+            offset=None,
+            limit=self.batch_size,
+        )
+        if after is None:
+            return self._sql(QueryBuilder(query_data))
+
+        return self._sql(self._with_conditions(
+            query_data, (self.key, "gt", after)
+        ))
+
+    def range_statement(self, first, last):
+        """
+        Returns the `(query_string, arguments)` for the batch of rows with
+        keys from *first* to *last*.
+        """
+        return self._sql(self._with_conditions(
+            self.builder._query_data._replace(
+                order_by=None, offset=None, limit=None
+            ),
+            (self.key, "gte", first),
+            (self.key, "lte", last)
+        ))
+
+    def batches(self, cursor):
+        """
+        Executes the batches with a DB-API *cursor*, yielding the number of
+        rows affected by each batch. Stops once a batch affects no rows, or,
+        with the `"keyset"` strategy, once no more keys are selected.
+        """
+        if self.strategy == "limit":
+            sql, args = self.limit_statement()
+            while True:
+                cursor.execute(sql, args)
+                if cursor.rowcount <= 0:
+                    return
+                yield cursor.rowcount
+
+        after = None
+        while True:
+            cursor.execute(*self.keys_statement(after))
+            keys = [row[0] for row in cursor.fetchall()]
+            if not keys:
+                return
+
+            cursor.execute(*self.range_statement(keys[0], keys[-1]))
+            yield max(cursor.rowcount, 0)
+            after = keys[-1]
+
+    def execute(self, cursor, pace=None):
+        """
+        Executes all batches, see :py:meth:`.batches`, and returns the total
+        number of affected rows. *pace* is called after each batch with the
+        number of rows the batch affected and the running total, e.g. to
+        sleep between batches or to record progress.
+        """
+        total = 0
+        for affected in self.batches(cursor):
+            total += affected
+            if pace is not None:
+                pace(affected, total)
+
+        return total
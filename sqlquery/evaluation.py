@@ -0,0 +1,565 @@
+"""
+Evaluation of `where` conditions in python, with the semantics of the SQL
+they compile to, against rows held in memory or against columns of NumPy
+arrays:
+
+::
+
+    >>> predicate = Predicate(
+            select("id").on_table("users").where(
+                OR(("age__gte", 18), ("name__like", "b%"))
+            )
+        )
+    >>> predicate({"id": 1, "age": 12, "name": "bob"})
+    True
+    >>> predicate.mask({"age": numpy.array([12, 20]), "name": ["al", "c"]})
+    array([False,  True])
+
+Rows are dicts, e.g. from :py:meth:`.RowDecoder.dicts`, and columns dicts of
+sequences, e.g. from :py:meth:`.RowDecoder.numpy`. A column named
+`table.column` is looked up by that name first, then by `column`.
+
+Comparisons with `NULL` (`None`) are unknown, as in SQL, and a row only
+matches if the whole condition is true. Every operator, `=`, `<`, `IN`,
+`LIKE` and alike, compares strings with the same collation: a binary, case
+sensitive one by default, as in PostgreSQL, or one which ignores case, like
+the default collations of MySQL, if *case_sensitive* is false. Note that
+SQLite's `LIKE` ignores case unless `PRAGMA case_sensitive_like` is on.
+Integer division and `%` round toward zero, as in SQL, not down.
+Subqueries and unbound parameters can't be evaluated, nor functions
+other than `COALESCE`, `GREATEST` and `LEAST`, which rows support but
+columns don't.
+"""
+import array
+import operator
+import re
+
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import Param
+from sqlquery._querybuilder import SQLFunction
+from sqlquery._querybuilder import _ArithmeticExpression
+from sqlquery._querybuilder import _ArithmeticOperators
+from sqlquery._querybuilder import _Field
+from sqlquery._querybuilder import _LogicalOperator
+from sqlquery._querybuilder import parse_condition
+from sqlquery.sqlencoding import Literal
+
+from six import string_types, text_type
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+_COMPARISONS = {
+    "eq": operator.eq,
+    "neq": operator.ne,
+    "gte": operator.ge,
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+def _truncated_div(left, right):
+    """
+    Integer division rounding toward zero, as `DIV` in MySQL and `/` of
+    integers in SQLite, rather than down as Python's `//`. Works with NumPy
+    arrays too.
+    """
+    negative = (left < 0) != (right < 0)
+    return (abs(left) // abs(right)) * (1 - 2 * negative)
+
+
+def _truncated_mod(left, right):
+    """
+    The remainder of :py:func:`._truncated_div`, which has the sign of
+    *left* as `%` in SQL, rather than that of *right* as in Python.
+    """
+    return left - right * _truncated_div(left, right)
+
+
+_ARITHMETIC = {
+    "add": operator.add,
+    "sub": operator.sub,
+    "mult": operator.mul,
+    "div": operator.truediv,
+    "idiv": _truncated_div,
+    "mod": _truncated_mod,
+}
+
+
+def like_pattern(pattern, case_sensitive=False, escape=u"\\"):
+    """
+    Returns a compiled regular expression matching the same strings as the
+    SQL `LIKE` *pattern*.
+    """
+    parts = []
+    characters = iter(pattern)
+    for character in characters:
+        if character == escape:
+            parts.append(re.escape(next(characters, escape)))
+        elif character == u"%":
+            parts.append(u".*")
+        elif character == u"_":
+            parts.append(u".")
+        else:
+            parts.append(re.escape(character))
+
+    flags = re.DOTALL if case_sensitive else re.DOTALL | re.IGNORECASE
+    return re.compile(u"".join(parts) + u"\\Z", flags)
+
+
+def _column(row, name):
+    try:
+        return row[name]
+    except KeyError:
+        if u"." not in name:
+            raise
+        return row[name.rsplit(u".", 1)[-1]]
+
+
+def _column_getter(name):
+    def get(row):
+        try:
+            return _column(row, name)
+        except KeyError:
+            raise InvalidQueryException("Unknown column <{}>".format(name))
+    return get
+
+
+def _check_value(value):
+    if isinstance(value, QueryBuilder):
+        raise InvalidQueryException("Subqueries can't be evaluated")
+    if isinstance(value, Param):
+        raise InvalidQueryException(
+            "The parameter <{}> must be bound first".format(value.name)
+        )
+    if (
+        isinstance(value, _ArithmeticOperators) and
+        not isinstance(value, (_Field, _ArithmeticExpression))
+    ):
+        raise InvalidQueryException(
+            "<{!r}> can't be evaluated".format(value)
+        )
+
+
+def _in_values(values):
+    _check_value(values)
+    values = list(values)
+    for value in values:
+        _check_value(value)
+    return values
+
+
+def _folded(value):
+    return value.lower() if isinstance(value, string_types) else value
+
+
+def _folding(evaluate):
+    return lambda row: _folded(evaluate(row))
+
+
+def _coalesce(*values):
+    return next((value for value in values if value is not None), None)
+
+
+def _null_if_any_null(function):
+    def apply(*values):
+        if any(value is None for value in values):
+            return None
+        return function(values)
+    return apply
+
+
+_FUNCTIONS = {
+    "coalesce": _coalesce,
+    "greatest": _null_if_any_null(max),
+    "least": _null_if_any_null(min),
+}
+
+
+def compile_expression(expression, constant=True, extension=None):
+    """
+    Returns a function of a row returning the value of *expression*, which
+    is a column name unless it's a *constant*.
+
+    *extension* is called with each node of the expression which isn't a
+    column, a constant or arithmetic, and can return a function of the row
+    evaluating the node, e.g. for aggregates, or `None`.
+    """
+    if isinstance(expression, string_types) and not constant:
+        if isinstance(expression, Literal):
+            return lambda row: expression
+        return _column_getter(expression)
+    if isinstance(expression, _Field):
+        return _column_getter(expression.field)
+    if isinstance(expression, _ArithmeticExpression):
+        return _compile_arithmetic(expression, extension)
+
+    if extension is not None:
+        evaluate = extension(expression)
+        if evaluate is not None:
+            return evaluate
+    if (
+        isinstance(expression, SQLFunction) and
+        expression.function in _FUNCTIONS
+    ):
+        function = _FUNCTIONS[expression.function]
+        arguments = [
+            compile_expression(field, constant=False, extension=extension)
+            for field in expression.fields
+        ]
+        return lambda row: function(*[argument(row) for argument in arguments])
+
+    _check_value(expression)
+    return lambda row: expression
+
+
+def _compile_arithmetic(expression, extension):
+    apply = _ARITHMETIC[expression.operator]
+    left = compile_expression(expression.left, extension=extension)
+    right = compile_expression(expression.right, extension=extension)
+
+    def evaluate(row):
+        left_value, right_value = left(row), right(row)
+        if left_value is None or right_value is None:
+            return None
+        try:
+            return apply(left_value, right_value)
+        except ZeroDivisionError:
+            # division by zero is NULL in MySQL and SQLite
+            return None
+
+    return evaluate
+
+
+def _conditions(condition):
+    """
+    Returns the `_LogicalOperator` for *condition*, which may also be a
+    builder, a single condition or `None`.
+    """
+    if isinstance(condition, QueryBuilder):
+        condition = condition._query_data.where
+    if condition is None or isinstance(condition, _LogicalOperator):
+        return condition
+    return _LogicalOperator((condition,), "and")
+
+
+class Predicate(object):
+    """
+    The `where` *condition*: a :py:class:`~.QueryBuilder` whose `where` is
+    used, a condition built with :py:func:`~.queryapi.AND` and alike, or a
+    single condition such as `("id__eq", 1)`. `None` matches everything.
+    Strings are compared case insensitively unless *case_sensitive*.
+    *extension* is passed to :py:func:`.compile_expression` when evaluating
+    rows.
+    """
+    def __init__(self, condition, case_sensitive=True, extension=None):
+        self.condition = _conditions(condition)
+        self.case_sensitive = case_sensitive
+        self.extension = extension
+        self._evaluate = (
+            self._compile_logical(self.condition)
+            if self.condition is not None else lambda row: True
+        )
+
+    def __call__(self, row):
+        """
+        Whether *row* matches.
+        """
+        return self._evaluate(row) is True
+
+    def evaluate(self, row):
+        """
+        Returns `True`, `False` or `None` if the condition is unknown for
+        *row*, i.e. SQL's `NULL`.
+        """
+        return self._evaluate(row)
+
+    def filter(self, rows):
+        """
+        Returns a list of the matching *rows*.
+        """
+        evaluate = self._evaluate
+        return [row for row in rows if evaluate(row) is True]
+
+    # Evaluating single rows, the condition is compiled into functions
+    def _compile_logical(self, condition):
+        evaluators = [
+            self._compile_logical(sub_condition)
+            if isinstance(sub_condition, _LogicalOperator)
+            else self._compile_condition(*parse_condition(sub_condition))
+            for sub_condition in condition.conditions
+        ]
+
+        if condition.operator == "and":
+            def evaluate(row):
+                result = True
+                for evaluator in evaluators:
+                    value = evaluator(row)
+                    if value is False:
+                        return False
+                    if value is None:
+                        result = None
+                return result
+        elif condition.operator == "or":
+            def evaluate(row):
+                result = False
+                for evaluator in evaluators:
+                    value = evaluator(row)
+                    if value is True:
+                        return True
+                    if value is None:
+                        result = None
+                return result
+        elif condition.operator == "xor":
+            def evaluate(row):
+                result = False
+                for evaluator in evaluators:
+                    value = evaluator(row)
+                    if value is None:
+                        return None
+                    result = result is not bool(value)
+                return result
+        else:
+            raise InvalidQueryException(
+                "Unknown operator <{}>".format(condition.operator)
+            )
+
+        return evaluate
+
+    def _compile_condition(self, field, op, value):
+        get_field = compile_expression(
+            field, constant=False, extension=self.extension
+        )
+        if not self.case_sensitive:
+            get_field = _folding(get_field)
+
+        if op in _COMPARISONS:
+            compare = _COMPARISONS[op]
+            get_value = compile_expression(value, extension=self.extension)
+            if not self.case_sensitive:
+                get_value = _folding(get_value)
+
+            def evaluate(row):
+                field_value, other = get_field(row), get_value(row)
+                if field_value is None or other is None:
+                    return None
+                return bool(compare(field_value, other))
+        elif op in ("is", "isnot"):
+            _check_value(value)
+            negate = op == "isnot"
+
+            def evaluate(row):
+                field_value = get_field(row)
+                if value is None:
+                    return (field_value is None) is not negate
+                return (
+                    field_value is not None and
+                    bool(field_value) is bool(value)
+                ) is not negate
+        elif op == "like":
+            if value is None:
+                return lambda row: None
+            if not isinstance(value, string_types):
+                raise InvalidQueryException("Only a pattern can be evaluated")
+            match = like_pattern(value, self.case_sensitive).match
+
+            def evaluate(row):
+                field_value = get_field(row)
+                if field_value is None:
+                    return None
+                return match(text_type(field_value)) is not None
+        elif op in ("in", "not_in"):
+            values = _in_values(value)
+            if not self.case_sensitive:
+                values = [_folded(item) for item in values]
+            has_null = None in values
+            try:
+                values = frozenset(values)
+            except TypeError:
+                pass
+            found, not_found = (
+                (True, False) if op == "in" else (False, True)
+            )
+
+            def evaluate(row):
+                field_value = get_field(row)
+                if field_value is None:
+                    return None
+                if field_value in values:
+                    return found
+                return None if has_null else not_found
+        else:
+            raise InvalidQueryException(
+                "<{}> can't be evaluated".format(op)
+            )
+
+        return evaluate
+
+    # Evaluating columns, each node is a pair of masks of the rows for which
+    # it is true and of those for which it is false
+    def mask(self, columns):
+        """
+        Returns a NumPy array of booleans, true for each matching row of
+        *columns*, a dict of column name to sequence of its values. Requires
+        NumPy to be installed.
+        """
+        if numpy is None:
+            raise ImportError("numpy is required for mask()")
+
+        columns = dict(
+            (name, numpy.asarray(values)) if isinstance(
+                values, (numpy.ndarray, array.array)
+            ) else (name, numpy.array(values, dtype=object))
+            for name, values in columns.items()
+        )
+        size = len(next(iter(columns.values()))) if columns else 0
+        if self.condition is None:
+            return numpy.ones(size, dtype=bool)
+
+        is_true, _ = self._mask_logical(self.condition, columns, size)
+        return is_true
+
+    def _mask_logical(self, condition, columns, size):
+        masks = [
+            self._mask_logical(sub_condition, columns, size)
+            if isinstance(sub_condition, _LogicalOperator)
+            else self._mask_condition(
+                columns, size, *parse_condition(sub_condition)
+            )
+            for sub_condition in condition.conditions
+        ]
+
+        is_true, is_false = masks[0]
+        for sub_true, sub_false in masks[1:]:
+            if condition.operator == "and":
+                is_true, is_false = is_true & sub_true, is_false | sub_false
+            elif condition.operator == "or":
+                is_true, is_false = is_true | sub_true, is_false & sub_false
+            elif condition.operator == "xor":
+                is_true, is_false = (
+                    (is_true & sub_false) | (is_false & sub_true),
+                    (is_true & sub_true) | (is_false & sub_false),
+                )
+            else:
+                raise InvalidQueryException(
+                    "Unknown operator <{}>".format(condition.operator)
+                )
+        return is_true, is_false
+
+    def _column_values(self, columns, name, size):
+        try:
+            values = _column(columns, name)
+        except KeyError:
+            raise InvalidQueryException("Unknown column <{}>".format(name))
+        if not self.case_sensitive and values.dtype.kind in "OSU":
+            values = numpy.frompyfunc(_folded, 1, 1)(values)
+        if values.dtype == object:
+            return values, numpy.equal(values, None).astype(bool)
+        return values, numpy.zeros(size, dtype=bool)
+
+    def _mask_expression(self, expression, columns, size, constant=True):
+        """
+        Returns the values of *expression* and the mask of those which are
+        `NULL`, see :py:meth:`._compile_expression`.
+        """
+        if isinstance(expression, string_types) and not constant:
+            return self._column_values(columns, expression, size)
+        _check_value(expression)
+        if isinstance(expression, _Field):
+            return self._column_values(columns, expression.field, size)
+        if not isinstance(expression, _ArithmeticExpression):
+            if not self.case_sensitive:
+                expression = _folded(expression)
+            return expression, numpy.full(size, expression is None)
+
+        return self._apply(
+            _ARITHMETIC[expression.operator],
+            self._mask_expression(expression.left, columns, size),
+            self._mask_expression(expression.right, columns, size),
+        )
+
+    def _apply(self, function, left, right):
+        """
+        Applies *function* to the values which aren't `NULL` on either side.
+        """
+        (left, left_null), (right, right_null) = left, right
+        null = left_null | right_null
+        if not null.any():
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                return function(left, right), null
+
+        keep = ~null
+        values = numpy.empty(len(null), dtype=object)
+        if keep.any():
+            values[keep] = function(
+                left[keep] if isinstance(left, numpy.ndarray) else left,
+                right[keep] if isinstance(right, numpy.ndarray) else right,
+            )
+        return values, null
+
+    def _mask_condition(self, columns, size, field, op, value):
+        values, null = self._mask_expression(
+            field, columns, size, constant=False
+        )
+
+        if op in _COMPARISONS:
+            result, null = self._apply(
+                _COMPARISONS[op],
+                (values, null),
+                self._mask_expression(value, columns, size)
+            )
+            result = numpy.asarray(result).astype(bool)
+        elif op in ("is", "isnot"):
+            _check_value(value)
+            if value is None:
+                result = null.copy()
+            else:
+                result = ~null
+                result[result] = (
+                    values[result].astype(bool) == bool(value)
+                )
+            if op == "isnot":
+                result = ~result
+            return result, ~result
+        elif op == "like":
+            if value is None:
+                null = numpy.ones(size, dtype=bool)
+                result = ~null
+            elif not isinstance(value, string_types):
+                raise InvalidQueryException("Only a pattern can be evaluated")
+            else:
+                match = like_pattern(value, self.case_sensitive).match
+                result, null = self._apply(
+                    numpy.frompyfunc(
+                        lambda text, _: match(text_type(text)) is not None,
+                        2, 1
+                    ),
+                    (values, null),
+                    (None, numpy.zeros(size, dtype=bool)),
+                )
+                result = numpy.asarray(result).astype(bool)
+        elif op in ("in", "not_in"):
+            in_values = _in_values(value)
+            if not self.case_sensitive:
+                in_values = [_folded(item) for item in in_values]
+            if None in in_values:
+                in_values = [item for item in in_values if item is not None]
+                # not finding a value in a list with NULL is unknown
+                unknown = numpy.ones(size, dtype=bool)
+            else:
+                unknown = numpy.zeros(size, dtype=bool)
+            result = ~null
+            result[result] = numpy.isin(values[result], in_values)
+            null = null | (unknown & ~result)
+            if op == "not_in":
+                result = ~result
+        else:
+            raise InvalidQueryException(
+                "<{}> can't be evaluated".format(op)
+            )
+
+        return result & ~null, ~result & ~null
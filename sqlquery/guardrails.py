@@ -0,0 +1,257 @@
+"""
+Checks of queries against rules which catch expensive or dangerous queries
+before they are compiled.
+
+A :py:class:`QueryAnalyzer` reports every rule a query violates to a
+callback, e.g. to count how often each rule triggers, and rejects the
+query if any of the violated rules should be enforced:
+
+::
+
+    >>> analyzer = QueryAnalyzer(
+            large_tables=("events",),
+            reject=("mutation_without_where",),
+            report=lambda violation, builder: stats.incr(violation.rule)
+        )
+    >>> analyzer.sql(delete().on_table("events"))
+    Traceback (most recent call last):
+    ...
+    QueryRejectedException: Mutation of <events> without a WHERE clause
+
+"""
+import collections
+from collections import namedtuple
+
+from sqlquery._querybuilder import _LogicalOperator
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import parse_condition
+
+from six import integer_types, string_types
+
+
+RULES = (
+    "mutation_without_where",
+    "unbounded_select",
+    "large_in_list",
+    "large_offset",
+    "unindexed_where",
+)
+
+
+class QueryRejectedException(InvalidQueryException):
+    """
+    Raised by :py:meth:`.QueryAnalyzer.check` for a query which violates a
+    rule that is enforced. *violations* are all the
+    :py:class:`.Violation` of the query.
+    """
+    def __init__(self, message, violations=()):
+        super(QueryRejectedException, self).__init__(message)
+        self.violations = violations
+
+
+Violation = namedtuple(
+    'Violation',
+    [
+        'rule',
+        'message',
+    ]
+)
+
+
+def _iter_conditions(clause):
+    if clause is None:
+        return
+    if isinstance(clause, _LogicalOperator):
+        for condition in clause.conditions:
+            for sub_condition in _iter_conditions(condition):
+                yield sub_condition
+        return
+    yield parse_condition(clause)
+
+
+class QueryAnalyzer(object):
+    """
+    Analyzes the :py:class:`~._querybuilder.QueryData` of queries, including
+    their subqueries, common table expressions and union branches.
+
+    The rules are:
+
+    - `"mutation_without_where"`, a delete or update without a `WHERE`
+      clause.
+    - `"unbounded_select"`, a select without a `LIMIT` on one of
+      *large_tables*.
+    - `"large_in_list"`, an `IN` list with more than *max_in_list* values.
+    - `"large_offset"`, an `OFFSET` larger than *max_offset*.
+    - `"unindexed_where"`, a `WHERE` clause which doesn't use any indexed
+      column of its table, when the table is declared in the
+      :py:class:`~.schema.SchemaRegistry` *schema*.
+
+    Only the rules in *rules* are checked, by default all of them. *report*
+    is called with each :py:class:`.Violation` and the builder of the query.
+    Queries violating any of the rules in *reject* are rejected, the
+    violations of the other rules are only reported. *counts* counts the
+    violations of each rule.
+    """
+    def __init__(self, rules=RULES, reject=(), report=None, schema=None,
+                 large_tables=(), max_in_list=1000, max_offset=10000):
+        unknown = set(rules) | set(reject)
+        unknown.difference_update(RULES)
+        if unknown:
+            raise InvalidQueryException(
+                "Unknown rules <{}>".format(", ".join(sorted(unknown)))
+            )
+
+        self.rules = frozenset(rules)
+        self.reject = frozenset(reject)
+        self.report = report
+        self.schema = schema
+        self.large_tables = frozenset(large_tables)
+        self.max_in_list = max_in_list
+        self.max_offset = max_offset
+        self.counts = collections.Counter()
+
+    def analyze(self, builder):
+        """
+        Returns a list of the :py:class:`.Violation` of the query in
+        *builder*, without reporting or rejecting them.
+        """
+        violations = []
+        self._analyze(builder._query_data, violations)
+        return [
+            violation for violation in violations
+            if violation.rule in self.rules
+        ]
+
+    def check(self, builder):
+        """
+        Reports the violations of the query in *builder* and raises
+        :py:class:`.QueryRejectedException` if any of them should be
+        rejected. Returns *builder* so that it can be used inline.
+        """
+        violations = self.analyze(builder)
+        for violation in violations:
+            self.counts[violation.rule] += 1
+            if self.report is not None:
+                self.report(violation, builder)
+
+        rejected = [
+            violation for violation in violations
+            if violation.rule in self.reject
+        ]
+        if rejected:
+            raise QueryRejectedException(
+                "; ".join(violation.message for violation in rejected),
+                violations
+            )
+
+        return builder
+
+    def sql(self, builder, encoder=None):
+        """
+        Checks the query in *builder* and returns its
+        `(query_string, arguments)`, see :py:meth:`.QueryBuilder.sql`.
+        """
+        return self.check(builder).sql(encoder=encoder, schema=self.schema)
+
+    def _analyze(self, query_data, violations):
+        table = query_data.table.name if query_data.table else None
+        is_mutation = (
+            query_data.delete is True or query_data.update is not None
+        )
+
+        if (
+            is_mutation and
+            query_data.where is None and
+            query_data.bulk_update is None
+        ):
+            violations.append(Violation(
+                "mutation_without_where",
+                "Mutation of <{}> without a WHERE clause".format(table)
+            ))
+
+        if (
+            query_data.select is not None and
+            query_data.limit is None and
+            table in self.large_tables
+        ):
+            violations.append(Violation(
+                "unbounded_select",
+                "Select on the large table <{}> without a LIMIT".format(table)
+            ))
+
+        if (
+            isinstance(query_data.offset, integer_types) and
+            query_data.offset > self.max_offset
+        ):
+            violations.append(Violation(
+                "large_offset",
+                "OFFSET {} is larger than {}".format(
+                    query_data.offset, self.max_offset
+                )
+            ))
+
+        if (
+            query_data.bulk_update is not None and
+            len(query_data.bulk_update[1]) > self.max_in_list
+        ):
+            violations.append(self._large_in_list(
+                query_data.bulk_update[0], len(query_data.bulk_update[1])
+            ))
+
+        for clause in (query_data.where, query_data.having):
+            for field, op, value in _iter_conditions(clause):
+                if isinstance(value, QueryBuilder):
+                    self._analyze(value._query_data, violations)
+                elif (
+                    op == "in" and
+                    isinstance(value, collections.Sized) and
+                    not isinstance(value, string_types) and
+                    len(value) > self.max_in_list
+                ):
+                    violations.append(self._large_in_list(field, len(value)))
+
+        if query_data.where is not None and self.schema is not None:
+            self._check_indexes(query_data, violations)
+
+        for _, cte_builder in query_data.cte or ():
+            self._analyze(cte_builder._query_data, violations)
+
+        if query_data.union is not None:
+            for branch in query_data.union[1]:
+                self._analyze(branch._query_data, violations)
+
+    def _large_in_list(self, field, size):
+        return Violation(
+            "large_in_list",
+            "IN list on <{}> has {} values, more than {}".format(
+                field, size, self.max_in_list
+            )
+        )
+
+    def _check_indexes(self, query_data, violations):
+        table = query_data.table
+        declared = self.schema.get_table(table.name, table.schema)
+        if declared is None:
+            return
+
+        columns = dict((column.name, column) for column in declared.columns)
+        used = []
+        for field, _, _ in _iter_conditions(query_data.where):
+            if not isinstance(field, string_types):
+                continue
+            if field.startswith(table.name + '.'):
+                field = field[len(table.name) + 1:]
+            column = columns.get(field)
+            if column is None:
+                continue
+            if column.indexed:
+                return
+            used.append(field)
+
+        if used:
+            violations.append(Violation(
+                "unindexed_where",
+                "WHERE clause on <{}> only uses the unindexed columns "
+                "<{}>".format(table.name, ", ".join(used))
+            ))
@@ -0,0 +1,168 @@
+"""
+Interning (hash-consing) of condition trees and functions.
+
+Filters built by rules often share large subtrees, e.g. the same tenant or
+soft delete conditions. An :py:class:`Interner` returns a single shared node
+for structurally identical conditions, functions and expressions, so that
+they are only held once, can be compared by identity and the SQL compiled
+for a shared condition is reused by every query containing it:
+
+::
+
+    >>> interner = Interner()
+    >>> visible = interner.AND(("tenant_id__eq", 7), ("deleted__is", None))
+    >>> visible is interner.AND(("tenant_id__eq", 7), ("deleted__is", None))
+    True
+    >>> select("id").on_table("posts").where(visible, ("author__eq", "bob"))
+
+Interned nodes must not be modified. The interner holds every node it has
+returned, :py:meth:`Interner.clear` releases them.
+"""
+from sqlquery._querybuilder import Param
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import SQLFunction
+from sqlquery._querybuilder import _ArithmeticExpression
+from sqlquery._querybuilder import _ArithmeticOperators
+from sqlquery._querybuilder import _Field
+from sqlquery._querybuilder import _LogicalOperator
+from sqlquery._querybuilder import logical_and, logical_or, logical_xor
+from sqlquery._querybuilder import parse_condition
+
+
+class Interner(object):
+    """
+    A factory of shared nodes, see :py:mod:`~sqlquery.interning`. The key of
+    a node is built from the identity of its already interned children, so
+    interning a node only hashes its own fields.
+    """
+    def __init__(self):
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def clear(self):
+        """
+        Forgets all interned nodes.
+        """
+        self._nodes.clear()
+
+    def AND(self, *conditions):
+        return self.intern(logical_and(conditions))
+
+    def OR(self, *conditions):
+        return self.intern(logical_or(conditions))
+
+    def XOR(self, *conditions):
+        return self.intern(logical_xor(conditions))
+
+    def intern(self, node):
+        """
+        Returns the shared node which is identical to *node*: a condition
+        built with :py:func:`~.queryapi.AND` and alike, a single condition,
+        an :py:class:`~._querybuilder.SQLFunction` or an expression. Other
+        values are returned unchanged.
+        """
+        return self._intern(node)[0]
+
+    def _shared(self, key, node):
+        return self._nodes.setdefault(key, node)
+
+    def _intern(self, node):
+        """
+        Returns the shared node and its key.
+        """
+        if isinstance(node, _LogicalOperator):
+            conditions = [self._intern_condition(sub_condition)
+                          for sub_condition in node.conditions]
+            key = ("op", node.operator, tuple(
+                key for _, key in conditions
+            ))
+            shared = self._nodes.get(key)
+            if shared is None:
+                shared = _LogicalOperator(
+                    tuple(condition for condition, _ in conditions),
+                    node.operator
+                )
+                if all(map(_cacheable, shared.conditions)):
+                    # the compiler memoizes the SQL of the subtree
+                    shared._fragments = {}
+                shared = self._shared(key, shared)
+        elif isinstance(node, SQLFunction):
+            fields = [self._intern_value(field) for field in node.fields]
+            key = ("fn", node.function, tuple(key for _, key in fields))
+            shared = self._nodes.get(key) or self._shared(key, SQLFunction(
+                node.function, *[field for field, _ in fields]
+            ))
+        elif isinstance(node, _ArithmeticExpression):
+            (left, left_key), (right, right_key) = (
+                self._intern_value(node.left), self._intern_value(node.right)
+            )
+            key = ("ar", node.operator, left_key, right_key)
+            shared = self._nodes.get(key) or self._shared(
+                key, _ArithmeticExpression(node.operator, left, right)
+            )
+        elif isinstance(node, _Field):
+            key = ("col", node.field)
+            shared = self._shared(key, node)
+        elif isinstance(node, (tuple, list, dict)):
+            return self._intern_condition(node)
+        else:
+            return node, _identity(node)
+
+        return shared, _identity(shared)
+
+    def _intern_condition(self, condition):
+        if isinstance(condition, _LogicalOperator):
+            return self._intern(condition)
+
+        field, op, value = parse_condition(condition)
+        field, field_key = self._intern_value(field)
+        value, value_key = self._intern_value(value)
+        key = ("cond", field_key, op, value_key)
+        shared = self._shared(key, (field, op, value))
+        return shared, _identity(shared)
+
+    def _intern_value(self, value):
+        """
+        Returns the shared value and its key. Lists of values become tuples.
+        """
+        if isinstance(value, (_LogicalOperator, _ArithmeticOperators)):
+            return self._intern(value)
+        if isinstance(value, (QueryBuilder, Param)):
+            return value, _identity(value)
+        if isinstance(value, (list, tuple)):
+            items = [self._intern_value(item) for item in value]
+            return (
+                tuple(item for item, _ in items),
+                ("seq", tuple(key for _, key in items))
+            )
+        if isinstance(value, (set, frozenset)):
+            items = [self._intern_value(item) for item in value]
+            return (
+                frozenset(item for item, _ in items),
+                ("set", frozenset(key for _, key in items))
+            )
+        try:
+            hash(value)
+        except TypeError:
+            return value, _identity(value)
+        # the type keeps e.g. 1 and True apart, which compare equal
+        return value, ("value", type(value), value)
+
+
+def _identity(node):
+    return ("id", id(node))
+
+
+def _cacheable(condition):
+    """
+    Whether the SQL of *condition* only depends on the query it is part of,
+    i.e. it doesn't compile a subquery, which uses the aliases of the query.
+    """
+    if isinstance(condition, _LogicalOperator):
+        return condition._fragments is not None
+    value = condition[2]
+    if isinstance(value, (tuple, frozenset)):
+        return not any(isinstance(item, QueryBuilder) for item in value)
+    return not isinstance(value, QueryBuilder)
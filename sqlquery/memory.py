@@ -0,0 +1,643 @@
+"""
+An in-memory database which executes the queries of a
+:py:class:`~._querybuilder.QueryBuilder` directly over tables of rows held in
+memory, e.g. to test queries without a database server or to serve small
+reference tables:
+
+::
+
+    >>> database = MemoryDatabase()
+    >>> database.create_table("users", primary_key="id", indexes=["name"])
+    >>> database.execute(insert({"id": 1, "name": "bob"}).on_table("users"))
+    1
+    >>> database.execute(
+            select("id").on_table("users").where(("name__eq", "bob"))
+        )
+    [(1,)]
+
+Like :py:func:`~.profiling.cursor_executor`, a select returns a list of
+row tuples and other statements the number of affected rows. Tables are
+identified by their name, their schema is ignored.
+
+Conditions are evaluated by :py:class:`~.evaluation.Predicate`, which
+compares strings case sensitively, as do indexes, joins, grouping and
+ordering. Equality and `IN` conditions of the top level `AND` of a `WHERE`
+look up rows by the hash index of their column, if it has one, and joins use
+the index of the joined column or a hash table built for the query. Ordering
+sorts the rows, `NULL` first as in MySQL and SQLite. Unions, common table
+expressions, subqueries, window functions and `WITH ROLLUP` aren't supported.
+"""
+import itertools
+from collections import OrderedDict, defaultdict
+
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery._querybuilder import Param
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import SQLFunction
+from sqlquery._querybuilder import _ArithmeticExpression
+from sqlquery._querybuilder import _ArithmeticOperators
+from sqlquery._querybuilder import _Inserted
+from sqlquery._querybuilder import _LogicalOperator
+from sqlquery._querybuilder import _SQLOrdering
+from sqlquery._querybuilder import parse_condition
+from sqlquery.evaluation import Predicate, compile_expression
+from sqlquery.routing import statement_type
+
+from six import string_types
+
+
+class DuplicateKeyException(InvalidQueryException):
+    """
+    Raised when an insert or an update would duplicate the primary key of a
+    :py:class:`.MemoryTable`
+    """
+    pass
+
+
+# keys of the rows of a group and of the inserted values of an upsert in the
+# rows expressions are evaluated against
+_GROUP = object()
+_INSERTED = object()
+
+
+def _not_null(values):
+    return [value for value in values if value is not None]
+
+
+def _sum(values):
+    values = _not_null(values)
+    return sum(values) if values else None
+
+
+def _avg(values):
+    values = _not_null(values)
+    return sum(values) / float(len(values)) if values else None
+
+
+def _max(values):
+    values = _not_null(values)
+    return max(values) if values else None
+
+
+def _min(values):
+    values = _not_null(values)
+    return min(values) if values else None
+
+
+_AGGREGATES = {
+    "count": lambda values: len(_not_null(values)),
+    "sum": _sum,
+    "avg": _avg,
+    "max": _max,
+    "min": _min,
+}
+
+
+def _is_aggregate(expression):
+    if isinstance(expression, SQLFunction):
+        return (
+            expression.function in _AGGREGATES or
+            any(_is_aggregate(field) for field in expression.fields)
+        )
+    if isinstance(expression, _ArithmeticExpression):
+        return (
+            _is_aggregate(expression.left) or
+            _is_aggregate(expression.right)
+        )
+    return False
+
+
+def _aggregate(expression):
+    """
+    Evaluates aggregates against the rows of a group, see
+    :py:func:`~.evaluation.compile_expression`
+    """
+    if (
+        not isinstance(expression, SQLFunction) or
+        expression.function not in _AGGREGATES
+    ):
+        return None
+    if len(expression.fields) != 1:
+        raise InvalidQueryException(
+            "<{}> takes a single column".format(expression.function)
+        )
+
+    aggregate = _AGGREGATES[expression.function]
+    value = compile_expression(expression.fields[0], constant=False)
+    return lambda row: aggregate([value(member) for member in row[_GROUP]])
+
+
+def _inserted(expression):
+    if isinstance(expression, _Inserted):
+        return lambda row: row[_INSERTED].get(expression.field)
+    return None
+
+
+def _sort_key(value):
+    # NULL sorts first and is never compared with other values
+    return value is not None, value
+
+
+def _value(row, column):
+    """
+    Returns the value of *column*, which the query refers to, in *row*
+    """
+    try:
+        return row[column]
+    except KeyError:
+        raise InvalidQueryException("Unknown column <{}>".format(column))
+
+
+def _is_constant(value):
+    if isinstance(value, (_ArithmeticOperators, QueryBuilder, Param)):
+        return False
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class MemoryTable(object):
+    """
+    A table of rows, which are dicts of column/value. *primary_key* is a
+    column, or a tuple of columns, whose values must be unique. It is what
+    inserts with `IGNORE`, `REPLACE` or an upsert check. *indexes* are
+    columns which have a hash index.
+    """
+    def __init__(self, name, rows=(), primary_key=None, indexes=()):
+        if isinstance(primary_key, string_types):
+            primary_key = (primary_key,)
+
+        self.name = name
+        self.primary_key = tuple(primary_key) if primary_key else None
+        self.columns = list(self.primary_key or ())
+        self._rows = OrderedDict()
+        self._row_ids = itertools.count()
+        self._keys = {}
+        self._indexes = {}
+        for column in indexes:
+            self.create_index(column)
+        for row in rows:
+            self.insert(row)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows.values())
+
+    def row_ids(self):
+        return list(self._rows)
+
+    def get(self, row_id):
+        return self._rows[row_id]
+
+    def create_index(self, column):
+        """
+        Adds a hash index for *column*
+        """
+        index = {}
+        for row_id, row in self._rows.items():
+            index.setdefault(row.get(column), set()).add(row_id)
+        self._indexes[column] = index
+
+    def has_index(self, column):
+        return column in self._indexes
+
+    def lookup(self, column, values):
+        """
+        Returns the ids of the rows whose *column* has one of *values*, in
+        the order the rows were inserted.
+        """
+        index = self._indexes[column]
+        row_ids = set()
+        for value in values:
+            if value is not None:
+                row_ids.update(index.get(value, ()))
+        return sorted(row_ids)
+
+    def _key(self, row):
+        key = tuple(row.get(column) for column in self.primary_key)
+        # like NULL, a key with None doesn't conflict with any other key
+        return None if None in key else key
+
+    def find_key(self, row):
+        """
+        Returns the id of the row with the same primary key as *row*, or
+        `None`.
+        """
+        if self.primary_key is None:
+            return None
+        key = self._key(row)
+        return None if key is None else self._keys.get(key)
+
+    def _add_columns(self, row):
+        for column in row:
+            if column not in self.columns:
+                self.columns.append(column)
+                for existing in self._rows.values():
+                    existing[column] = None
+
+    def insert(self, row):
+        """
+        Inserts *row*, returning its id
+        """
+        row = dict(row)
+        if self.find_key(row) is not None:
+            raise DuplicateKeyException(
+                "Duplicate key <{}> in <{}>".format(self._key(row), self.name)
+            )
+
+        self._add_columns(row)
+        for column in self.columns:
+            row.setdefault(column, None)
+
+        row_id = next(self._row_ids)
+        self._rows[row_id] = row
+        if self.primary_key is not None:
+            key = self._key(row)
+            if key is not None:
+                self._keys[key] = row_id
+        for column, index in self._indexes.items():
+            index.setdefault(row[column], set()).add(row_id)
+        return row_id
+
+    def update(self, row_id, values):
+        """
+        Sets the columns in *values* on the row *row_id*
+        """
+        row = self._rows[row_id]
+        updated = dict(row)
+        updated.update(values)
+
+        if self.primary_key is not None:
+            key, updated_key = self._key(row), self._key(updated)
+            if key != updated_key:
+                if updated_key in self._keys:
+                    raise DuplicateKeyException(
+                        "Duplicate key <{}> in <{}>".format(
+                            updated_key, self.name
+                        )
+                    )
+                self._keys.pop(key, None)
+                if updated_key is not None:
+                    self._keys[updated_key] = row_id
+
+        self._add_columns(updated)
+        for column, index in self._indexes.items():
+            if row.get(column) != updated.get(column):
+                self._unindex(index, row.get(column), row_id)
+                index.setdefault(updated.get(column), set()).add(row_id)
+        self._rows[row_id] = updated
+
+    def delete(self, row_id):
+        """
+        Deletes the row *row_id*
+        """
+        row = self._rows.pop(row_id)
+        if self.primary_key is not None:
+            self._keys.pop(self._key(row), None)
+        for column, index in self._indexes.items():
+            self._unindex(index, row.get(column), row_id)
+
+    @staticmethod
+    def _unindex(index, value, row_id):
+        row_ids = index[value]
+        row_ids.discard(row_id)
+        if not row_ids:
+            del index[value]
+
+
+class MemoryDatabase(object):
+    """
+    A set of :py:class:`.MemoryTable` which queries are executed against
+    with :py:meth:`.execute`.
+    """
+    def __init__(self, tables=()):
+        self.tables = dict((table.name, table) for table in tables)
+
+    def create_table(self, name, rows=(), primary_key=None, indexes=()):
+        """
+        Creates and returns a :py:class:`.MemoryTable`, replacing any table
+        with the same *name*.
+        """
+        table = self.tables[name] = MemoryTable(
+            name, rows, primary_key=primary_key, indexes=indexes
+        )
+        return table
+
+    def table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise InvalidQueryException("Unknown table <{}>".format(name))
+
+    def execute(self, builder):
+        """
+        Executes the query in *builder*. Returns a list of row tuples for a
+        select and the number of affected rows otherwise.
+        """
+        query_data = builder._query_data
+        for unsupported in ("union", "cte", "rollup"):
+            if getattr(query_data, unsupported):
+                raise InvalidQueryException(
+                    "<{}> isn't supported in memory".format(unsupported)
+                )
+
+        return getattr(self, "_" + statement_type(builder))(query_data)
+
+    # Finding rows
+    @staticmethod
+    def _main_column(table_options, field):
+        """
+        Returns the column of the main table *field* refers to, or `None`
+        """
+        if not isinstance(field, string_types):
+            return None
+        if u"." not in field:
+            return field
+        table, column = field.rsplit(u".", 1)
+        return column if table == table_options.name else None
+
+    def _indexed_ids(self, table, query_data):
+        """
+        Returns the ids of the rows matching the most selective indexed
+        condition of the `WHERE`, or `None` if there is none.
+        """
+        where = query_data.where
+        if where is None or where.operator != "and":
+            return None
+
+        best = None
+        for condition in where.conditions:
+            if isinstance(condition, _LogicalOperator):
+                continue
+            field, op, value = parse_condition(condition)
+            column = self._main_column(query_data.table, field)
+            if column is None or not table.has_index(column):
+                continue
+            if op == "eq" and _is_constant(value):
+                values = [value]
+            elif (
+                op == "in" and
+                isinstance(value, (list, tuple, set, frozenset)) and
+                all(_is_constant(item) for item in value)
+            ):
+                values = value
+            else:
+                continue
+
+            row_ids = table.lookup(column, values)
+            if best is None or len(row_ids) < len(best):
+                best = row_ids
+        return best
+
+    def _matching_ids(self, table, query_data):
+        row_ids = self._indexed_ids(table, query_data)
+        if row_ids is None:
+            row_ids = table.row_ids()
+        if query_data.where is None:
+            return row_ids
+        predicate = Predicate(query_data.where)
+        return [row_id for row_id in row_ids if predicate(table.get(row_id))]
+
+    def _join(self, query_data, rows):
+        join = query_data.join
+        if join.join_type != "inner":
+            raise InvalidQueryException(
+                "<{}> joins aren't supported in memory".format(join.join_type)
+            )
+
+        table_name = query_data.table.name
+        join_table = self.table(join.table.name)
+        main_column = self._main_column(query_data.table, join.main_field)
+        join_column = join.join_field.rsplit(u".", 1)[-1]
+
+        if join_table.has_index(join_column):
+            def matches(value):
+                return [
+                    join_table.get(row_id)
+                    for row_id in join_table.lookup(join_column, [value])
+                ]
+        else:
+            hashed = defaultdict(list)
+            for row in join_table:
+                hashed[_value(row, join_column)].append(row)
+            matches = hashed.get
+
+        joined = []
+        for row in rows:
+            value = _value(row, main_column)
+            if value is None:
+                continue
+            for join_row in matches(value) or ():
+                merged = dict(row)
+                for column, column_value in row.items():
+                    merged[table_name + u"." + column] = column_value
+                for column, column_value in join_row.items():
+                    merged[join_table.name + u"." + column] = column_value
+                joined.append(merged)
+        return joined
+
+    # Selects
+    def _select(self, query_data):
+        table = self.table(query_data.table.name)
+        if query_data.join:
+            rows = self._join(query_data, table)
+            if query_data.where is not None:
+                rows = Predicate(query_data.where).filter(rows)
+        else:
+            rows = [
+                table.get(row_id)
+                for row_id in self._matching_ids(table, query_data)
+            ]
+
+        fields = []
+        for field in query_data.select:
+            if field != u"*":
+                fields.append(field)
+                continue
+            fields.extend(table.columns)
+            if query_data.join:
+                join_table = self.table(query_data.join.table.name)
+                fields.extend(
+                    join_table.name + u"." + column
+                    for column in join_table.columns
+                )
+
+        extension = None
+        if (
+            query_data.group_by or query_data.having is not None or
+            any(_is_aggregate(field) for field in fields)
+        ):
+            extension = _aggregate
+            rows = self._group(query_data, rows)
+            if query_data.having is not None:
+                rows = Predicate(
+                    query_data.having, extension=_aggregate
+                ).filter(rows)
+
+        rows = self._limited(
+            query_data, self._ordered(query_data.order_by, rows, extension)
+        )
+
+        columns = [
+            compile_expression(field, constant=False, extension=extension)
+            for field in fields
+        ]
+        return [tuple(column(row) for column in columns) for row in rows]
+
+    def _group(self, query_data, rows):
+        """
+        Returns a row for each group, the first row of the group with the
+        rows of the group under the `_GROUP` key.
+        """
+        keys = [
+            compile_expression(field, constant=False)
+            for field in query_data.group_by or ()
+        ]
+        groups = OrderedDict()
+        for row in rows:
+            groups.setdefault(tuple(key(row) for key in keys), []).append(row)
+        if not groups and not keys:
+            # aggregates without GROUP BY always return a row
+            groups[()] = []
+
+        grouped = []
+        for members in groups.values():
+            row = dict(members[0]) if members else defaultdict(lambda: None)
+            row[_GROUP] = members
+            grouped.append(row)
+        return grouped
+
+    @staticmethod
+    def _ordered(order_by, items, extension=None, get_row=None):
+        """
+        Returns *items* sorted by *order_by*, *get_row* returning the row of
+        each item.
+        """
+        items = list(items)
+        for field in reversed(order_by or ()):
+            descending = False
+            if isinstance(field, _SQLOrdering):
+                descending = field.direction == "desc"
+                field = field.field
+            value = compile_expression(
+                field, constant=False, extension=extension
+            )
+            if get_row is not None:
+                value = lambda item, value=value: value(get_row(item))
+            # sorts are stable, so sorting by each field from the last
+            # orders by all of them
+            items.sort(key=lambda item: _sort_key(value(item)),
+                       reverse=descending)
+        return items
+
+    @staticmethod
+    def _limited(query_data, items):
+        offset, limit = query_data.offset, query_data.limit
+        for value in (offset, limit):
+            if isinstance(value, Param):
+                raise InvalidQueryException(
+                    "The parameter <{}> must be bound first".format(value.name)
+                )
+        start = offset or 0
+        return items[start:None if limit is None else start + limit]
+
+    # Mutations
+    def _mutated_ids(self, table, query_data):
+        if query_data.join:
+            raise InvalidQueryException(
+                "Joins are only supported by selects in memory"
+            )
+        row_ids = self._matching_ids(table, query_data)
+        if query_data.order_by:
+            row_ids = self._ordered(
+                query_data.order_by, row_ids, get_row=table.get
+            )
+        return self._limited(query_data, row_ids)
+
+    def _insert(self, query_data):
+        table = self.table(query_data.table.name)
+        count = 0
+        for values in query_data.insert:
+            existing = table.find_key(values)
+            if existing is None:
+                table.insert(values)
+            elif query_data.insert_ignore:
+                continue
+            elif query_data.insert_replace:
+                table.delete(existing)
+                table.insert(values)
+            elif query_data.duplicate_key_update is not None:
+                self._upsert(table, existing, values, query_data)
+            else:
+                table.insert(values)
+            count += 1
+        return count
+
+    def _upsert(self, table, row_id, values, query_data):
+        key, merge = query_data.duplicate_key_update
+        if key is not None and set(key) != set(table.primary_key):
+            raise InvalidQueryException(
+                "Upserts in memory must use the primary key <{}>".format(
+                    ", ".join(table.primary_key)
+                )
+            )
+        if not merge:
+            merge = dict(
+                (column, _Inserted(column))
+                for column in values if column not in table.primary_key
+            )
+
+        row = dict(table.get(row_id))
+        row[_INSERTED] = values
+        table.update(row_id, dict(
+            (column, compile_expression(value, extension=_inserted)(row))
+            for column, value in merge.items()
+        ))
+
+    def _update(self, query_data):
+        table = self.table(query_data.table.name)
+        row_ids = self._mutated_ids(table, query_data)
+
+        if query_data.bulk_update is not None:
+            key_column, updates = query_data.bulk_update
+            updates = dict(
+                (row_key, self._compiled_values(values))
+                for row_key, values in updates
+            )
+            row_ids = [
+                row_id for row_id in row_ids
+                if _value(table.get(row_id), key_column) in updates
+            ]
+
+            def values_for(row):
+                return updates[row[key_column]]
+        else:
+            values = self._compiled_values(query_data.update)
+
+            def values_for(row):
+                return values
+
+        for row_id in row_ids:
+            row = table.get(row_id)
+            table.update(row_id, dict(
+                (column, value(row)) for column, value in values_for(row)
+            ))
+        return len(row_ids)
+
+    @staticmethod
+    def _compiled_values(values):
+        return [
+            (column, compile_expression(value))
+            for column, value in values.items()
+        ]
+
+    def _delete(self, query_data):
+        table = self.table(query_data.table.name)
+        row_ids = self._mutated_ids(table, query_data)
+        for row_id in row_ids:
+            table.delete(row_id)
+        return len(row_ids)
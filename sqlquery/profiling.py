@@ -0,0 +1,180 @@
+"""
+Profiling of query shapes.
+
+A :py:class:`QueryProfiler` executes queries through an executor, a function
+taking `(query_string, arguments)`. For a sample of the query shapes, i.e.
+queries which only differ in their values, it also runs the `EXPLAIN`
+variant of the query once and records the plan together with the time spent
+compiling and executing the queries of that shape:
+
+::
+
+    >>> profiler = QueryProfiler(
+            cursor_executor(connection.cursor()),
+            encoder=SQLiteEncodings(),
+            full_scan=sqlite_full_scan
+        )
+    >>> profiler.execute(select("id").on_table("users").where(("name__eq", "bob")))
+    [(1,)]
+    >>> [(profile.sql, profile.full_scan) for profile in profiler.profiles.values()]
+    [(u'SELECT "a"."id" FROM "users" AS "a" WHERE ("a"."name" = ?)', True)]
+
+"""
+import hashlib
+import re
+import timeit
+
+from sqlquery.sqlencoding import BasicEncodings
+
+
+def query_fingerprint(query, encoder=None):
+    """
+    Returns a fingerprint of the *query* string which is the same for all
+    queries of the same shape. Lists of placeholders, e.g. of an `IN`
+    condition or the rows of an insert, count as the same shape whatever
+    their length.
+    """
+    placeholder = re.escape((encoder or BasicEncodings()).encode_placeholder())
+    shape = re.sub(
+        r"\({0}(?:,\s*{0})*\)".format(placeholder), u"(...)", query
+    )
+    shape = re.sub(r"(\([^()]*\))(?:,\s*\1)+", r"\1", shape)
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()
+
+
+def cursor_executor(cursor):
+    """
+    Returns an executor which executes queries with the DB-API *cursor*. It
+    returns the fetched rows, or the number of affected rows for a statement
+    which doesn't return any.
+    """
+    def execute(query, args):
+        cursor.execute(query, args)
+        if cursor.description is None:
+            return cursor.rowcount
+        return cursor.fetchall()
+
+    return execute
+
+
+def sqlite_full_scan(plan):
+    """
+    Whether the rows of a SQLite `EXPLAIN QUERY PLAN` scan a table without
+    an index.
+    """
+    return any(
+        row[-1].startswith(u"SCAN") and u"INDEX" not in row[-1]
+        for row in plan
+    )
+
+
+def mysql_full_scan(plan):
+    """
+    Whether the rows of a MySQL `EXPLAIN` contain a full table scan, i.e. an
+    access `type` of `ALL`.
+    """
+    return any(row[4] == u"ALL" for row in plan)
+
+
+class ShapeProfile(object):
+    """
+    What has been observed for one query shape: its *fingerprint*, the
+    *sql* of the first query of the shape, its *plan* and whether the plan
+    contains a *full_scan* (`None` if that isn't checked), the number of
+    *executions* and the total *compile_time* and *execute_time* in seconds.
+    """
+    def __init__(self, fingerprint, sql, plan, full_scan=None):
+        self.fingerprint = fingerprint
+        self.sql = sql
+        self.plan = plan
+        self.full_scan = full_scan
+        self.executions = 0
+        self.compile_time = 0.0
+        self.execute_time = 0.0
+
+    @property
+    def mean_compile_time(self):
+        return self.compile_time / self.executions if self.executions else 0.0
+
+    @property
+    def mean_execute_time(self):
+        return self.execute_time / self.executions if self.executions else 0.0
+
+    def __repr__(self):
+        return (
+            "ShapeProfile({!r}, executions={}, full_scan={!r})".format(
+                self.sql, self.executions, self.full_scan
+            )
+        )
+
+
+class QueryProfiler(object):
+    """
+    Executes queries with *executor* and profiles a sample of their shapes.
+
+    *sample_rate* is the fraction of the shapes which are profiled. Whether
+    a shape is sampled only depends on its fingerprint, so all queries of a
+    sampled shape are profiled. *full_scan* is called with the rows of each
+    plan, e.g. :py:func:`.sqlite_full_scan`, and should return whether it
+    contains a full table scan. *profiles* maps the fingerprint of each
+    profiled shape to its :py:class:`.ShapeProfile`, a dict by default.
+
+    *encoder* and *schema* are passed to :py:meth:`.QueryBuilder.sql`.
+    """
+    def __init__(self, executor, encoder=None, schema=None, sample_rate=1.0,
+                 full_scan=None, profiles=None, clock=timeit.default_timer):
+        self.executor = executor
+        self.encoder = encoder or BasicEncodings()
+        self.schema = schema
+        self.sample_rate = sample_rate
+        self.full_scan = full_scan
+        self.profiles = {} if profiles is None else profiles
+        self.clock = clock
+
+    def sampled(self, fingerprint):
+        """
+        Whether the shape with *fingerprint* is profiled.
+        """
+        return int(fingerprint[:8], 16) < self.sample_rate * 0x100000000
+
+    def explain(self, query, args):
+        """
+        Executes the `EXPLAIN` variant of the compiled *query* and returns the
+        rows of the plan.
+        """
+        return self.executor(self.encoder.encode_explain(query), args)
+
+    def execute(self, builder):
+        """
+        Compiles and executes the query in *builder*, returning whatever the
+        executor returns. The first time a sampled shape is executed its plan
+        is captured.
+        """
+        started = self.clock()
+        query, args = builder.sql(encoder=self.encoder, schema=self.schema)
+        compiled = self.clock()
+
+        fingerprint = query_fingerprint(query, self.encoder)
+        profile = None
+        if self.sampled(fingerprint):
+            profile = self.profiles.get(fingerprint)
+            if profile is None:
+                plan = list(self.explain(query, args))
+                profile = ShapeProfile(
+                    fingerprint,
+                    query,
+                    plan,
+                    self.full_scan(plan) if self.full_scan else None
+                )
+                self.profiles[fingerprint] = profile
+
+        executing = self.clock()
+        result = self.executor(query, args)
+        executed = self.clock()
+
+        if profile is not None:
+            profile.executions += 1
+            profile.compile_time += compiled - started
+            profile.execute_time += executed - executing
+
+        return result
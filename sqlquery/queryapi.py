@@ -7,6 +7,11 @@ from sqlquery._querybuilder import QueryBuilder
 
 SQLFunction = _querybuilder.SQLFunction
 InvalidQueryException = _querybuilder.InvalidQueryException
+QueryTooLargeException = _querybuilder.QueryTooLargeException
+QueryPlan = _querybuilder.QueryPlan
+Param = _querybuilder.Param
+SizeEstimate = _querybuilder.SizeEstimate
+FragmentCache = _querybuilder.FragmentCache
 
 
 def AND(*conditions):
@@ -39,6 +44,40 @@ def XOR(*conditions):
     return _querybuilder.logical_xor(conditions)
 
 
+def F(field):
+    """
+    Refers to the column *field* in an arithmetic expression. Expressions are
+    created with the python operators `+`, `-`, `*`, `/`, `//` (`DIV`) and
+    `%`, and can be used wherever a column or a value is expected, e.g. to
+    atomically increment a counter:
+
+    ::
+
+        >>> update(hits=F("hits") + 1).on_table("pages").sql()
+        (u'UPDATE `pages` AS `a` SET `a`.`hits` = `a`.`hits` + %s', (1,))
+
+    Functions such as :py:func:`.SUM` can be used in expressions too.
+    """
+    return _querybuilder._Field(field)
+
+
+def INSERTED(field):
+    """
+    Refers to the value an upsert tried to insert into the column *field*,
+    i.e. `VALUES(field)` or `EXCLUDED.field`, see
+    :py:meth:`~.QueryBuilder.upsert`:
+
+    ::
+
+        >>> insert({"id": 1, "hits": 3}).on_table("pages").upsert(
+                "id", hits=F("hits") + INSERTED("hits") * 2
+            ).sql()
+        (u'INSERT INTO `pages` (`id`, `hits`) VALUES (%s, %s) ON DUPLICATE KEY UPDATE `hits` = `pages`.`hits` + (VALUES(`hits`) * %s)', (1, 3, 2))
+
+    """
+    return _querybuilder._Inserted(field)
+
+
 def ASC(field):
     """
     Similar to the :py:func:`.DESC` function except creates an ascending order
@@ -94,6 +133,41 @@ def SUM(field):
     return _querybuilder.sum(field)
 
 
+def ROW_NUMBER():
+    """
+    The `ROW_NUMBER()` window function, which has to be used with
+    :py:meth:`~.SQLFunction.over`, e.g.
+
+    ::
+
+        >>> select(
+                "id", ROW_NUMBER().over(partition_by="user_id",
+                                        order_by=DESC("created"))
+            ).on_table("posts").sql()
+        (u'SELECT `a`.`id`, ROW_NUMBER() OVER (PARTITION BY `a`.`user_id` ORDER BY `a`.`created` DESC) FROM `posts` AS `a`', ())
+
+    Aggregate functions such as :py:func:`.SUM` can be used as window
+    functions in the same way.
+    """
+    return _querybuilder.row_number()
+
+
+def RANK():
+    """
+    The same as :py:func:`~.ROW_NUMBER` but instead generating a `RANK`
+    function.
+    """
+    return _querybuilder.rank()
+
+
+def DENSE_RANK():
+    """
+    The same as :py:func:`~.ROW_NUMBER` but instead generating a `DENSE_RANK`
+    function.
+    """
+    return _querybuilder.dense_rank()
+
+
 def UTCNOW():
     """
     Generates the scalar `UTC_NOW()` function.
@@ -179,3 +253,32 @@ def delete():
     Create a delete clause, e.g. `DELETE ...`
     """
     return QueryBuilder().delete()
+
+
+def union(*builders):
+    """
+    Combines the results of the selects in *builders* with `UNION`, e.g.
+
+    ::
+
+        >>> union(
+                select("id").on_table("users"),
+                select("id").on_table("admins")
+            ).order_by("id").limit(10).sql()
+        (u'SELECT `a`.`id` FROM `users` AS `a` UNION SELECT `a`.`id` FROM `admins` AS `a` ORDER BY `id` LIMIT %s', (10,))
+
+    The returned query can only be ordered, limited and offset. Columns in
+    :py:meth:`.QueryBuilder.order_by` refer to the columns of the result.
+    Selects which only differ in their table, e.g. the same query across
+    sharded tables, are compiled just once, whether or not they are built
+    from the same builder.
+    """
+    return QueryBuilder().union(*builders)
+
+
+def union_all(*builders):
+    """
+    The same interface as :py:func:`.union`, however a `UNION ALL` is
+    generated rather than a `UNION`.
+    """
+    return QueryBuilder().union_all(*builders)
@@ -0,0 +1,46 @@
+"""
+Rendering of queries with their values inlined as SQL literals, e.g. to
+export data as a file of statements or to replay queries from a log.
+
+The literals are encoded by the encoder of the dialect, see
+:py:meth:`~.sqlencoding.BasicEncodings.encode_literal`. Inserts are written
+`mysqldump`-style, in statements of up to *batch_size* rows:
+
+::
+
+    >>> with io.open("users.sql", "w") as output:
+    ...     dump([insert(*rows).on_table("users")], output)
+    3
+
+"""
+from sqlquery.sqlencoding import BasicEncodings
+
+
+def render(builder, encoder=None, schema=None):
+    """
+    Returns the query in *builder* with its values inlined as literals.
+    """
+    encoder = encoder or BasicEncodings()
+    return encoder.render_literals(
+        *builder.sql(encoder=encoder, schema=schema)
+    )
+
+
+def dump(builders, output, encoder=None, schema=None, batch_size=1000):
+    """
+    Writes the rendered query of each of *builders* into the file object
+    *output*, each statement terminated by `;` and a new line. Inserts and
+    bulk updates are split into statements of up to *batch_size* rows, which
+    are compiled one at a time. Returns the number of statements written.
+    """
+    encoder = encoder or BasicEncodings()
+    statements = 0
+    for builder in builders:
+        for chunk in builder.chunked(max_rows=batch_size):
+            output.write(encoder.render_literals(
+                *chunk.sql(encoder=encoder, schema=schema)
+            ))
+            output.write(u";\n")
+            statements += 1
+
+    return statements
@@ -0,0 +1,145 @@
+"""
+Routing of reads to replicas and writes to the primary.
+
+A :py:class:`ReadWriteRouter` decides from the
+:py:class:`~._querybuilder.QueryData` of a query whether it reads or writes,
+and executes it through the matching pool. Pools are executors, functions
+taking `(query_string, arguments)`, e.g. created with
+:py:func:`~.profiling.cursor_executor`:
+
+::
+
+    >>> router = ReadWriteRouter(primary_pool, [replica_pool_1, replica_pool_2])
+    >>> session = router.session()
+    >>> session.execute(select("id").on_table("users"))  # a replica
+    >>> session.execute(update(name="bob").on_table("users").where(...))
+    >>> session.execute(select("id").on_table("users"))  # the primary
+
+"""
+import functools
+import itertools
+import time
+
+from sqlquery._querybuilder import InvalidQueryException
+
+
+READ_STATEMENTS = frozenset(["select"])
+
+
+def statement_type(builder):
+    """
+    Returns `"select"`, `"insert"`, `"update"` or `"delete"` for the query in
+    *builder*. A union is a select, a bulk update an update.
+    """
+    query_data = builder._query_data
+    if query_data.insert is not None:
+        return "insert"
+    if query_data.delete is True:
+        return "delete"
+    if query_data.update is not None or query_data.bulk_update is not None:
+        return "update"
+    if query_data.select is not None or query_data.union is not None:
+        return "select"
+
+    raise InvalidQueryException("Unknown statement type")
+
+
+class ReadWriteRouter(object):
+    """
+    Sends writes to the *primary* pool and reads to the *replicas*, which are
+    used in turn. Without replicas everything is sent to the primary.
+
+    Reads in a :py:class:`.RoutingSession` which has written are sent to the
+    primary, so that they see the session's writes, for *sticky_for* seconds
+    after the last write, or for the rest of the session if it's `None`.
+    A query's :py:meth:`~.QueryBuilder.route_to` overrides both.
+
+    *encoder* and *schema* are passed to :py:meth:`.QueryBuilder.sql`.
+    """
+    def __init__(self, primary, replicas=(), encoder=None, schema=None,
+                 sticky_for=None, clock=time.time):
+        self.primary = primary
+        self.replicas = tuple(replicas)
+        self.encoder = encoder
+        self.schema = schema
+        self.sticky_for = sticky_for
+        self.clock = clock
+        self._next_replica = functools.partial(
+            next, itertools.cycle(self.replicas)
+        )
+
+    def session(self):
+        """
+        Returns a new :py:class:`.RoutingSession`
+        """
+        return RoutingSession(self)
+
+    def is_write(self, builder):
+        return statement_type(builder) not in READ_STATEMENTS
+
+    def pool_for(self, builder, session=None):
+        """
+        Returns the pool the query in *builder* is sent to.
+        """
+        route = builder._query_data.route
+        if self.is_write(builder):
+            if route == "replica":
+                raise InvalidQueryException(
+                    "A write can't be routed to a replica"
+                )
+            return self.primary
+
+        if not self.replicas:
+            return self.primary
+        if route == "primary":
+            return self.primary
+        if route is None and session is not None and session.sticky():
+            return self.primary
+        return self._next_replica()
+
+    def execute(self, builder, session=None):
+        """
+        Compiles the query in *builder* and executes it with the pool from
+        :py:meth:`.pool_for`, returning whatever the pool returns.
+        """
+        pool = self.pool_for(builder, session)
+        query, args = builder.sql(encoder=self.encoder, schema=self.schema)
+        result = pool(query, args)
+        if session is not None and self.is_write(builder):
+            session.last_write = self.clock()
+        return result
+
+
+class RoutingSession(object):
+    """
+    A sequence of queries, e.g. those of a single request, which should read
+    their own writes. *last_write* is the time of the session's last write,
+    `None` if it hasn't written.
+    """
+    def __init__(self, router):
+        self.router = router
+        self.last_write = None
+
+    def sticky(self):
+        """
+        Whether reads are currently sent to the primary.
+        """
+        if self.last_write is None:
+            return False
+        sticky_for = self.router.sticky_for
+        return (
+            sticky_for is None or
+            self.router.clock() - self.last_write < sticky_for
+        )
+
+    def pool_for(self, builder):
+        """
+        See :py:meth:`.ReadWriteRouter.pool_for`
+        """
+        return self.router.pool_for(builder, self)
+
+    def execute(self, builder):
+        """
+        See :py:meth:`.ReadWriteRouter.execute`
+        """
+        return self.router.execute(builder, self)
@@ -0,0 +1,175 @@
+"""
+Decoding of the rows returned by the DB client library for a select.
+
+A :py:class:`RowDecoder` is usually created with
+:py:meth:`.QueryBuilder.row_decoder` so that its columns match the select it
+was created from:
+
+::
+
+    >>> query = select("id", "name").on_table("users")
+    >>> decoder = query.row_decoder()
+    >>> cursor.execute(*query.sql())
+    >>> for rows in decoder.iter_batches(cursor):
+    ...     print(rows[0].name)
+
+"""
+import array
+import itertools
+from collections import OrderedDict, namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+try:
+    array.array('q')
+    _INTEGER_TYPECODE = 'q'
+except ValueError:
+    # 'q' isn't available in python 2
+    _INTEGER_TYPECODE = 'l'
+
+
+_ARRAY_TYPECODES = {
+    "TINYINT": _INTEGER_TYPECODE,
+    "SMALLINT": _INTEGER_TYPECODE,
+    "MEDIUMINT": _INTEGER_TYPECODE,
+    "INT": _INTEGER_TYPECODE,
+    "INTEGER": _INTEGER_TYPECODE,
+    "BIGINT": _INTEGER_TYPECODE,
+    "FLOAT": 'd',
+    "DOUBLE": 'd',
+    "REAL": 'd',
+}
+
+
+def _base_type(sql_type):
+    if not sql_type:
+        return None
+    return sql_type.split('(')[0].split()[0].upper()
+
+
+def _record_class(fields):
+    def __init__(self, *values):
+        for field, value in zip(fields, values):
+            setattr(self, field, value)
+
+    def __iter__(self):
+        return (getattr(self, field) for field in fields)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, self.__class__) and
+            tuple(self) == tuple(other)
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "Record({})".format(", ".join(
+            "{}={!r}".format(field, value)
+            for field, value in zip(fields, self)
+        ))
+
+    return type("Record", (object,), {
+        "__slots__": fields,
+        "__init__": __init__,
+        "__iter__": __iter__,
+        "__eq__": __eq__,
+        "__ne__": __ne__,
+        "__hash__": None,
+        "__repr__": __repr__,
+    })
+
+
+class RowDecoder(object):
+    """
+    Converts rows, i.e. tuples of column values, into other containers.
+
+    *columns* are the names of the columns in each row. *types* are their SQL
+    types, or `None` where the type isn't known. Attribute names of the
+    records and named tuples are the column names, with invalid or duplicate
+    names replaced by `_<index>`.
+    """
+    def __init__(self, columns, types=None):
+        self.columns = tuple(columns)
+        self.types = tuple(types or (None,) * len(self.columns))
+        assert len(self.types) == len(self.columns)
+
+        self.namedtuple_class = namedtuple('Row', self.columns, rename=True)
+        self.fields = self.namedtuple_class._fields
+        self.record_class = _record_class(self.fields)
+
+    def dicts(self, rows):
+        """
+        Returns a list with a dict of column/value for each of *rows*.
+        """
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in rows]
+
+    def namedtuples(self, rows):
+        """
+        Returns a list with a named tuple for each of *rows*.
+        """
+        return list(map(self.namedtuple_class._make, rows))
+
+    def records(self, rows):
+        """
+        Returns a list with a record for each of *rows*. Records use
+        `__slots__`, so use less memory than dicts or named tuples.
+        """
+        return list(itertools.starmap(self.record_class, rows))
+
+    def columnar(self, rows):
+        """
+        Returns an ordered dict mapping each column to a sequence of its
+        values in *rows*. Integer and floating point columns are returned as
+        an `array.array` when they don't contain `NULL`, other columns as a
+        list.
+        """
+        columns = OrderedDict()
+        values_by_column = list(zip(*rows)) or [()] * len(self.columns)
+        for column, sql_type, values in zip(
+            self.columns, self.types, values_by_column
+        ):
+            typecode = _ARRAY_TYPECODES.get(_base_type(sql_type))
+            if typecode is not None:
+                try:
+                    columns[column] = array.array(typecode, values)
+                    continue
+                except TypeError:
+                    pass
+            columns[column] = list(values)
+
+        return columns
+
+    def numpy(self, rows):
+        """
+        The same as :py:meth:`.columnar` except each column is a NumPy array.
+        Requires NumPy to be installed.
+        """
+        if numpy is None:
+            raise ImportError("numpy is required for numpy()")
+
+        return OrderedDict(
+            (column, numpy.array(values, dtype=(
+                None if isinstance(values, array.array) else object
+            )))
+            for column, values in self.columnar(rows).items()
+        )
+
+    def iter_batches(self, cursor, container="namedtuples", batch_size=1000):
+        """
+        Fetches the rows of an executed DB-API *cursor* with `fetchmany`,
+        yielding each batch of up to *batch_size* rows converted with the
+        method named *container*, e.g. `"records"` or `"columnar"`.
+        """
+        decode = getattr(self, container)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield decode(rows)
@@ -0,0 +1,146 @@
+"""
+An optional registry of tables and their columns.
+
+When a :py:class:`SchemaRegistry` is given to :py:meth:`.QueryBuilder.sql`
+(or :py:meth:`.QueryBuilder.compiler`), columns of declared tables are
+validated while the query is compiled, their quoted identifiers are computed
+only once per table and their values are adapted for the DB client library:
+
+::
+
+    >>> registry = SchemaRegistry()
+    >>> registry.add_table("users", [
+            Column("id", "BIGINT", indexed=True),
+            Column("name", "VARCHAR(64)"),
+        ])
+    >>> select("nmae").on_table("users").sql(schema=registry)
+    Traceback (most recent call last):
+    ...
+    UnknownColumnException: Unknown column <nmae> on table <users>
+
+"""
+from collections import namedtuple
+
+from sqlquery._querybuilder import InvalidQueryException
+
+
+class UnknownColumnException(InvalidQueryException):
+    """
+    Raised when a query uses a column, or a table in a strict registry, which
+    hasn't been declared in the :py:class:`.SchemaRegistry`.
+    """
+    pass
+
+
+_Column = namedtuple(
+    'Column',
+    [
+        'name',
+        'sql_type',
+        'indexed',
+        'adapt',
+    ]
+)
+
+
+class Column(_Column):
+    """
+    Describes a column called *name*. *sql_type* is the type of the column in
+    the database, e.g. `BIGINT`. *indexed* marks columns which can be looked
+    up by an index. *adapt* is an optional function which is applied to every
+    value of the column that is passed to the DB client library, e.g. to
+    convert values to a type the library encodes efficiently.
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, sql_type=None, indexed=False, adapt=None):
+        return super(Column, cls).__new__(cls, name, sql_type, indexed, adapt)
+
+
+Table = namedtuple(
+    'Table',
+    [
+        'schema',
+        'name',
+        'columns',
+    ]
+)
+
+
+class TableColumns(dict):
+    """
+    Maps each way a column of *table* may be referred to in a query, i.e.
+    `column` and `table.column`, to a tuple of its quoted identifier and its
+    :py:class:`.Column`. Looking up an undeclared column raises
+    :py:class:`.UnknownColumnException`.
+    """
+    def __init__(self, table, encoder):
+        super(TableColumns, self).__init__()
+        self.table = table
+        for column in table.columns:
+            entry = (encoder.quoted(column.name), column)
+            self[column.name] = entry
+            self[table.name + '.' + column.name] = entry
+
+    def __missing__(self, field):
+        raise UnknownColumnException(
+            "Unknown column <{}> on table <{}>".format(field, self.table.name)
+        )
+
+
+class SchemaRegistry(object):
+    """
+    A collection of tables declared with :py:meth:`.add_table`. Tables which
+    aren't declared aren't validated, unless *strict* is set, in which case
+    they are rejected.
+    """
+    def __init__(self, strict=False):
+        self.strict = strict
+        self._tables = {}
+        self._encoded = {}
+        # counts the declarations, so that what was compiled for previous
+        # declarations can be told apart
+        self.generation = 0
+
+    def add_table(self, name, columns, schema=None):
+        """
+        Declares the table *name* in *schema* with *columns*, a list of
+        :py:class:`.Column`.
+        """
+        table = Table(schema=schema, name=name, columns=tuple(columns))
+        self._tables[(schema, name)] = table
+        # forget any columns encoded for a previous declaration
+        self._encoded = {}
+        self.generation += 1
+        return table
+
+    def get_table(self, name, schema=None):
+        """
+        Returns the declared :py:class:`.Table` or `None`
+        """
+        return self._tables.get((schema, name))
+
+    def columns_for(self, table, encoder):
+        """
+        Returns the :py:class:`.TableColumns` for the table described by the
+        :py:class:`~._querybuilder.TableOptions` *table*, or `None` if it
+        isn't declared.
+        """
+        key = (table.schema, table.name, encoder.__class__)
+        try:
+            return self._encoded[key]
+        except KeyError:
+            pass
+
+        declared = self.get_table(table.name, table.schema)
+        if declared is None:
+            if self.strict:
+                raise UnknownColumnException(
+                    "Unknown table <{}>".format(table.name)
+                )
+            columns = None
+        else:
+            columns = TableColumns(declared, encoder)
+
+        self._encoded[key] = columns
+        return columns
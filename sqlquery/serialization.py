@@ -0,0 +1,280 @@
+"""
+A stable, versioned serialized form of queries and compiled templates.
+
+:py:func:`to_data` converts a :py:class:`~._querybuilder.QueryBuilder`, a
+:py:class:`~.templates.QueryTemplate`, or any structure of them such as a
+dict of named templates, into plain data: lists, dicts with string keys,
+strings, bytes, numbers, booleans and `None`, which pickle, msgpack or
+similar formats can store. :py:func:`from_data` converts it back:
+
+::
+
+    >>> data = dumps({"user_by_name": QueryTemplate.from_builder(query)})
+    >>> # in a worker process
+    >>> templates = loads(data)
+
+Only load data from trusted sources, the adapters of parameters are imported
+by name.
+"""
+import datetime
+import decimal
+import importlib
+import pickle
+from collections import OrderedDict
+
+from sqlquery import _querybuilder
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery.sqlencoding import Literal
+from sqlquery.templates import QueryTemplate
+
+from six import binary_type, integer_types, string_types
+
+
+FORMAT_VERSION = 1
+
+
+class SerializationException(InvalidQueryException):
+    """
+    Raised when a value can't be serialized, or when serialized data is
+    invalid or was written by an incompatible version.
+    """
+    pass
+
+
+def _function_reference(function):
+    module = getattr(function, "__module__", None)
+    name = getattr(function, "__name__", "<lambda>")
+    if module is None or name == "<lambda>":
+        raise SerializationException(
+            "Can't serialize the adapter <{!r}>".format(function)
+        )
+    return [module, name]
+
+
+def _load_function(module, name):
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError):
+        raise SerializationException(
+            "Can't load the adapter <{}.{}>".format(module, name)
+        )
+
+
+def _encode(value):
+    # the order of the checks matters, Literal is a str
+    if isinstance(value, Literal):
+        return ["lit", str(value)]
+    if value is None or isinstance(
+        value, (bool, float, binary_type) + string_types + integer_types
+    ):
+        return value
+    if isinstance(value, _querybuilder.QueryBuilder):
+        return ["qb", _encode(value._query_data)]
+    if isinstance(value, _querybuilder.QueryData):
+        return ["qd", dict(
+            (field, _encode(field_value))
+            for field, field_value in zip(value._fields, value)
+            if field_value is not None
+        )]
+    if isinstance(value, _querybuilder.TableOptions):
+        return ["table", value.schema, value.name, value.alias]
+    if isinstance(value, _querybuilder.JoinOptions):
+        return [
+            "join",
+            value.join_type,
+            _encode(value.main_field),
+            _encode(value.join_field),
+            _encode(value.table),
+        ]
+    if isinstance(value, _querybuilder._LogicalOperator):
+        return ["op", value.operator, _encode(value.conditions)]
+    if isinstance(value, _querybuilder.SQLFunction):
+        return ["fn", value.function, _encode(value.fields)]
+    if isinstance(value, _querybuilder._WindowFunction):
+        return [
+            "win",
+            _encode(value.function),
+            _encode(value.partition_by),
+            _encode(value.order_by),
+        ]
+    if isinstance(value, _querybuilder._ArithmeticExpression):
+        return [
+            "ar", value.operator, _encode(value.left), _encode(value.right)
+        ]
+    if isinstance(value, _querybuilder._Field):
+        return ["col", value.field]
+    if isinstance(value, _querybuilder._Inserted):
+        return ["ins", value.field]
+    if isinstance(value, _querybuilder._SQLOrdering):
+        return ["ord", _encode(value.field), value.direction]
+    if isinstance(value, _querybuilder.Param):
+        return [
+            "param",
+            value.name,
+            _function_reference(value.adapt) if value.adapt else None
+        ]
+    if isinstance(value, QueryTemplate):
+        return ["tpl", value.sql, _encode(value.args)]
+    if isinstance(value, tuple):
+        return ["t", [_encode(item) for item in value]]
+    if isinstance(value, list):
+        return ["l", [_encode(item) for item in value]]
+    if isinstance(value, (set, frozenset)):
+        return ["set", [_encode(item) for item in value]]
+    if isinstance(value, dict):
+        return [
+            "od" if isinstance(value, OrderedDict) else "d",
+            [[_encode(key), _encode(item)] for key, item in value.items()]
+        ]
+    # the order of the checks matters, a datetime is a date
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        if value.tzinfo is not None:
+            raise SerializationException(
+                "Can't serialize the timezone aware <{!r}>".format(value)
+            )
+        if isinstance(value, datetime.datetime):
+            return ["dt", value.isoformat()]
+        return ["time", value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ["date", value.isoformat()]
+    if isinstance(value, decimal.Decimal):
+        return ["dec", str(value)]
+
+    raise SerializationException("Can't serialize <{!r}>".format(value))
+
+
+def _decode_items(items):
+    return [_decode(item) for item in items]
+
+
+def _decode_query_data(fields):
+    query_data = _querybuilder._empty_query_data
+    unknown = set(fields) - set(query_data._fields)
+    if unknown:
+        raise SerializationException(
+            "Unknown query fields <{}>".format(", ".join(sorted(unknown)))
+        )
+    return query_data._replace(**dict(
+        (field, _decode(value)) for field, value in fields.items()
+    ))
+
+
+_DECODERS = {
+    "lit": lambda value: Literal(value),
+    "qb": lambda query_data: _querybuilder.QueryBuilder(_decode(query_data)),
+    "qd": _decode_query_data,
+    "table": lambda schema, name, alias: _querybuilder.TableOptions(
+        schema=schema, name=name, alias=alias
+    ),
+    "join": lambda join_type, main_field, join_field, table: (
+        _querybuilder.JoinOptions(
+            join_type=join_type,
+            main_field=_decode(main_field),
+            join_field=_decode(join_field),
+            table=_decode(table),
+        )
+    ),
+    "op": lambda operator, conditions: _querybuilder._LogicalOperator(
+        _decode(conditions), operator
+    ),
+    "fn": lambda function, fields: _querybuilder.SQLFunction(
+        function, *_decode(fields)
+    ),
+    "win": lambda function, partition_by, order_by: (
+        _querybuilder._WindowFunction(
+            _decode(function), _decode(partition_by), _decode(order_by)
+        )
+    ),
+    "ar": lambda operator, left, right: _querybuilder._ArithmeticExpression(
+        operator, _decode(left), _decode(right)
+    ),
+    "col": lambda field: _querybuilder._Field(field),
+    "ins": lambda field: _querybuilder._Inserted(field),
+    "ord": lambda field, direction: _querybuilder._SQLOrdering(
+        _decode(field), direction
+    ),
+    "param": lambda name, adapt: _querybuilder.Param(
+        name, _load_function(*adapt) if adapt else None
+    ),
+    "tpl": lambda sql, args: QueryTemplate(sql, _decode(args)),
+    "t": lambda items: tuple(_decode_items(items)),
+    "l": _decode_items,
+    "set": lambda items: set(_decode_items(items)),
+    "d": lambda items: dict(
+        (_decode(key), _decode(item)) for key, item in items
+    ),
+    "od": lambda items: OrderedDict(
+        (_decode(key), _decode(item)) for key, item in items
+    ),
+    "dt": lambda value: _parse_datetime(value),
+    "date": lambda value: datetime.datetime.strptime(
+        value, "%Y-%m-%d"
+    ).date(),
+    "time": lambda value: _parse_datetime(
+        "1970-01-01T" + value
+    ).time(),
+    "dec": decimal.Decimal,
+}
+
+
+def _parse_datetime(value):
+    if "." in value:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f")
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S")
+
+
+def _decode(data):
+    if not isinstance(data, list):
+        return data
+    try:
+        decoder = _DECODERS[data[0]]
+    except (IndexError, KeyError, TypeError):
+        raise SerializationException("Invalid serialized value <{!r}>".format(
+            data
+        ))
+    try:
+        return decoder(*data[1:])
+    except (ValueError, TypeError, decimal.InvalidOperation):
+        raise SerializationException("Invalid serialized value <{!r}>".format(
+            data
+        ))
+
+
+def to_data(value):
+    """
+    Returns the versioned plain data form of *value*. Timezone aware
+    datetimes and times raise :py:class:`.SerializationException`, as their
+    offset would be lost.
+    """
+    return {"version": FORMAT_VERSION, "value": _encode(value)}
+
+
+def from_data(data):
+    """
+    Returns the value serialized with :py:func:`to_data`. Raises
+    :py:class:`.SerializationException` for data written by another version.
+    """
+    try:
+        version = data["version"]
+        value = data["value"]
+    except (KeyError, TypeError):
+        raise SerializationException("Invalid serialized data")
+    if version != FORMAT_VERSION:
+        raise SerializationException(
+            "Unsupported serialization version <{}>".format(version)
+        )
+    return _decode(value)
+
+
+def dumps(value):
+    """
+    Serializes *value* to bytes with pickle, see :py:func:`to_data`.
+    """
+    return pickle.dumps(to_data(value), 2)
+
+
+def loads(data):
+    """
+    Loads a value serialized with :py:func:`dumps`.
+    """
+    return from_data(pickle.loads(data))
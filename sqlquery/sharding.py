@@ -0,0 +1,174 @@
+"""
+Routing of queries to sharded tables.
+
+A :py:class:`ShardRouter` reads the shard key of a query from its `WHERE`
+conditions (or from the rows of an insert) and rewrites the main table of the
+query to the table of the matching shard:
+
+::
+
+    >>> router = ShardRouter("tenant_id", lambda tenant_id: tenant_id % 4)
+    >>> [routed] = router.route(
+            select("id").on_table("users").where(("tenant_id__eq", 6))
+        )
+    >>> routed.shard, routed.query.sql()
+    (2, (u'SELECT `a`.`id` FROM `users_2` AS `a` WHERE (`a`.`tenant_id` = %s)', (6,)))
+
+"""
+import collections
+from collections import namedtuple
+
+from sqlquery._querybuilder import _LogicalOperator
+from sqlquery._querybuilder import InvalidQueryException
+from sqlquery._querybuilder import QueryBuilder
+from sqlquery._querybuilder import parse_condition
+
+from six import string_types
+
+
+class UnroutableQueryException(InvalidQueryException):
+    """
+    Raised when the shard of a query can't be determined from the query.
+    """
+    pass
+
+
+RoutedQuery = namedtuple(
+    'RoutedQuery',
+    [
+        'shard',
+        'query',
+    ]
+)
+
+
+def shard_table_name(table, shard):
+    """
+    The default naming of shard tables, `<table>_<shard>` in the same schema
+    as *table*.
+    """
+    return u"{}_{}".format(table.name, shard), table.schema
+
+
+def _replace_condition(clause, condition, replacement):
+    conditions = []
+    for sub_clause in clause.conditions:
+        if sub_clause is condition:
+            sub_clause = replacement
+        elif isinstance(sub_clause, _LogicalOperator):
+            sub_clause = _replace_condition(sub_clause, condition, replacement)
+        conditions.append(sub_clause)
+
+    return _LogicalOperator(tuple(conditions), clause.operator)
+
+
+class ShardRouter(object):
+    """
+    Routes queries on tables which are sharded by the *shard_key* column.
+
+    *shard_for* is called with a value of the shard key and should return the
+    shard it belongs to. *table_for* is called with the
+    :py:class:`~._querybuilder.TableOptions` of the query and a shard, and
+    should return the `(name, schema)` of the table for that shard. It
+    defaults to :py:func:`.shard_table_name`.
+
+    Only the main table of a query is rewritten, joined tables are left as
+    they are.
+    """
+    def __init__(self, shard_key, shard_for, table_for=None):
+        self.shard_key = shard_key
+        self.shard_for = shard_for
+        self.table_for = table_for or shard_table_name
+
+    def _is_shard_key(self, field, table):
+        return field in (self.shard_key, table.name + '.' + self.shard_key)
+
+    def _find_shard_condition(self, clause, table):
+        """
+        Returns (condition, op, value) for the first `eq`/`in` condition on
+        the shard key which all rows of the query must satisfy.
+        """
+        if clause is None or clause.operator != "and":
+            return None
+
+        for condition in clause.conditions:
+            if isinstance(condition, _LogicalOperator):
+                found = self._find_shard_condition(condition, table)
+                if found:
+                    return found
+                continue
+
+            field, op, value = parse_condition(condition)
+            if not self._is_shard_key(field, table):
+                continue
+
+            if op == "eq" or (
+                op == "in" and
+                isinstance(value, collections.Iterable) and
+                not isinstance(value, (string_types, QueryBuilder))
+            ):
+                return condition, op, value
+
+        return None
+
+    def _on_shard(self, builder, shard):
+        name, schema = self.table_for(builder._query_data.table, shard)
+        return RoutedQuery(shard, builder.on_table(name, schema=schema))
+
+    def _route_insert(self, builder):
+        rows_by_shard = collections.OrderedDict()
+        for row in builder._query_data.insert:
+            try:
+                value = row[self.shard_key]
+            except KeyError:
+                raise UnroutableQueryException(
+                    "Inserted row has no <{}>".format(self.shard_key)
+                )
+            rows_by_shard.setdefault(self.shard_for(value), []).append(row)
+
+        return [
+            self._on_shard(builder.insert(*rows), shard)
+            for shard, rows in rows_by_shard.items()
+        ]
+
+    def route(self, builder):
+        """
+        Returns a list of :py:class:`.RoutedQuery`, one for each shard the
+        query in *builder* touches.
+
+        A query with an `eq` condition on the shard key is routed to a single
+        shard. A query with an `in` condition is split into one query per
+        shard, each with the values of the `in` list which belong to it. The
+        rows of an insert are grouped by the shard of their shard key.
+
+        Raises :py:class:`.UnroutableQueryException` if the shard key isn't
+        constrained by the query, e.g. it only appears in an `OR`.
+        """
+        query_data = builder._query_data
+        if query_data.insert is not None:
+            return self._route_insert(builder)
+
+        found = self._find_shard_condition(query_data.where, query_data.table)
+        if not found:
+            raise UnroutableQueryException(
+                "No condition on <{}> to route by".format(self.shard_key)
+            )
+
+        condition, op, value = found
+        if op == "eq":
+            return [self._on_shard(builder, self.shard_for(value))]
+
+        values_by_shard = collections.OrderedDict()
+        for item in value:
+            values_by_shard.setdefault(self.shard_for(item), []).append(item)
+
+        field = parse_condition(condition)[0]
+        return [
+            self._on_shard(
+                builder._replace(where=_replace_condition(
+                    query_data.where, condition, (field, "in", values)
+                )),
+                shard
+            )
+            for shard, values in values_by_shard.items()
+        ]
@@ -1,4 +1,11 @@
+import binascii
 import contextlib
+import datetime
+import decimal
+import math
+import re
+
+from six import integer_types, string_types, binary_type, text_type
 
 
 class _Func(str):
@@ -9,6 +16,19 @@ class Literal(str):
     pass
 
 
+_MYSQL_STRING_ESCAPES = {
+    u"\0": u"\\0",
+    u"\n": u"\\n",
+    u"\r": u"\\r",
+    u"\\": u"\\\\",
+    u"'": u"\\'",
+    u'"': u'\\"',
+    u"\x1a": u"\\Z",
+}
+
+_MYSQL_STRING_SPECIAL = re.compile(u"[\0\n\r\\\\'\"\x1a]")
+
+
 class BasicEncodings(object):
     OPERATOR_MAPPING = {
         # Comparison
@@ -17,6 +37,7 @@ class BasicEncodings(object):
         'gte': ">=",
         'gt': ">",
         'lt': "<",
+        'lte': "<=",
         'is': "IS",
         'isnot': "IS NOT",
         'like': "LIKE",
@@ -40,10 +61,55 @@ class BasicEncodings(object):
         'sum': "SUM",
         'utcnow': "UTC_TIMESTAMP",
         'unix_timestamp': "UNIX_TIMESTAMP",
+        'row_number': "ROW_NUMBER",
+        'rank': "RANK",
+        'dense_rank': "DENSE_RANK",
+        'greatest': "GREATEST",
+        'least': "LEAST",
+        'coalesce': "COALESCE",
     }
 
     SQL_NULL = "NULL"
 
+    PLACEHOLDER = u"%s"
+
+    # MySQL requires each row of a table value constructor to be wrapped in
+    # `ROW(...)`
+    ROW_CONSTRUCTOR = u"ROW"
+
+    DROP_TEMPORARY_TABLE = u"DROP TEMPORARY TABLE"
+
+    # whether the columns set by an `UPDATE` are qualified by the table alias
+    QUALIFY_SET_COLUMNS = True
+
+    EXPLAIN = u"EXPLAIN"
+
+    # whether the table of an upsert is aliased like in other statements
+    INSERT_TABLE_ALIAS = False
+
+    # whether a bulk load reads a file named by its argument, rather than
+    # data sent along with the statement
+    BULK_LOAD_FROM_FILE = True
+
+    # whether an ordered or limited select can be an operand of a `UNION` in
+    # brackets, otherwise it is selected from as a derived table
+    BRACKETED_SET_OPERANDS = True
+
+    BULK_LOAD_OPTIONS = {
+        "tsv": u"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+               u"LINES TERMINATED BY '\\n'",
+        "csv": u"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+               u"ESCAPED BY '' LINES TERMINATED BY '\\n'",
+    }
+
+    COLUMN_TYPE_MAPPING = (
+        (bool, "BOOLEAN"),
+        (integer_types, "BIGINT"),
+        (float, "DOUBLE PRECISION"),
+        (string_types, "VARCHAR(255)"),
+        (binary_type, "VARBINARY(255)"),
+    )
+
     ORDERING_MAPPING = {
         "asc": "ASC",
         "desc": "DESC",
@@ -60,6 +126,11 @@ class BasicEncodings(object):
         "outer": "OUTER JOIN",
     }
 
+    SET_OPERATION_MAPPING = {
+        "union": "UNION",
+        "union_all": "UNION ALL",
+    }
+
     @contextlib.contextmanager
     def in_brackets(self, query):
         query.append("(")
@@ -69,6 +140,96 @@ class BasicEncodings(object):
     def encode_null(self):
         return self.SQL_NULL
 
+    def encode_placeholder(self):
+        return self.PLACEHOLDER
+
+    def encode_explain(self, query):
+        return u"{} {}".format(self.EXPLAIN, query)
+
+    def encode_literal(self, value):
+        """
+        Returns *value* as an SQL literal, e.g. `'it\\'s'` for `"it's"`.
+        Raises `ValueError` for values which have no literal.
+        """
+        if value is None:
+            return self.encode_null()
+        if isinstance(value, bool):
+            return u"TRUE" if value else u"FALSE"
+        if isinstance(value, integer_types):
+            return text_type(int(value))
+        if isinstance(value, float):
+            if math.isinf(value) or math.isnan(value):
+                raise ValueError("No literal for <{!r}>".format(value))
+            return text_type(repr(value))
+        if isinstance(value, decimal.Decimal):
+            if not value.is_finite():
+                raise ValueError("No literal for <{!r}>".format(value))
+            return text_type(value)
+        if isinstance(value, string_types):
+            return self.encode_string_literal(value)
+        if isinstance(value, (binary_type, bytearray)):
+            return self.encode_binary_literal(value)
+        if isinstance(value, datetime.datetime):
+            return self.encode_string_literal(value.isoformat(" "))
+        if isinstance(value, (datetime.date, datetime.time)):
+            return self.encode_string_literal(value.isoformat())
+
+        raise ValueError("No literal for <{!r}>".format(value))
+
+    def encode_string_literal(self, value):
+        # MySQL's escaping, as long as NO_BACKSLASH_ESCAPES isn't set
+        return u"'{}'".format(_MYSQL_STRING_SPECIAL.sub(
+            lambda match: _MYSQL_STRING_ESCAPES[match.group()], value
+        ))
+
+    def encode_binary_literal(self, value):
+        return u"X'{}'".format(
+            binascii.hexlify(bytes(value)).decode("ascii")
+        )
+
+    def render_literals(self, query, args):
+        """
+        Returns the *query* string returned by :py:meth:`.QueryBuilder.sql`
+        with each placeholder replaced by its argument in *args* encoded with
+        :py:meth:`.encode_literal`, and a `%` escaped for the `%s` paramstyle
+        unescaped.
+        """
+        parts = query.split(self.encode_placeholder())
+        if len(parts) != len(args) + 1:
+            raise ValueError(
+                "Query has {} placeholders for {} arguments".format(
+                    len(parts) - 1, len(args)
+                )
+            )
+
+        parts = [self._unescaped(part) for part in parts]
+        rendered = [parts[0]]
+        for arg, part in zip(args, parts[1:]):
+            rendered.append(self.encode_literal(arg))
+            rendered.append(part)
+        return u"".join(rendered)
+
+    def _unescaped(self, query):
+        if self.PLACEHOLDER == u"%s":
+            return query.replace(u"%%", u"%")
+        return query
+
+    def encode_values_row(self, width=1):
+        return u"{}({})".format(
+            self.ROW_CONSTRUCTOR,
+            u", ".join([self.encode_placeholder()] * width)
+        )
+
+    def encode_column_type(self, value):
+        for python_type, sql_type in self.COLUMN_TYPE_MAPPING:
+            if isinstance(value, python_type):
+                return sql_type
+
+        raise ValueError("No column type known for {!r}".format(value))
+
+    def encode_drop_temporary_table(self, table_name):
+        return [self.DROP_TEMPORARY_TABLE, self.quoted(table_name)]
+
     def quoted(self, element):
         if element.startswith("`") and element.endswith("`"):
             return element
@@ -79,7 +240,13 @@ class BasicEncodings(object):
         return _Func(sql_func)
 
     def encode_op(self, op):
-        return self.OPERATOR_MAPPING[op]
+        return self._escaped(self.OPERATOR_MAPPING[op])
+
+    def _escaped(self, token):
+        # drivers of the `%s` paramstyle format the query with Python's `%`
+        if self.PLACEHOLDER == u"%s":
+            return token.replace(u"%", u"%%")
+        return token
 
     def encode_logical_op(self, op):
         return self.BOOLEAN_MAPPING[op]
@@ -90,19 +257,43 @@ class BasicEncodings(object):
     def encode_join_type(self, join_type):
         return self.JOIN_TYPES_MAPPING[join_type]
 
+    def encode_set_operation(self, operation):
+        return self.SET_OPERATION_MAPPING[operation]
+
+    def encode_rollup(self, group_by_fields):
+        return group_by_fields + [u"WITH ROLLUP"]
+
+    def encode_upsert(self, key_columns):
+        # MySQL updates the row of whichever unique key conflicts
+        return [u"ON DUPLICATE KEY UPDATE"]
+
+    def encode_inserted(self, column):
+        return u"VALUES({})".format(column)
+
+    def encode_bulk_load(self, table_name, columns, format):
+        query = [
+            u"LOAD DATA LOCAL INFILE",
+            self.encode_placeholder(),
+            u"INTO TABLE",
+            table_name,
+            u"CHARACTER SET utf8mb4",
+            self.BULK_LOAD_OPTIONS[format],
+        ]
+        with self.in_brackets(query):
+            query.append(u", ".join(columns))
+        return query
+
     def encode_field(self, field, table_name, table_alias, include_alias=True):
         if isinstance(field, Literal):
             return field
 
-        if not include_alias:
-            return self.quoted(field.value)
-
-        prefix = table_alias
         if field.startswith(table_name + '.'):
             field = field[len(table_name + '.'):]
-            prefix = table_alias
 
-        return self.quoted(prefix) + '.' + self.quoted(field)
+        if not include_alias:
+            return self.quoted(field)
+
+        return self.quoted(table_alias) + '.' + self.quoted(field)
 
     def encode_table_name(self, table_name, table_alias, table_schema,
                           include_alias=True):
@@ -163,7 +354,75 @@ class BasicEncodings(object):
 
 
 class ANSIEncodings(BasicEncodings):
+    ROW_CONSTRUCTOR = u""
+
+    DROP_TEMPORARY_TABLE = u"DROP TABLE"
+
+    BULK_LOAD_FROM_FILE = False
+
+    INSERT_TABLE_ALIAS = True
+
+    BULK_LOAD_OPTIONS = {
+        "tsv": None,
+        "csv": u"WITH (FORMAT csv, NULL 'NULL')",
+    }
+
+    def encode_rollup(self, group_by_fields):
+        return [u"ROLLUP", u"("] + group_by_fields + [u")"]
+
+    def encode_upsert(self, key_columns):
+        if not key_columns:
+            raise ValueError("An upsert requires the columns of its key")
+        query = [u"ON CONFLICT", u"("]
+        query.append(u", ".join(key_columns))
+        query.extend([u")", u"DO UPDATE SET"])
+        return query
+
+    def encode_inserted(self, column):
+        return u"EXCLUDED.{}".format(column)
+
+    def encode_bulk_load(self, table_name, columns, format):
+        query = [u"COPY", table_name]
+        with self.in_brackets(query):
+            query.append(u", ".join(columns))
+        query.append(u"FROM STDIN")
+        if self.BULK_LOAD_OPTIONS[format]:
+            query.append(self.BULK_LOAD_OPTIONS[format])
+        return query
+
+    def encode_string_literal(self, value):
+        if u"\0" in value:
+            raise ValueError("No literal for a string containing NUL")
+        return u"'{}'".format(value.replace(u"'", u"''"))
+
+    def encode_binary_literal(self, value):
+        # `X'..'` is a bit string in PostgreSQL, not a `bytea`
+        return u"decode('{}', 'hex')".format(
+            binascii.hexlify(bytes(value)).decode("ascii")
+        )
+
     def quoted(self, element):
         if element.startswith('"') and element.endswith('"'):
             return element
         return u'"{!s}"'.format(element)
+
+
+class SQLiteEncodings(ANSIEncodings):
+    PLACEHOLDER = u"?"
+
+    QUALIFY_SET_COLUMNS = False
+
+    EXPLAIN = u"EXPLAIN QUERY PLAN"
+
+    BRACKETED_SET_OPERANDS = False
+
+    FUNC_MAPPING = dict(
+        ANSIEncodings.FUNC_MAPPING, greatest="MAX", least="MIN"
+    )
+
+    def encode_binary_literal(self, value):
+        # SQLite has no `decode()`, its blob literals are `X'..'`
+        return BasicEncodings.encode_binary_literal(self, value)
+
+    def encode_bulk_load(self, table_name, columns, format):
+        raise ValueError("SQLite has no bulk load statement")
@@ -0,0 +1,144 @@
+"""
+Compiling a query once and binding its values many times.
+
+A query built with :py:class:`~._querybuilder.Param` placeholders compiles to
+a :py:class:`QueryTemplate`, a query string together with the layout of its
+arguments. Binding the template only builds the arguments, so none of the
+work of :py:meth:`.QueryBuilder.sql` is repeated:
+
+::
+
+    >>> template = QueryTemplate.from_builder(
+            select("id").on_table("users").where(
+                ("name__eq", Param("name")), ("active__eq", 1)
+            ).limit(Param("limit"))
+        )
+    >>> template.bind(name="bob", limit=10)
+    (u'SELECT `a`.`id` FROM `users` AS `a` WHERE (`a`.`name` = %s) AND (`a`.`active` = %s) LIMIT %s', ('bob', 1, 10))
+
+For the hottest queries :py:meth:`QueryTemplate.function` generates a python
+function which returns the same result with a single tuple build.
+"""
+import keyword
+import re
+from collections import namedtuple
+
+from sqlquery._querybuilder import Param
+from sqlquery._querybuilder import InvalidQueryException
+
+
+_IDENTIFIER = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+class QueryTemplate(namedtuple('QueryTemplate', ['sql', 'args'])):
+    """
+    *sql* is the query string. *args* is a tuple with a
+    :py:class:`~._querybuilder.Param` for each argument which is bound later
+    and the value of each other argument.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_builder(cls, builder, encoder=None, schema=None):
+        """
+        Compiles the query in *builder*, see :py:meth:`.QueryBuilder.sql`.
+        """
+        sql, args = builder.sql(encoder=encoder, schema=schema)
+        return cls(sql, args)
+
+    @property
+    def params(self):
+        """
+        The names of the parameters, in the order they first appear.
+        """
+        names = []
+        for arg in self.args:
+            if isinstance(arg, Param) and arg.name not in names:
+                names.append(arg.name)
+        return tuple(names)
+
+    def bind(self, **values):
+        """
+        Returns `(query_string, arguments)` with each parameter replaced by
+        its value in *values*.
+        """
+        missing = set(self.params) - set(values)
+        if missing:
+            raise InvalidQueryException(
+                "Missing values for <{}>".format(", ".join(sorted(missing)))
+            )
+
+        return self.sql, tuple(
+            (arg.adapt(values[arg.name]) if arg.adapt else values[arg.name])
+            if isinstance(arg, Param) else arg
+            for arg in self.args
+        )
+
+    def source(self, name="bind"):
+        """
+        Returns the source of the function generated by :py:meth:`.function`
+        """
+        for identifier in (name,) + self.params:
+            if (
+                not _IDENTIFIER.match(identifier) or
+                keyword.iskeyword(identifier)
+            ):
+                raise InvalidQueryException(
+                    "<{}> is not a valid identifier".format(identifier)
+                )
+
+        constants, elements = [], []
+        for index, arg in enumerate(self.args):
+            if not isinstance(arg, Param):
+                constants.append("    _c{0} = _args[{0}]\n".format(index))
+                elements.append("_c{}".format(index))
+            elif arg.adapt is not None:
+                constants.append(
+                    "    _a{0} = _args[{0}].adapt\n".format(index)
+                )
+                elements.append("_a{}({})".format(index, arg.name))
+            else:
+                elements.append(arg.name)
+
+        if not self.params:
+            # nothing to bind, the arguments are constant
+            constants, body = [], "_args"
+        else:
+            body = "({},)".format(", ".join(elements))
+
+        return (
+            "def _factory(_sql, _args):\n"
+            "{constants}"
+            "    def {name}({params}):\n"
+            "        return _sql, {body}\n"
+            "    return {name}\n"
+        ).format(
+            constants="".join(constants),
+            name=name,
+            params=", ".join(self.params),
+            body=body
+        )
+
+    def function(self, name="bind"):
+        """
+        Generates a function which takes the parameters as arguments and
+        returns the same as :py:meth:`.bind`. The query string and the
+        argument tuple are built without any loops, so calling it costs
+        little more than building a tuple.
+        """
+        namespace = {}
+        code = compile(self.source(name), "<sqlquery.templates>", "exec")
+        exec(code, namespace)
+        bind = namespace["_factory"](self.sql, self.args)
+        bind.sql = self.sql
+        bind.params = self.params
+        return bind
+
+
+def compile_query(builder, encoder=None, schema=None, name="bind"):
+    """
+    A shortcut for `QueryTemplate.from_builder(...).function(name)`
+    """
+    return QueryTemplate.from_builder(
+        builder, encoder=encoder, schema=schema
+    ).function(name)
@@ -0,0 +1,231 @@
+"""
+A read-only file of compiled :py:class:`~.templates.QueryTemplate`, which
+worker processes open with `mmap` so that they start with every template
+already compiled, sharing the pages of the file instead of each holding a
+copy of the catalogue.
+
+The file is written once, e.g. at deploy time, with :py:func:`write_store`.
+Templates are looked up by key, by default their query string, and are only
+decoded when first used:
+
+::
+
+    >>> write_store("/var/cache/app/templates", {
+            "user_by_name": QueryTemplate.from_builder(query),
+        })
+    >>> # in each worker
+    >>> store = TemplateStore("/var/cache/app/templates")
+    >>> bind = store.function("user_by_name")
+    >>> cursor.execute(*bind(name="bob"))
+
+The file starts with a header and an index of fixed size entries, the sha1
+digest of each key with the offset and length of its record, sorted by
+digest, so a lookup is a binary search of the mapped index. Each record is
+the key and the template as written by :py:mod:`~sqlquery.serialization`.
+"""
+import bisect
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+
+from sqlquery.serialization import SerializationException
+from sqlquery.serialization import from_data, to_data
+
+
+_MAGIC = b"SQLQTPL"
+
+STORE_VERSION = 1
+
+_HEADER = struct.Struct("<7sBI")
+
+_ENTRY = struct.Struct("<20sQI")
+
+
+def _digest(key):
+    return hashlib.sha1(key.encode("utf-8")).digest()
+
+
+def write_store(path, templates):
+    """
+    Writes *templates* to the store file *path*, replacing it atomically so
+    that processes which have the previous file open keep reading it.
+
+    *templates* is a dict of key to template, or an iterable of templates
+    which are keyed by their query string. Unlike a
+    :py:func:`~.profiling.query_fingerprint`, the query string tells apart
+    lists of placeholders of different lengths, which the arguments of a
+    template depend on. Returns the number of templates written.
+    """
+    if not isinstance(templates, dict):
+        keyed = {}
+        for template in templates:
+            other = keyed.get(template.sql, template)
+            # parameters have no equality, their data has
+            if to_data(other) != to_data(template):
+                raise ValueError(
+                    "Different templates for <{}>, key them by name "
+                    "instead".format(template.sql)
+                )
+            keyed[template.sql] = template
+        templates = keyed
+
+    records = sorted(
+        (_digest(key), pickle.dumps(to_data([key, template]), 2))
+        for key, template in templates.items()
+    )
+
+    offset = _HEADER.size + _ENTRY.size * len(records)
+    index = []
+    for digest, record in records:
+        index.append(_ENTRY.pack(digest, offset, len(record)))
+        offset += len(record)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(_HEADER.pack(_MAGIC, STORE_VERSION, len(records)))
+            output.write(b"".join(index))
+            for _, record in records:
+                output.write(record)
+        os.rename(temp_path, path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    return len(records)
+
+
+class _Digests(object):
+    """
+    The digests of the mapped index as a sequence, for `bisect`
+    """
+    def __init__(self, mapped, count):
+        self.mapped = mapped
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        start = _HEADER.size + _ENTRY.size * position
+        return self.mapped[start:start + 20]
+
+
+class TemplateStore(object):
+    """
+    The store file at *path*, see :py:func:`.write_store`. The file is
+    mapped read-only; templates are decoded when first looked up and then
+    kept by the store, as are the functions generated from them.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as store_file:
+            self._mapped = mmap.mmap(
+                store_file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+
+        if len(self._mapped) < _HEADER.size:
+            self.close()
+            raise SerializationException("<{}> is not a template store".format(
+                path
+            ))
+        magic, version, count = _HEADER.unpack_from(self._mapped, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise SerializationException("<{}> is not a template store".format(
+                path
+            ))
+        if version != STORE_VERSION:
+            self.close()
+            raise SerializationException(
+                "Unsupported template store version <{}>".format(version)
+            )
+
+        self._digests = _Digests(self._mapped, count)
+        self._templates = {}
+        self._functions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._mapped.close()
+
+    def __len__(self):
+        return len(self._digests)
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        template = self.get(key)
+        if template is None:
+            raise KeyError(key)
+        return template
+
+    def _find(self, key):
+        digest = _digest(key)
+        position = bisect.bisect_left(self._digests, digest)
+        if (
+            position == len(self._digests) or
+            self._digests[position] != digest
+        ):
+            return None
+        return position
+
+    def _record(self, position):
+        _, offset, length = _ENTRY.unpack_from(
+            self._mapped, _HEADER.size + _ENTRY.size * position
+        )
+        return from_data(pickle.loads(self._mapped[offset:offset + length]))
+
+    def get(self, key, default=None):
+        """
+        Returns the template stored for *key*, or *default*.
+        """
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        position = self._find(key)
+        if position is None:
+            return default
+        stored_key, template = self._record(position)
+        if stored_key != key:
+            # a digest collision
+            return default
+
+        self._templates[key] = template
+        return template
+
+    def get_sql(self, sql):
+        """
+        Returns the template stored for the query string *sql*, or `None`.
+        """
+        return self.get(sql)
+
+    def function(self, key):
+        """
+        Returns the :py:meth:`~.QueryTemplate.function` of the template for
+        *key*.
+        """
+        function = self._functions.get(key)
+        if function is None:
+            function = self._functions[key] = self[key].function()
+        return function
+
+    def keys(self):
+        """
+        Returns the keys of all templates, which decodes every record.
+        """
+        return [
+            self._record(position)[0]
+            for position in range(len(self._digests))
+        ]
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import datetime
+import io
+import os
+
+from sqlquery.bulkload import csv_field, tsv_field
+from sqlquery.queryapi import QueryBuilder, insert, select
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.schema import Column, SchemaRegistry
+from sqlquery.sqlencoding import ANSIEncodings, SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class BulkLoadStatementTestCase(BaseTestCase):
+    def setUp(self):
+        super(BulkLoadStatementTestCase, self).setUp()
+        self.query = insert(
+            {"id": 1, "name": u"a"}, {"id": 2, "name": u"b"}
+        ).on_table("users", schema="app")
+
+    def test_load_data(self):
+        load = self.query.bulk_load()
+
+        self.assertEqual(
+            (u"LOAD DATA LOCAL INFILE %s INTO TABLE `app`.`users` "
+             u"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' "
+             u"ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (`id`, `name`)",
+             ("/tmp/users.tsv",)),
+            load.statement("/tmp/users.tsv")
+        )
+        with self.assertRaises(ValueError):
+            load.statement()
+
+    def test_load_data_csv(self):
+        self.assertEqual(
+            u"LOAD DATA LOCAL INFILE %s INTO TABLE `app`.`users` "
+            u"CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' "
+            u"OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            u"LINES TERMINATED BY '\\n' (`id`, `name`)",
+            self.query.bulk_load(format="csv").sql
+        )
+
+    def test_copy(self):
+        self.assertEqual(
+            (u'COPY "app"."users" ("id", "name") FROM STDIN', ()),
+            self.query.bulk_load(encoder=ANSIEncodings()).statement()
+        )
+        self.assertEqual(
+            u'COPY "app"."users" ("id", "name") FROM STDIN '
+            u"WITH (FORMAT csv, NULL 'NULL')",
+            self.query.bulk_load(format="csv", encoder=ANSIEncodings()).sql
+        )
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidQueryException):
+            self.query.bulk_load(format="xml")
+        with self.assertRaises(InvalidQueryException):
+            self.query.bulk_load(encoder=SQLiteEncodings())
+        with self.assertRaises(InvalidQueryException):
+            select("id").on_table("users").bulk_load()
+        with self.assertRaises(InvalidQueryException):
+            QueryBuilder().on_table("users").bulk_load(rows=[(1,)])
+
+
+class BulkLoadDataTestCase(BaseTestCase):
+    def test_fields(self):
+        self.assertEqual(
+            [u"\\N", u"1", u"12", u"1.5", u"2020-01-02 03:04:05",
+             u"a\\\\b\\tc\\nd\\re\\0"],
+            [tsv_field(value) for value in (
+                None, True, 12, 1.5, datetime.datetime(2020, 1, 2, 3, 4, 5),
+                u"a\\b\tc\nd\re\0",
+            )]
+        )
+        self.assertEqual(
+            [u"NULL", u"0", u'"say ""hi"", \\o/\n"'],
+            [csv_field(value) for value in (
+                None, False, u'say "hi", \\o/\n'
+            )]
+        )
+        with self.assertRaises(ValueError):
+            tsv_field(bytearray(b"\x00"))
+
+    def test_insert_rows(self):
+        load = insert(
+            {"id": 1, "name": u"a\tb"}, {"id": 2, "name": None}
+        ).on_table("users").bulk_load()
+
+        self.assertEqual(
+            u"1\ta\\tb\n2\t\\N\n", load.buffer().getvalue()
+        )
+
+    def test_streamed_tuples(self):
+        rows = ((index, u"n{}".format(index)) for index in range(3))
+        load = QueryBuilder().on_table("users").bulk_load(
+            rows=rows, columns=("id", "name"), format="csv"
+        )
+        output = io.StringIO()
+
+        self.assertEqual(3, load.write(output))
+        self.assertEqual(
+            u'0,"n0"\n1,"n1"\n2,"n2"\n', output.getvalue()
+        )
+
+    def test_schema_adapters(self):
+        registry = SchemaRegistry()
+        registry.add_table("users", [
+            Column("id", "BIGINT"), Column("name", adapt=lambda v: v.upper())
+        ])
+        load = QueryBuilder().on_table("users").bulk_load(
+            rows=[(1, u"bob")], columns=("id", "name"), schema=registry
+        )
+
+        self.assertEqual(u"1\tBOB\n", load.buffer().getvalue())
+
+    def test_temp_file(self):
+        load = QueryBuilder().on_table("users").bulk_load(
+            rows=[(u"é",)], columns=("name",)
+        )
+        name = load.temp_file()
+        try:
+            self.assertTrue(name.endswith(".tsv"))
+            with io.open(name, encoding="utf-8") as data:
+                self.assertEqual(u"é\n", data.read())
+        finally:
+            os.remove(name)
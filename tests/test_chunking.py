@@ -0,0 +1,123 @@
+import sqlite3
+
+from sqlquery.chunking import ChunkedMutation
+from sqlquery.queryapi import select, update, delete
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class ChunkedMutationTestCase(BaseTestCase):
+    def setUp(self):
+        super(ChunkedMutationTestCase, self).setUp()
+        self.delete = delete().on_table("events").where(("kind__eq", "old"))
+
+    def test_limit_statement(self):
+        self.assertEqual(
+            ("DELETE FROM `events` AS `a` WHERE (`a`.`kind` = %s) "
+             "ORDER BY `a`.`id` LIMIT %s", ("old", 100)),
+            ChunkedMutation(self.delete, batch_size=100).limit_statement()
+        )
+
+    def test_keyset_statements(self):
+        mutation = ChunkedMutation(
+            update(kind="new").on_table("events").where(("kind__eq", "old")),
+            key="event_id",
+            batch_size=100,
+            strategy="keyset"
+        )
+
+        self.assertEqual(
+            ("SELECT `a`.`event_id` FROM `events` AS `a` "
+             "WHERE (`a`.`kind` = %s) AND (`a`.`event_id` > %s) "
+             "ORDER BY `a`.`event_id` LIMIT %s", ("old", 7, 100)),
+            mutation.keys_statement(after=7)
+        )
+        self.assertEqual(
+            ("UPDATE `events` AS `a` SET `a`.`kind` = %s "
+             "WHERE (`a`.`kind` = %s) AND (`a`.`event_id` >= %s) "
+             "AND (`a`.`event_id` <= %s)", ("new", "old", 8, 20)),
+            mutation.range_statement(8, 20)
+        )
+
+    def test_only_mutations(self):
+        for builder, strategy in (
+            (select("id").on_table("events"), "limit"),
+            (self.delete, "bogus"),
+        ):
+            with self.assertRaises(InvalidQueryException):
+                ChunkedMutation(builder, strategy=strategy)
+
+
+class ChunkedMutationSQLiteTestCase(BaseTestCase):
+    def setUp(self):
+        super(ChunkedMutationSQLiteTestCase, self).setUp()
+        self.connection = sqlite3.connect(":memory:")
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE events (id INTEGER, kind TEXT)")
+        self.cursor.executemany(
+            "INSERT INTO events VALUES (?, ?)",
+            [(i, "old" if i % 3 else "new") for i in range(100)]
+        )
+        self.paced = []
+
+    def tearDown(self):
+        self.connection.close()
+        super(ChunkedMutationSQLiteTestCase, self).tearDown()
+
+    def _execute(self, builder, strategy):
+        return ChunkedMutation(
+            builder,
+            batch_size=10,
+            strategy=strategy,
+            encoder=SQLiteEncodings()
+        ).execute(
+            self.cursor,
+            pace=lambda affected, total: self.paced.append((affected, total))
+        )
+
+    def _count(self, kind):
+        return self.cursor.execute(
+            "SELECT COUNT(*) FROM events WHERE kind = ?", (kind,)
+        ).fetchone()[0]
+
+    def test_keyset_delete(self):
+        self.assertEqual(
+            66,
+            self._execute(
+                delete().on_table("events").where(("kind__eq", "old")),
+                "keyset"
+            )
+        )
+        self.assertEqual(0, self._count("old"))
+        self.assertEqual(7, len(self.paced))
+        self.assertEqual((6, 66), self.paced[-1])
+
+    def test_keyset_update(self):
+        self.assertEqual(
+            66,
+            self._execute(
+                update(kind="done").on_table("events").where(
+                    ("kind__eq", "old")
+                ),
+                "keyset"
+            )
+        )
+        self.assertEqual(66, self._count("done"))
+
+    def test_limit_delete(self):
+        try:
+            self.cursor.execute("DELETE FROM events ORDER BY id LIMIT 0")
+        except sqlite3.OperationalError:
+            self.skipTest("sqlite3 is built without DELETE ... LIMIT")
+
+        self.assertEqual(
+            66,
+            self._execute(
+                delete().on_table("events").where(("kind__eq", "old")),
+                "limit"
+            )
+        )
+        self.assertEqual(0, self._count("old"))
+        self.assertEqual([10] * 6 + [6], [a for a, _ in self.paced])
@@ -0,0 +1,164 @@
+import sqlite3
+from unittest import skipIf
+
+from sqlquery import evaluation
+from sqlquery.evaluation import Predicate, compile_expression, like_pattern
+from sqlquery.queryapi import select, AND, OR, XOR, F, COUNT, Param
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+ROWS = [
+    {"id": 1, "name": "bob", "age": 30, "score": 1.5},
+    {"id": 2, "name": "Bobby", "age": None, "score": 2.0},
+    {"id": 3, "name": "alice_1", "age": 17, "score": None},
+    {"id": 4, "name": None, "age": 45, "score": 0.0},
+]
+
+CONDITIONS = [
+    ("age__gte", 18),
+    ("age__neq", 30),
+    ("name__like", "bob%"),
+    ("name__like", "%i_e%"),
+    ("id__in", [1, 3, 5]),
+    ("id__not_in", [1, 3]),
+    ("age__in", [30, None]),
+    ("age__not_in", [30, None]),
+    ("age__is", None),
+    ("name__isnot", None),
+    (F("age") + 1, "gt", 30),
+    ("score", "lt", F("id")),
+    OR(("age__lt", 18), ("name__eq", "bob")),
+    AND(("age__gt", 1), OR(("score__eq", 2.0), ("id__eq", 4))),
+    OR(("age__gt", 100), ("score__gt", 100)),
+    ("name__eq", "BOB"),
+    ("name__in", ["BOBBY", "alice_1"]),
+    ("name__gt", "b"),
+    ("name__like", "B%"),
+    (F("age") % -7, "eq", 3),
+    (F("id") * -3 % 4, "eq", -1),
+]
+
+
+class PredicateTestCase(BaseTestCase):
+    def matching_ids(self, condition):
+        return [row["id"] for row in Predicate(condition).filter(ROWS)]
+
+    def assertMatchesSQLite(self, case_sensitive):
+        connection = sqlite3.connect(":memory:")
+        if case_sensitive:
+            connection.execute("PRAGMA case_sensitive_like = ON")
+        connection.execute(
+            "CREATE TABLE people (id INTEGER, name TEXT {}, age INTEGER, "
+            "score REAL)".format("" if case_sensitive else "COLLATE NOCASE")
+        )
+        connection.executemany(
+            "INSERT INTO people VALUES (:id, :name, :age, :score)", ROWS
+        )
+
+        for condition in CONDITIONS:
+            query = select("id").on_table("people").where(condition)
+            expected = [
+                row[0] for row in connection.execute(
+                    *query.sql(encoder=SQLiteEncodings())
+                )
+            ]
+            self.assertEqual(sorted(expected), [
+                row["id"] for row in Predicate(
+                    query, case_sensitive=case_sensitive
+                ).filter(ROWS)
+            ], condition)
+        connection.close()
+
+    def test_matches_sqlite(self):
+        self.assertMatchesSQLite(case_sensitive=True)
+
+    def test_matches_sqlite_ignoring_case(self):
+        self.assertMatchesSQLite(case_sensitive=False)
+
+    def test_integer_division_truncates(self):
+        connection = sqlite3.connect(":memory:")
+        divide = compile_expression(F("x") // F("y"))
+        modulo = compile_expression(F("x") % F("y"))
+        for row in (
+            {"x": -7, "y": 2}, {"x": 7, "y": -2}, {"x": -7, "y": 3},
+            {"x": -8, "y": 2}, {"x": 7, "y": 3}, {"x": 0, "y": -3},
+        ):
+            self.assertEqual(
+                connection.execute("SELECT :x / :y, :x % :y", row).fetchone(),
+                (divide(row), modulo(row)),
+                row
+            )
+        connection.close()
+
+        self.assertEqual([4], self.matching_ids((F("id") // -2, "eq", -2)))
+
+    def test_three_valued_logic(self):
+        predicate = Predicate(("age__gt", 18))
+        self.assertIsNone(predicate.evaluate({"age": None}))
+        self.assertFalse(predicate({"age": None}))
+        self.assertEqual([3, 4], self.matching_ids(XOR(
+            ("age__lt", 18), ("id__gt", 3)
+        )))
+        # an unknown operand makes XOR unknown
+        predicate = Predicate(XOR(
+            ("age__is", None), ("score__gt", -1), ("id__eq", 3)
+        ))
+        self.assertEqual([1, 4], [
+            row["id"] for row in ROWS if predicate(row)
+        ])
+        self.assertIsNone(predicate.evaluate(ROWS[2]))
+
+    def test_inputs(self):
+        self.assertTrue(Predicate(None)({}))
+        self.assertTrue(Predicate({"a.id__eq": 1})({"id": 1}))
+        self.assertTrue(Predicate(("users.id__eq", 1))({"users.id": 1}))
+        self.assertFalse(Predicate(("name__like", "BOB"))(ROWS[0]))
+        self.assertTrue(
+            Predicate(("name__like", "BOB"), case_sensitive=False)(ROWS[0])
+        )
+        # backslash escapes as in MySQL
+        self.assertEqual([3], self.matching_ids(("name__like", "alice\\_%")))
+        self.assertEqual([], self.matching_ids(("name__like", "alice\\%")))
+        self.assertTrue(like_pattern("a.c%").match("a.cd"))
+        self.assertFalse(like_pattern("a.c%").match("abcd"))
+
+    def test_unsupported(self):
+        for condition in (
+            ("id__in", select("id").on_table("other")),
+            ("id__eq", Param("id")),
+            (COUNT(), "gt", 1),
+        ):
+            with self.assertRaises(InvalidQueryException):
+                Predicate(condition)
+
+    @skipIf(evaluation.numpy is None, "numpy is not installed")
+    def test_mask(self):
+        numpy = evaluation.numpy
+        columns = dict(
+            (column, [row[column] for row in ROWS])
+            for column in ("id", "name", "age", "score")
+        )
+        columns["id"] = numpy.array(columns["id"])
+
+        for condition in CONDITIONS + [
+            XOR(("age__lt", 18), ("id__gt", 3)),
+            XOR(("age__is", None), ("score__gt", -1), ("id__eq", 3)),
+            (F("id") // -2, "eq", -2),
+            (F("age") // -7, "eq", -2),
+        ]:
+            for case_sensitive in (True, False):
+                predicate = Predicate(condition, case_sensitive=case_sensitive)
+                mask = predicate.mask(columns)
+                self.assertEqual(numpy.bool_, mask.dtype.type)
+                self.assertEqual(
+                    [row["id"] for row in predicate.filter(ROWS)],
+                    list(numpy.array(columns["id"])[mask]),
+                    condition
+                )
+
+        self.assertEqual(
+            [True] * 4, list(Predicate(None).mask(columns))
+        )
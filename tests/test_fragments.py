@@ -0,0 +1,218 @@
+from mock import patch
+
+from sqlquery._querybuilder import SQLCompiler
+from sqlquery.queryapi import (
+    select, update, AND, OR, COUNT, DESC, F, Param, FragmentCache
+)
+from sqlquery.schema import SchemaRegistry, Column
+from sqlquery.sqlencoding import ANSIEncodings
+
+from tests import BaseTestCase
+
+
+class FragmentCacheTestCase(BaseTestCase):
+    def setUp(self):
+        super(FragmentCacheTestCase, self).setUp()
+        self.cache = FragmentCache()
+        self.registry = SchemaRegistry()
+        self.registry.add_table("users", [
+            Column("id", "BIGINT", indexed=True),
+            Column("name", "VARCHAR(64)", adapt=lambda name: name.lower()),
+            Column("score", "INTEGER"),
+        ])
+        self.registry.add_table("logins", [
+            Column("user_id", "BIGINT", indexed=True),
+            Column("day", "DATE"),
+        ])
+
+    def queries(self, name, score):
+        users = select("id").on_table("users")
+        return [
+            users.where(("name__eq", name), ("score__gt", score)),
+            users.where(OR(("name__in", [name, "X"]), ("score__is", None))),
+            users.where(("score__eq", F("id") * score)),
+            users.where(AND(
+                ("name__eq", Param("name")),
+                OR(("score__lt", score), ("id__gt", COUNT("score"))),
+            )),
+            users.join("logins", "id", "user_id").where(
+                ("logins.day__gte", name), ("score__neq", score)
+            ),
+            update(score=1).on_table("users").where(("name__eq", name)),
+        ]
+
+    def assertCompilesAsUncached(self, queries, **kwargs):
+        for query in queries:
+            # Param has no equality
+            self.assertEqual(
+                repr(query.sql(**kwargs)),
+                repr(query.sql(fragment_cache=self.cache, **kwargs))
+            )
+
+    def test_cached_fragments_compile_as_uncached(self):
+        for kwargs in ({}, {"schema": self.registry},
+                       {"encoder": ANSIEncodings()}):
+            self.assertCompilesAsUncached(self.queries("BOB", 5), **kwargs)
+            self.assertCompilesAsUncached(self.queries("Ann", 9), **kwargs)
+
+        self.assertEqual(
+            ('SELECT "a"."id" FROM "users" AS "a" WHERE '
+             '("a"."name" = %s) AND ("a"."score" > %s)',
+             ("bob", 7)),
+            self.queries("BOB", 7)[0].sql(
+                encoder=ANSIEncodings(), schema=self.registry,
+                fragment_cache=self.cache
+            )
+        )
+
+    def test_same_shape_is_reused(self):
+        users = select("id").on_table("users")
+        queries = [
+            users.where(("name__in", ["a", "b"]), ("score__gt", score))
+            for score in range(10)
+        ]
+        with patch.object(
+            SQLCompiler, "_generate_logical_clause", autospec=True,
+            side_effect=SQLCompiler._generate_logical_clause
+        ) as generate:
+            for query in queries:
+                query.sql(fragment_cache=self.cache)
+
+        self.assertEqual(1, generate.call_count)
+        # the select is shared, each new where clause reuses its shape
+        self.assertEqual((18, 2), (self.cache.hits, self.cache.misses))
+        self.assertEqual(0.9, self.cache.hit_rate)
+
+        # a different number of values is another shape
+        users.where(
+            ("name__in", ["a", "b", "c"]), ("score__gt", 1)
+        ).sql(fragment_cache=self.cache)
+        self.assertEqual(3, self.cache.misses)
+
+    def test_declaring_a_table_invalidates_fragments(self):
+        query = self.queries("BOB", 5)[0]
+        self.assertEqual(
+            ("bob", 5),
+            query.sql(schema=self.registry, fragment_cache=self.cache)[1]
+        )
+        self.registry.add_table("users", [
+            Column("id", "BIGINT", indexed=True),
+            Column("name", "VARCHAR(64)", adapt=lambda name: name.upper()),
+            Column("score", "INTEGER"),
+        ])
+        self.assertCompilesAsUncached(
+            self.queries("Bob", 5), schema=self.registry
+        )
+        self.assertEqual(
+            ("BOB", 5),
+            query.sql(schema=self.registry, fragment_cache=self.cache)[1]
+        )
+
+    def test_subqueries_are_not_cached(self):
+        query = select("id").on_table("users").where(
+            ("id__in", select("user_id").on_table("logins"))
+        )
+        self.assertEqual(0.0, self.cache.hit_rate)
+        query.sql(fragment_cache=self.cache)
+        query.sql(fragment_cache=self.cache)
+        # only both selects
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2, self.cache.hits)
+
+    def test_joins_are_cached(self):
+        query = select("id").on_table("users").join(
+            "logins", "id", "user_id"
+        )
+        with patch.object(
+            SQLCompiler, "_generate_join_clause", autospec=True,
+            side_effect=SQLCompiler._generate_join_clause
+        ) as generate:
+            self.assertEqual(
+                query.sql(), query.sql(fragment_cache=self.cache)
+            )
+            query.select("score").sql(fragment_cache=self.cache)
+
+        self.assertEqual(2, generate.call_count)
+        self.assertEqual(1, self.cache.hits)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = FragmentCache(max_size=2)
+        cache.put("a", ["A"])
+        cache.put("b", ["B"])
+        self.assertEqual(("A",), cache.get("a"))
+        cache.put("c", ["C"])
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(("C",), cache.get("c"))
+        self.assertEqual(
+            (2, 1, 1), (cache.hits, cache.misses, cache.evictions)
+        )
+        self.assertEqual(2, len(cache))
+
+        cache.clear()
+        self.assertEqual((0, 0, 0, 0), (
+            len(cache), cache.hits, cache.misses, cache.evictions
+        ))
+
+    def pages(self, query):
+        return [
+            query.order_by(DESC(order)).limit(10).offset(offset)
+            for order in ("score", "id") for offset in range(0, 50, 10)
+        ]
+
+    def test_pages_only_compile_their_ordering(self):
+        query = select("score").on_table("users").join(
+            "logins", "id", "user_id"
+        ).where(
+            ("name__in", ["a", "b"]), ("logins.day__gte", "2026-01-01")
+        ).group_by("score").having(("score__gt", 5))
+
+        for page in self.pages(query):
+            self.assertEqual(
+                page.sql(), page.sql(fragment_cache=self.cache)
+            )
+            self.assertEqual(
+                page.sql(),
+                page.sql(max_bytes=1000, fragment_cache=self.cache)
+            )
+
+        with patch.object(
+            SQLCompiler, "_generate_where_tableclause", autospec=True,
+            side_effect=SQLCompiler._generate_where_tableclause
+        ) as generate:
+            for page in self.pages(query):
+                page.sql(fragment_cache=self.cache)
+        self.assertEqual(0, generate.call_count)
+
+        # the cache is keyed by identity, other clauses are compiled again
+        other = query.where(("name__eq", "c"))
+        self.assertEqual(
+            other.limit(10).sql(),
+            other.limit(10).sql(fragment_cache=self.cache)
+        )
+
+    def test_pages_bind_the_current_values(self):
+        names = ["a", "b"]
+        query = select(F("score") * 2).on_table("users").where(
+            ("name__in", names)
+        ).having(("score__gt", 5))
+        self.assertEqual(
+            (2, "a", "b", 5, 10),
+            query.limit(10).sql(fragment_cache=self.cache)[1]
+        )
+
+        names[0] = "c"
+        page = query.limit(10)
+        self.assertEqual(page.sql(), page.sql(fragment_cache=self.cache))
+        self.assertEqual((2, "c", "b", 5, 10), page.sql()[1])
+
+    def test_pages_with_subqueries_compile_as_uncached(self):
+        query = select("id").on_table("users").where(
+            ("id__in", select("user_id").on_table("logins")),
+            ("score__gt", 5),
+        )
+        for page in self.pages(query) * 2:
+            self.assertEqual(
+                page.sql(schema=self.registry),
+                page.sql(schema=self.registry, fragment_cache=self.cache)
+            )
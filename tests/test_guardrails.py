@@ -0,0 +1,136 @@
+from sqlquery.guardrails import QueryAnalyzer, QueryRejectedException
+from sqlquery.guardrails import Violation
+from sqlquery.queryapi import select, update, delete, InvalidQueryException
+from sqlquery.schema import Column, SchemaRegistry
+
+from tests import BaseTestCase
+
+
+class QueryAnalyzerTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryAnalyzerTestCase, self).setUp()
+        self.reported = []
+        self.registry = SchemaRegistry()
+        self.registry.add_table("events", [
+            Column("id", "BIGINT", indexed=True),
+            Column("kind", "VARCHAR(16)"),
+            Column("payload", "TEXT"),
+        ])
+        self.analyzer = QueryAnalyzer(
+            report=lambda violation, builder: self.reported.append(
+                (violation.rule, builder)
+            ),
+            schema=self.registry,
+            large_tables=("events",),
+            max_in_list=3,
+            max_offset=100
+        )
+
+    def _rules(self, builder):
+        return [violation.rule for violation in self.analyzer.analyze(builder)]
+
+    def test_mutation_without_where(self):
+        self.assertEqual(
+            [Violation(
+                "mutation_without_where",
+                "Mutation of <events> without a WHERE clause"
+            )],
+            self.analyzer.analyze(delete().on_table("events"))
+        )
+        self.assertEqual(
+            ["mutation_without_where"],
+            self._rules(update(kind="a").on_table("events"))
+        )
+        self.assertEqual(
+            [], self._rules(delete().on_table("events").where(("id__eq", 1)))
+        )
+
+    def test_unbounded_select(self):
+        self.assertEqual(
+            ["unbounded_select"],
+            self._rules(select("id").on_table("events"))
+        )
+        self.assertEqual(
+            [], self._rules(select("id").on_table("events").limit(10))
+        )
+        self.assertEqual([], self._rules(select("id").on_table("users")))
+
+    def test_large_in_list_and_offset(self):
+        self.assertEqual(
+            ["large_offset", "large_in_list"],
+            self._rules(
+                select("id").on_table("users").where(
+                    ("id__in", [1, 2, 3, 4])
+                ).offset(101).limit(10)
+            )
+        )
+        self.assertEqual(
+            [],
+            self._rules(
+                select("id").on_table("users").where(
+                    ("id__in", [1, 2, 3])
+                ).offset(100).limit(10)
+            )
+        )
+
+    def test_subquery_is_analyzed(self):
+        self.assertEqual(
+            ["unbounded_select"],
+            self._rules(
+                select("id").on_table("users").where(
+                    ("id__in", select("id").on_table("events"))
+                )
+            )
+        )
+
+    def test_unindexed_where(self):
+        self.assertEqual(
+            ["unindexed_where"],
+            self._rules(
+                select("id").on_table("events").where(
+                    ("kind__eq", "a"), ("events.payload__eq", "b")
+                ).limit(1)
+            )
+        )
+        self.assertEqual(
+            [],
+            self._rules(
+                select("id").on_table("events").where(
+                    ("kind__eq", "a"), ("id__gt", 10)
+                ).limit(1)
+            )
+        )
+
+    def test_check_reports_and_rejects(self):
+        analyzer = QueryAnalyzer(
+            reject=("mutation_without_where",),
+            report=self.analyzer.report,
+            large_tables=("events",)
+        )
+        query = select("id").on_table("events")
+
+        self.assertEqual(
+            ("SELECT `a`.`id` FROM `events` AS `a`", ()), analyzer.sql(query)
+        )
+        self.assertEqual([("unbounded_select", query)], self.reported)
+
+        with self.assertRaises(QueryRejectedException) as context:
+            analyzer.check(delete().on_table("events"))
+
+        self.assertEqual(
+            "Mutation of <events> without a WHERE clause",
+            str(context.exception)
+        )
+        self.assertEqual(
+            {"unbounded_select": 1, "mutation_without_where": 1},
+            dict(analyzer.counts)
+        )
+
+    def test_selected_rules(self):
+        analyzer = QueryAnalyzer(
+            rules=("large_offset",), large_tables=("events",)
+        )
+        self.assertEqual([], analyzer.analyze(delete().on_table("events")))
+
+        with self.assertRaises(InvalidQueryException):
+            QueryAnalyzer(reject=("no_such_rule",))
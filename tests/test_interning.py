@@ -0,0 +1,127 @@
+from mock import patch
+
+from sqlquery._querybuilder import SQLCompiler
+from sqlquery.interning import Interner
+from sqlquery.queryapi import select, AND, OR, COUNT, F, Param
+from sqlquery.sqlencoding import ANSIEncodings
+from sqlquery.templates import QueryTemplate
+
+from tests import BaseTestCase
+
+
+class InternerTestCase(BaseTestCase):
+    def setUp(self):
+        super(InternerTestCase, self).setUp()
+        self.interner = Interner()
+
+    def visible(self):
+        return self.interner.AND(
+            ("tenant_id__eq", 7),
+            OR(("deleted__is", None), ("deleted_at", "gt", F("created") + 1)),
+            ("kind__in", ["a", "b"]),
+        )
+
+    def test_identical_subtrees_are_shared(self):
+        interner = self.interner
+        visible = self.visible()
+
+        self.assertIs(visible, self.visible())
+        self.assertIs(
+            visible.conditions[1],
+            interner.intern(OR(
+                {"deleted__is": None}, ("deleted_at__gt", F("created") + 1)
+            ))
+        )
+        self.assertIs(
+            visible, interner.intern(AND(
+                ("tenant_id", "eq", 7),
+                interner.OR(
+                    ("deleted__is", None),
+                    ("deleted_at__gt", F("created") + 1)
+                ),
+                ("kind__in", ("a", "b")),
+            ))
+        )
+        self.assertIs(
+            interner.intern(COUNT("id")), interner.intern(COUNT("id"))
+        )
+        self.assertIs(
+            interner.intern(("x__eq", 1)), interner.intern(("x__eq", 1))
+        )
+
+        count = len(interner)
+        interner.AND(("tenant_id__eq", 7), ("kind__eq", "c"))
+        # only the new condition and its parent were added
+        self.assertEqual(count + 2, len(interner))
+
+        interner.clear()
+        self.assertEqual(0, len(interner))
+        self.assertIsNot(visible, self.visible())
+
+    def test_distinct_values(self):
+        interner = self.interner
+        self.assertIsNot(
+            interner.intern(("x__eq", 1)), interner.intern(("x__eq", True))
+        )
+        self.assertIsNot(
+            interner.intern(("x__eq", 1)), interner.intern(("x__eq", "1"))
+        )
+        self.assertIsNot(
+            interner.AND(("x__eq", 1)), interner.OR(("x__eq", 1))
+        )
+        self.assertIsNot(
+            interner.intern(("x__eq", Param("x"))),
+            interner.intern(("x__eq", Param("x")))
+        )
+
+    def test_compiled_fragments_are_reused(self):
+        visible = self.visible()
+        plain = select("id").on_table("posts").where(
+            AND(("tenant_id__eq", 7),
+                OR(("deleted__is", None),
+                   ("deleted_at", "gt", F("created") + 1)),
+                ("kind__in", ["a", "b"])),
+            ("author__eq", "bob")
+        )
+        interned = select("id").on_table("posts").where(
+            visible, ("author__eq", "bob")
+        )
+
+        generate = SQLCompiler._generate_logical_clause
+        with patch.object(
+            SQLCompiler, "_generate_logical_clause", autospec=True,
+            side_effect=generate
+        ) as generated:
+            self.assertEqual(plain.sql(), interned.sql())
+            calls = generated.call_count
+            interned.sql()
+            # only the top level condition, the shared subtree is reused
+            self.assertEqual(calls + 1, generated.call_count)
+
+            self.assertEqual(
+                plain.sql(encoder=ANSIEncodings()),
+                interned.sql(encoder=ANSIEncodings())
+            )
+            self.assertEqual(
+                plain.on_table("drafts").sql(),
+                interned.on_table("drafts").sql()
+            )
+
+        self.assertEqual(3, len(visible._fragments))
+
+    def test_subqueries_are_not_memoized(self):
+        condition = self.interner.AND(
+            ("id__in", select("post_id").on_table("flags"))
+        )
+        self.assertIsNone(condition._fragments)
+
+        query = select("id").on_table("posts").where(condition)
+        self.assertEqual(query.sql(), query.sql())
+
+    def test_templates(self):
+        query = select("id").on_table("posts").where(
+            self.interner.AND(("tenant_id__eq", Param("tenant")))
+        )
+        template = QueryTemplate.from_builder(query)
+        self.assertEqual((3,), template.bind(tenant=3)[1])
+        self.assertEqual(template, QueryTemplate.from_builder(query))
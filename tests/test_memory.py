@@ -0,0 +1,293 @@
+import sqlite3
+
+from mock import patch
+
+from sqlquery.memory import DuplicateKeyException, MemoryDatabase
+from sqlquery.queryapi import select, insert, insert_ignore, replace, update
+from sqlquery.queryapi import delete, union, AND, OR, ASC, DESC, F, COUNT
+from sqlquery.queryapi import MAX, SUM, INSERTED, ROW_NUMBER
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+USERS = [
+    {"id": 1, "name": "bob", "team_id": 1, "age": 30},
+    {"id": 2, "name": "alice", "team_id": 2, "age": None},
+    {"id": 3, "name": "carol", "team_id": 1, "age": 17},
+    {"id": 4, "name": "dave", "team_id": None, "age": 45},
+    {"id": 5, "name": "erin", "team_id": 2, "age": 30},
+]
+
+TEAMS = [
+    {"id": 1, "title": "red"},
+    {"id": 2, "title": "blue"},
+]
+
+
+def sort_key(row):
+    return [(value is not None, value) for value in row]
+
+
+def selecting(query, *fields):
+    # the test case sorts selected fields, which expressions can't be
+    return query.copy(query._query_data._replace(select=fields))
+
+
+class MemoryDatabaseTestCase(BaseTestCase):
+    def setUp(self):
+        super(MemoryDatabaseTestCase, self).setUp()
+        self.database = MemoryDatabase()
+        self.database.create_table(
+            "users", USERS, primary_key="id", indexes=["name", "team_id"]
+        )
+        self.database.create_table("teams", TEAMS, primary_key="id")
+
+    def assertSameAsSQLite(self, query, ordered=False):
+        connection = sqlite3.connect(":memory:")
+        # strings compare case sensitively in memory
+        connection.execute("PRAGMA case_sensitive_like = ON")
+        connection.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, "
+            "team_id INTEGER, age INTEGER)"
+        )
+        connection.execute("CREATE TABLE teams (id INTEGER, title TEXT)")
+        connection.executemany(
+            "INSERT INTO users VALUES (:id, :name, :team_id, :age)", USERS
+        )
+        connection.executemany(
+            "INSERT INTO teams VALUES (:id, :title)", TEAMS
+        )
+
+        expected = list(
+            connection.execute(*query.sql(encoder=SQLiteEncodings()))
+        )
+        rows = self.database.execute(query)
+        if not ordered:
+            expected, rows = sorted(expected, key=sort_key), sorted(
+                rows, key=sort_key
+            )
+        self.assertEqual(expected, rows)
+
+    def test_select(self):
+        users = select("id", "name").on_table("users")
+        self.assertSameAsSQLite(users)
+        self.assertSameAsSQLite(users.where(("name__eq", "bob")))
+        self.assertSameAsSQLite(users.where(
+            ("team_id__in", [1, 2]), OR(("age__gte", 30), ("age__is", None))
+        ))
+        self.assertSameAsSQLite(users.where(("users.age__lt", F("id") * 10)))
+        self.assertSameAsSQLite(selecting(
+            select().on_table("users").where(("name__like", "%a%")),
+            F("age") + 1, "name"
+        ))
+
+    def test_order_limit_offset(self):
+        users = select("id").on_table("users")
+        self.assertSameAsSQLite(users.order_by("age", "id"), ordered=True)
+        self.assertSameAsSQLite(
+            users.order_by(DESC("age"), ASC("name")), ordered=True
+        )
+        self.assertSameAsSQLite(users.order_by(DESC("id")).limit(2),
+                                ordered=True)
+        self.assertEqual([(4,), (3,)], self.database.execute(
+            users.order_by(DESC("id")).limit(2).offset(1)
+        ))
+        self.assertEqual([(4,), (5,)], self.database.execute(
+            users.order_by("id").offset(3)
+        ))
+        self.assertSameAsSQLite(
+            users.order_by(F("age") * -1, "id"), ordered=True
+        )
+
+    def test_group_by_having(self):
+        users = select().on_table("users")
+        self.assertSameAsSQLite(selecting(
+            users.group_by("team_id"),
+            "team_id", COUNT(), MAX("age"), SUM("age")
+        ))
+        self.assertSameAsSQLite(selecting(
+            users.group_by("team_id").having((COUNT(), "gt", 1))
+            .order_by(DESC(COUNT("age")), "team_id"),
+            "team_id", COUNT("age")
+        ), ordered=True)
+        self.assertSameAsSQLite(selecting(users, COUNT(), MAX("age")))
+        self.assertSameAsSQLite(selecting(
+            users.where(("id__gt", 100)), COUNT(), SUM("age")
+        ))
+        self.assertSameAsSQLite(selecting(
+            users.group_by("age"), "age", SUM("id") + 1
+        ))
+
+    def test_join(self):
+        self.assertSameAsSQLite(
+            select("name", "teams.title").on_table("users")
+            .join("teams", "team_id", "id")
+            .where(("teams.title__eq", "red"))
+        )
+        self.assertSameAsSQLite(selecting(
+            select().on_table("users").join("teams", "team_id", "id")
+            .group_by("teams.title"),
+            "teams.title", COUNT()
+        ))
+        # with an index on the joined column
+        self.assertSameAsSQLite(
+            select("teams.title", "users.name").on_table("teams")
+            .join("users", "id", "team_id")
+        )
+
+    def test_indexes(self):
+        table = self.database.tables["users"]
+        lookups = []
+        lookup = table.lookup
+        table.lookup = lambda column, values: lookups.append(
+            (column, list(values))
+        ) or lookup(column, values)
+
+        self.assertEqual([(1,), (3,)], self.database.execute(
+            select("id").on_table("users").where(
+                ("team_id__eq", 1), ("age__gt", 1)
+            )
+        ))
+        self.assertEqual([(2,)], self.database.execute(
+            select("id").on_table("users").where(
+                ("users.name__in", ["alice", "zed"])
+            )
+        ))
+        self.assertEqual(
+            [("team_id", [1]), ("name", ["alice", "zed"])], lookups
+        )
+
+        self.database.execute(
+            update(team_id=3).on_table("users").where(("id__eq", 1))
+        )
+        self.assertEqual([], table.lookup("team_id", [None]))
+        self.assertEqual([0], table.lookup("team_id", [3]))
+        self.assertEqual([2], table.lookup("team_id", [1]))
+
+    def test_insert(self):
+        database = self.database
+        self.assertEqual(2, database.execute(insert(
+            {"id": 6, "name": "frank"}, {"id": 7, "name": "gina", "age": 20}
+        ).on_table("users")))
+        self.assertEqual(
+            [(None, 6, None), (20, 7, None)],
+            database.execute(
+                select("age", "id", "team_id").on_table("users")
+                .where(("id__gt", 5))
+            )
+        )
+
+        with self.assertRaises(DuplicateKeyException):
+            database.execute(insert({"id": 1}).on_table("users"))
+        self.assertEqual(0, database.execute(
+            insert_ignore({"id": 1, "name": "x"}).on_table("users")
+        ))
+        database.execute(replace({"id": 2, "name": "al"}).on_table("users"))
+        self.assertEqual(
+            [(None, 2, "al")],
+            database.execute(
+                select("age", "id", "name").on_table("users")
+                .where(("name__eq", "al"))
+            )
+        )
+
+    def test_upsert(self):
+        database = MemoryDatabase()
+        database.create_table("pages", primary_key="id")
+        query = insert(
+            {"id": 1, "hits": 1, "title": "a"},
+            {"id": 1, "hits": 2, "title": None},
+        ).on_table("pages")
+
+        database.execute(query.upsert(
+            "id", hits="add", title="coalesce"
+        ))
+        self.assertEqual(
+            [(3, 1, "a")],
+            database.execute(select("hits", "id", "title").on_table("pages"))
+        )
+        database.execute(query.upsert(
+            "id", hits=F("hits") + INSERTED("hits") * 10
+        ))
+        self.assertEqual(
+            [(33,)], database.execute(select("hits").on_table("pages"))
+        )
+        database.execute(
+            insert({"id": 1, "hits": 0}).on_table("pages")
+            .on_duplicate_key_update()
+        )
+        self.assertEqual(
+            [(0,)], database.execute(select("hits").on_table("pages"))
+        )
+
+    def test_update_and_delete(self):
+        database = self.database
+        self.assertEqual(2, database.execute(
+            update(age=F("age") + 1).on_table("users")
+            .where(("team_id__eq", 1))
+        ))
+        self.assertEqual(
+            [(31, 1), (18, 3)],
+            database.execute(
+                select("age", "id").on_table("users")
+                .where(("team_id__eq", 1))
+            )
+        )
+        self.assertEqual(2, database.execute(
+            update(age=0).on_table("users").bulk_update(
+                "id", {1: {"age": 5}, 2: {"age": 6, "name": "al"}}
+            )
+        ))
+        self.assertEqual(
+            [(5, 1), (6, 2)],
+            database.execute(
+                select("age", "id").on_table("users")
+                .where(("id__in", [1, 2]))
+            )
+        )
+        with self.assertRaises(DuplicateKeyException):
+            database.execute(
+                update(id=2).on_table("users").where(("id__eq", 1))
+            )
+
+        self.assertEqual(1, database.execute(
+            delete().on_table("users").order_by(DESC("age")).limit(1)
+        ))
+        self.assertEqual(4, database.execute(
+            delete().on_table("users").where(("team_id__in", [1, 2]))
+        ))
+        self.assertEqual(
+            [], database.execute(select("id").on_table("users"))
+        )
+
+    def test_unsupported(self):
+        for query in (
+            union(select("id").on_table("users"),
+                  select("id").on_table("teams")),
+            select("id").on_table("users").where(
+                ("id__in", select("id").on_table("teams"))
+            ),
+            select(ROW_NUMBER().over(order_by="id")).on_table("users"),
+            select("id").on_table("missing"),
+            select("missing").on_table("users"),
+            select("id").on_table("users").where(
+                AND(("missing__eq", 1))
+            ),
+            select("id").on_table("users").join("teams", "missing", "id"),
+            select("id").on_table("users").join("teams", "team_id", "nope"),
+            select("id").on_table("users").order_by("missing"),
+            update(age=0).on_table("users").bulk_update(
+                "missing", {1: {"age": 5}}
+            ),
+        ):
+            with self.assertRaises(InvalidQueryException):
+                self.database.execute(query)
+
+    def test_engine_errors_are_not_hidden(self):
+        with patch.object(
+            MemoryDatabase, "_select", autospec=True, side_effect=KeyError("x")
+        ):
+            with self.assertRaises(KeyError):
+                self.database.execute(select("id").on_table("users"))
@@ -0,0 +1,129 @@
+import functools
+import itertools
+import sqlite3
+
+from sqlquery.profiling import QueryProfiler, cursor_executor
+from sqlquery.profiling import query_fingerprint, sqlite_full_scan
+from sqlquery.queryapi import select, insert
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class QueryFingerprintTestCase(BaseTestCase):
+    def test_values_are_not_part_of_the_shape(self):
+        self.assertEqual(
+            query_fingerprint(
+                select("id").on_table("t").where(("id__in", [1, 2])).sql()[0]
+            ),
+            query_fingerprint(
+                select("id").on_table("t").where(
+                    ("id__in", [3, 4, 5, 6])
+                ).sql()[0]
+            )
+        )
+        self.assertEqual(
+            query_fingerprint(
+                select("id").on_table("t").where(("id__in", [1])).sql()[0]
+            ),
+            query_fingerprint(
+                select("id").on_table("t").where(("id__in", [1, 2])).sql()[0]
+            )
+        )
+        self.assertEqual(
+            query_fingerprint(insert({"a": 1}).on_table("t").sql()[0]),
+            query_fingerprint(
+                insert({"a": 1}, {"a": 2}).on_table("t").sql()[0]
+            )
+        )
+        self.assertEqual(
+            query_fingerprint(insert({"a": 1, "b": 2}).on_table("t").sql()[0]),
+            query_fingerprint(insert(
+                {"a": 1, "b": 2}, {"a": 3, "b": 4}
+            ).on_table("t").sql()[0])
+        )
+
+    def test_different_shapes(self):
+        self.assertNotEqual(
+            query_fingerprint(
+                select("id").on_table("t").where(("id__eq", 1)).sql()[0]
+            ),
+            query_fingerprint(
+                select("id").on_table("t").where(("id__gt", 1)).sql()[0]
+            )
+        )
+
+
+class QueryProfilerTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryProfilerTestCase, self).setUp()
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT)"
+        )
+        self.connection.executemany(
+            "INSERT INTO users VALUES (?, ?)", [(1, "bob"), (2, "alice")]
+        )
+        self.executed = []
+        cursor_execute = cursor_executor(self.connection.cursor())
+
+        def executor(query, args):
+            self.executed.append(query)
+            return cursor_execute(query, args)
+
+        self.profiler = QueryProfiler(
+            executor,
+            encoder=SQLiteEncodings(),
+            full_scan=sqlite_full_scan,
+            clock=functools.partial(next, itertools.count())
+        )
+
+    def tearDown(self):
+        self.connection.close()
+        super(QueryProfilerTestCase, self).tearDown()
+
+    def test_explain_once_per_shape(self):
+        for name in ("bob", "alice"):
+            self.profiler.execute(
+                select("id").on_table("users").where(("name__eq", name))
+            )
+        rows = self.profiler.execute(
+            select("name").on_table("users").where(("id__eq", 2))
+        )
+
+        self.assertEqual([("alice",)], rows)
+        self.assertEqual(
+            [
+                'EXPLAIN QUERY PLAN SELECT "a"."id" FROM "users" AS "a" '
+                'WHERE ("a"."name" = ?)',
+                'SELECT "a"."id" FROM "users" AS "a" WHERE ("a"."name" = ?)',
+                'SELECT "a"."id" FROM "users" AS "a" WHERE ("a"."name" = ?)',
+                'EXPLAIN QUERY PLAN SELECT "a"."name" FROM "users" AS "a" '
+                'WHERE ("a"."id" = ?)',
+                'SELECT "a"."name" FROM "users" AS "a" WHERE ("a"."id" = ?)',
+            ],
+            self.executed
+        )
+
+        profiles = sorted(
+            self.profiler.profiles.values(), key=lambda profile: profile.sql
+        )
+        self.assertEqual(
+            [(True, 2), (False, 1)],
+            [(profile.full_scan, profile.executions) for profile in profiles]
+        )
+        # each call of the fake clock advances it by one
+        self.assertEqual(
+            (1.0, 1.0),
+            (profiles[0].mean_compile_time, profiles[0].mean_execute_time)
+        )
+        self.assertTrue(profiles[0].plan)
+
+    def test_unsampled_shapes_are_only_executed(self):
+        self.profiler.sample_rate = 0
+        self.profiler.execute(select("id").on_table("users"))
+
+        self.assertEqual({}, self.profiler.profiles)
+        self.assertEqual(
+            ['SELECT "a"."id" FROM "users" AS "a"'], self.executed
+        )
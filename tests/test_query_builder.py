@@ -1,7 +1,16 @@
+from mock import patch
+
 from sqlquery import queryapi
-from sqlquery.queryapi import COUNT, AND, OR, XOR, ASC, DESC
-from sqlquery.queryapi import InvalidQueryException
-from sqlquery.sqlencoding import BasicEncodings
+from sqlquery._querybuilder import SQLCompiler, estimate_value_size
+import sqlite3
+
+from sqlquery.queryapi import COUNT, SUM, AND, OR, XOR, ASC, DESC, F
+from sqlquery.queryapi import ROW_NUMBER, RANK, INSERTED
+from sqlquery.queryapi import InvalidQueryException, QueryTooLargeException
+from sqlquery.queryapi import SizeEstimate
+from sqlquery.sqlencoding import ANSIEncodings, BasicEncodings
+from sqlquery.sqlencoding import SQLiteEncodings
+from sqlquery.schema import SchemaRegistry, Column, UnknownColumnException
 
 from tests import BaseTestCase
 
@@ -118,6 +127,7 @@ class SQLCompilerWhereTestCase(BaseTestCase):
             'gte': ">=",
             'gt': ">",
             'lt': "<",
+            'lte': "<=",
             'is': "IS",
             'isnot': "IS NOT",
             'like': "LIKE",
@@ -173,6 +183,26 @@ class SQLCompilerWhereTestCase(BaseTestCase):
         )
         self.assertEqual(args, [4])
 
+    def test__generate_where_repeated_query_compiled_once(self):
+        banned = self.builder.select("id").on_table("banned").where(
+            ("reason__eq", "spam")
+        )
+        compiler = self.basic_select.where(
+            OR(("test1__in", banned), ("test2__in", banned))
+        ).compiler()
+
+        sql, args = compiler._generate_where()
+
+        self.assertEqual(
+            "WHERE ("
+            "(`a`.`test1` IN (SELECT `b`.`id` FROM `banned` AS `b` "
+            "WHERE (`b`.`reason` = %s))) OR "
+            "(`a`.`test2` IN (SELECT `b`.`id` FROM `banned` AS `b` "
+            "WHERE (`b`.`reason` = %s))))",
+            serialize_query_tokens(sql)
+        )
+        self.assertEqual(args, ["spam", "spam"])
+
     def test__generate_is_null(self):
         for (op, sql_op) in {"is": "IS NULL", "isnot": "IS NOT NULL"}.items():
             compiler = self.basic_select.where(
@@ -337,7 +367,7 @@ class SQLCompilerInsertTestCase(BaseTestCase):
 
             self.assertEqual(
                 query + " INTO `table` (`test`, `test2`) VALUES "
-                "(%s, %s) (%s, %s) (%s, %s)",
+                "(%s, %s), (%s, %s), (%s, %s)",
                 serialize_query_tokens(sql)
             )
             self.assertEqual(
@@ -356,7 +386,7 @@ class SQLCompilerInsertTestCase(BaseTestCase):
 
             self.assertEqual(
                 query + " INTO `table` (`test`, `test2`) VALUES "
-                "(%s, %s) (%s, %s)",
+                "(%s, %s), (%s, %s)",
                 serialize_query_tokens(sql)
             )
             self.assertEqual(
@@ -399,6 +429,486 @@ class SQLCompilerUpdateTestCase(BaseTestCase):
         )
 
 
+class SQLCompilerBulkUpdateTestCase(BaseTestCase):
+    def setUp(self):
+        super(SQLCompilerBulkUpdateTestCase, self).setUp()
+        self.updates = [
+            (1, dict(name="x", score=10)),
+            (2, dict(score=20)),
+            (3, dict(name="z", score=30)),
+        ]
+
+    def test__generate_bulk_update_case(self):
+        sql, args = self.builder.bulk_update(
+            "id", self.updates
+        ).on_table("table").where(("active__eq", 1)).sql()
+
+        self.assertEqual(
+            "UPDATE `table` AS `a` SET "
+            "`a`.`name` = CASE `a`.`id` WHEN %s THEN %s WHEN %s THEN %s "
+            "ELSE `a`.`name` END, "
+            "`a`.`score` = CASE `a`.`id` WHEN %s THEN %s WHEN %s THEN %s "
+            "WHEN %s THEN %s ELSE `a`.`score` END "
+            "WHERE (`a`.`active` = %s) AND (`a`.`id` IN (%s,%s,%s))",
+            sql
+        )
+        self.assertEqual(
+            (1, "x", 3, "z", 1, 10, 2, 20, 3, 30, 1, 1, 2, 3),
+            args
+        )
+
+    def test__generate_bulk_update_upsert(self):
+        sql, args = self.builder.bulk_update(
+            "id", dict([(1, dict(score=10)), (2, dict(score=20))]),
+            strategy="upsert"
+        ).on_table("table").sql()
+
+        self.assertEqual(
+            "INSERT INTO `table` (`id`, `score`) VALUES (%s, %s), (%s, %s) "
+            "ON DUPLICATE KEY UPDATE `score` = VALUES(`score`)",
+            sql
+        )
+        self.assertEqual((1, 10, 2, 20), args)
+
+    def test_chunked_bulk_update(self):
+        chunks = self.builder.bulk_update(
+            "id", self.updates
+        ).on_table("table").chunked(max_args=8)
+
+        self.assertEqual(
+            [(1, "x", 1, 10, 2, 20, 1, 2), (3, "z", 3, 30, 3)],
+            [chunk.sql()[1] for chunk in chunks]
+        )
+
+    def test_chunked_insert(self):
+        chunks = self.builder.insert(
+            *[dict(id=index) for index in range(5)]
+        ).on_table("table").chunked(max_rows=2)
+
+        self.assertEqual(
+            [(0, 1), (2, 3), (4,)],
+            [chunk.sql()[1] for chunk in chunks]
+        )
+
+    def test_chunked_other_query(self):
+        query = self.builder.select("id").on_table("table")
+
+        self.assertEqual([query], query.chunked(max_rows=1))
+
+
+class SQLCompilerExpressionTestCase(BaseTestCase):
+    def test__generate_update_expression(self):
+        sql, args = self.builder.update(
+            hits=F("hits") + 1
+        ).on_table("pages").where(("id__eq", 3)).sql()
+
+        self.assertEqual(
+            "UPDATE `pages` AS `a` SET `a`.`hits` = `a`.`hits` + %s "
+            "WHERE (`a`.`id` = %s)",
+            sql
+        )
+        self.assertEqual((1, 3), args)
+
+    def test__generate_select_nested_expression(self):
+        sql, args = self.builder.select(
+            SUM(F("price") * (1 - F("discount") / 100))
+        ).on_table("orders").sql()
+
+        self.assertEqual(
+            "SELECT SUM(`a`.`price` * (%s - (`a`.`discount` / %s))) "
+            "FROM `orders` AS `a`",
+            sql
+        )
+        self.assertEqual((1, 100), args)
+
+    def test__generate_where_expressions(self):
+        sql, args = self.builder.select("id").on_table("t").where(
+            (F("a") // 2 + F("t2.b") % 3, "gt", 5),
+            ("c__lte", F("d") - 1)
+        ).join("t2", "id").sql()
+
+        self.assertEqual(
+            "SELECT `a`.`id` FROM `t` AS `a` "
+            "INNER JOIN `t2` AS `b` ON `a`.`id` = `b`.`id` "
+            "WHERE ((`a`.`a` DIV %s) + (`b`.`b` %% %s) > %s) "
+            "AND (`a`.`c` <= `a`.`d` - %s)",
+            sql
+        )
+        self.assertEqual((2, 3, 5, 1), args)
+
+    def test_modulo_is_escaped_for_format_paramstyle(self):
+        sql, args = self.builder.update(
+            x=F("x") % 2
+        ).on_table("t").sql()
+
+        self.assertEqual(
+            "UPDATE `t` AS `a` SET `a`.`x` = `a`.`x` %% %s", sql
+        )
+        # as formatted by MySQLdb, pymysql and psycopg2
+        self.assertEqual(
+            "UPDATE `t` AS `a` SET `a`.`x` = `a`.`x` % 2", sql % args
+        )
+
+    def test_modulo_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE t (x INTEGER)")
+        connection.execute("INSERT INTO t VALUES (7)")
+
+        connection.execute(*self.builder.update(
+            x=F("x") % 4
+        ).on_table("t").sql(encoder=SQLiteEncodings()))
+
+        self.assertEqual(
+            [(3,)], connection.execute("SELECT x FROM t").fetchall()
+        )
+        connection.close()
+
+    def test_update_expression_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE pages (id INTEGER, hits INTEGER)")
+        connection.execute("INSERT INTO pages VALUES (1, 41)")
+
+        connection.execute(*self.builder.update(
+            hits=F("hits") + 1
+        ).on_table("pages").where(("id__eq", 1)).sql(
+            encoder=SQLiteEncodings()
+        ))
+
+        self.assertEqual(
+            [(1, 42)], connection.execute("SELECT * FROM pages").fetchall()
+        )
+        connection.close()
+
+
+class SQLCompilerAggregationTestCase(BaseTestCase):
+    def test__generate_group_by_expression(self):
+        sql, args = self.builder.select("k").on_table("t").group_by(
+            F("created") // 3600
+        ).sql()
+
+        self.assertEqual(
+            "SELECT `a`.`k` FROM `t` AS `a` GROUP BY `a`.`created` DIV %s",
+            sql
+        )
+        self.assertEqual((3600,), args)
+
+    def test__generate_group_by_with_rollup(self):
+        query = self.builder.select("k").on_table("t").group_by(
+            "k", "j"
+        ).with_rollup()
+
+        self.assertEqual(
+            "SELECT `a`.`k` FROM `t` AS `a` GROUP BY `a`.`j`, `a`.`k` "
+            "WITH ROLLUP",
+            query.sql()[0]
+        )
+        self.assertEqual(
+            'SELECT "a"."k" FROM "t" AS "a" GROUP BY ROLLUP ("a"."j", "a"."k")',
+            query.sql(encoder=ANSIEncodings())[0]
+        )
+
+    def test__generate_having_aggregate(self):
+        sql, args = self.builder.select("k").on_table("t").group_by(
+            "k"
+        ).having(
+            (COUNT(), "gt", 5), (SUM("a") / COUNT(), "lte", 2)
+        ).order_by(DESC(COUNT())).sql()
+
+        self.assertEqual(
+            "SELECT `a`.`k` FROM `t` AS `a` GROUP BY `a`.`k` "
+            "HAVING (COUNT(1) > %s) AND (SUM(`a`.`a`) / COUNT(1) <= %s) "
+            "ORDER BY COUNT(1) DESC",
+            sql
+        )
+        self.assertEqual((5, 2), args)
+
+    def test__generate_window_function(self):
+        sql, args = self.builder.select(
+            ROW_NUMBER().over(
+                partition_by="user_id", order_by=(DESC("created"), "id")
+            )
+        ).on_table("posts").sql()
+
+        self.assertEqual(
+            "SELECT ROW_NUMBER() OVER (PARTITION BY `a`.`user_id` "
+            "ORDER BY `a`.`created` DESC, `a`.`id`) FROM `posts` AS `a`",
+            sql
+        )
+        self.assertEqual((), args)
+
+    def test__generate_aggregate_window_function(self):
+        sql, args = self.builder.select(
+            SUM("amount").over(partition_by=(F("created") // 86400,)) * 2
+        ).on_table("payments").sql()
+
+        self.assertEqual(
+            "SELECT SUM(`a`.`amount`) OVER (PARTITION BY `a`.`created` DIV "
+            "%s) * %s FROM `payments` AS `a`",
+            sql
+        )
+        self.assertEqual((86400, 2), args)
+
+    def test_window_function_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE scores (player TEXT, score INTEGER)")
+        connection.executemany("INSERT INTO scores VALUES (?, ?)", [
+            ("a", 3), ("a", 7), ("b", 5), ("b", 5), ("b", 1),
+        ])
+
+        rows = connection.execute(*self.builder.select(
+            RANK().over(partition_by="player", order_by=DESC("score"))
+        ).on_table("scores").order_by("player", "score").sql(
+            encoder=SQLiteEncodings()
+        )).fetchall()
+
+        self.assertEqual([(2,), (1,), (3,), (1,), (1,)], rows)
+        connection.close()
+
+    def test_having_aggregate_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE scores (player TEXT, score INTEGER)")
+        connection.executemany("INSERT INTO scores VALUES (?, ?)", [
+            ("a", 3), ("a", 7), ("b", 5), ("b", 5), ("b", 1),
+        ])
+
+        rows = connection.execute(*self.builder.select(
+            "player"
+        ).on_table("scores").group_by("player").having(
+            (COUNT(), "gt", 2)
+        ).sql(encoder=SQLiteEncodings())).fetchall()
+
+        self.assertEqual([("b",)], rows)
+        connection.close()
+
+
+class SQLCompilerSizeLimitTestCase(BaseTestCase):
+    def _rows(self, count):
+        return [{"id": index, "name": "x" * 10} for index in range(count)]
+
+    def test_measure(self):
+        estimated, actual = self.builder.insert(
+            *self._rows(2)
+        ).on_table("t").measure()
+
+        self.assertEqual(
+            SizeEstimate(sql_bytes=56, args=4, arg_bytes=26), actual
+        )
+        self.assertEqual((4, 26), (estimated.args, estimated.arg_bytes))
+        self.assertLessEqual(estimated.sql_bytes, actual.sql_bytes)
+        self.assertEqual(82, actual.total_bytes)
+
+    def test_insert_fails_at_the_first_row_over_the_limit(self):
+        with self.assertRaises(QueryTooLargeException) as context:
+            self.builder.insert(*self._rows(100)).on_table("t").sql(
+                max_args=9
+            )
+
+        self.assertEqual(4, context.exception.rows)
+        self.assertEqual(10, context.exception.estimate.args)
+        self.assertEqual(
+            "Query with 10 arguments exceeds 9 arguments",
+            str(context.exception)
+        )
+
+    def test_select_over_the_limit(self):
+        with self.assertRaises(QueryTooLargeException) as context:
+            self.builder.select("id").on_table("t").where(
+                ("id__in", list(range(10)))
+            ).sql(max_bytes=50)
+
+        self.assertIsNone(context.exception.rows)
+
+    def test_within_the_limits(self):
+        query = self.builder.insert(*self._rows(2)).on_table("t")
+        self.assertEqual(query.sql(), query.sql(max_bytes=82, max_args=4))
+
+    def test_split_sql_insert(self):
+        statements = self.builder.insert(
+            *self._rows(10)
+        ).on_table("t").split_sql(max_args=6)
+
+        self.assertEqual([6, 6, 6, 2], [len(args) for _, args in statements])
+        self.assertEqual(
+            "INSERT INTO `t` (`id`, `name`) VALUES (%s, %s), (%s, %s), "
+            "(%s, %s)",
+            statements[0][0]
+        )
+        self.assertEqual(
+            list(range(10)),
+            [args[index] for _, args in statements
+             for index in range(0, len(args), 2)]
+        )
+
+    def test_split_sql_bulk_update(self):
+        statements = self.builder.update(name="").on_table("t").bulk_update(
+            "id", [(index, {"name": "x"}) for index in range(6)]
+        ).split_sql(max_args=8)
+
+        self.assertEqual([6, 6, 6], [len(args) for _, args in statements])
+
+    def test_split_sql_fills_statements_with_rows_of_any_width(self):
+        rows = [
+            {"id": index, "name": "x" * width}
+            for index, width in enumerate([60, 1, 1, 1, 1, 1, 1, 1, 1, 60])
+        ]
+        query = self.builder.insert(*rows).on_table("t")
+        with patch.object(
+            queryapi.QueryBuilder, "measure", autospec=True,
+            side_effect=queryapi.QueryBuilder.measure
+        ) as measure:
+            statements = query.split_sql(max_bytes=160)
+
+        # rows aren't compiled to be measured, only a statement of one row
+        # and one of two
+        self.assertEqual(2, measure.call_count)
+
+        self.assertEqual(
+            [4, 5, 1], [len(args) // 2 for _, args in statements]
+        )
+
+        self.assertEqual(
+            list(range(10)),
+            [args[index] for _, args in statements
+             for index in range(0, len(args), 2)]
+        )
+        chunks = [
+            [rows[args[index]] for index in range(0, len(args), 2)]
+            for _, args in statements
+        ]
+        for chunk, next_chunk in zip(chunks, chunks[1:] + [None]):
+            size = query.insert(*chunk).measure()[1]
+            self.assertLessEqual(size.total_bytes, 160)
+            if next_chunk:
+                # the next row didn't fit
+                self.assertGreater(
+                    query.insert(*chunk + next_chunk[:1]).measure()[1]
+                    .total_bytes,
+                    160
+                )
+
+    def test_split_sql_bulk_update_of_different_columns(self):
+        query = self.builder.update(name="").on_table("t").bulk_update(
+            "id", [
+                (index, {"name": "x" * 20} if index % 3 else {
+                    "name": "y", "score": F("score") + index
+                })
+                for index in range(30)
+            ]
+        )
+        statements = query.split_sql(max_bytes=400)
+
+        self.assertGreater(len(statements), 1)
+        for sql, args in statements:
+            self.assertLessEqual(
+                len(sql) + sum(map(estimate_value_size, args)), 400
+            )
+        # each row is updated once, its key is in the IN list
+        self.assertEqual(30, sum(
+            sql[sql.index(" IN "):].count("%s") for sql, _ in statements
+        ))
+
+    def test_split_sql_row_too_large(self):
+        with self.assertRaises(QueryTooLargeException):
+            self.builder.insert(*self._rows(2)).on_table("t").split_sql(
+                max_bytes=20
+            )
+
+
+class SQLCompilerUpsertTestCase(BaseTestCase):
+    def setUp(self):
+        super(SQLCompilerUpsertTestCase, self).setUp()
+        self.query = self.builder.insert(
+            {"id": 1, "hits": 3, "best": 7, "name": None}
+        ).on_table("pages")
+
+    def test_on_duplicate_key_update_binds_values(self):
+        sql, args = self.query.on_duplicate_key_update(
+            hits=0, best=F("best") + 1
+        ).sql()
+
+        self.assertEqual(
+            "INSERT INTO `pages` (`best`, `hits`, `id`, `name`) "
+            "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+            "`best` = `pages`.`best` + %s, `hits` = %s",
+            sql
+        )
+        self.assertEqual((7, 3, 1, None, 1, 0), args)
+
+    def test_upsert_replaces_all_but_key(self):
+        self.assertEqual(
+            "INSERT INTO `pages` (`best`, `hits`, `id`, `name`) "
+            "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+            "`best` = VALUES(`best`), `hits` = VALUES(`hits`), "
+            "`name` = VALUES(`name`)",
+            self.query.upsert("id").sql()[0]
+        )
+
+    def test_upsert_merge_strategies(self):
+        query = self.query.upsert(
+            "id", hits="add", best="max", name="coalesce"
+        )
+
+        self.assertEqual(
+            "INSERT INTO `pages` (`best`, `hits`, `id`, `name`) "
+            "VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+            "`best` = GREATEST(`pages`.`best`, VALUES(`best`)), "
+            "`hits` = `pages`.`hits` + VALUES(`hits`), "
+            "`name` = COALESCE(VALUES(`name`), `pages`.`name`)",
+            query.sql()[0]
+        )
+        self.assertEqual(
+            'INSERT INTO "pages" AS "a" ("best", "hits", "id", "name") '
+            'VALUES (%s, %s, %s, %s) ON CONFLICT ("id") DO UPDATE SET '
+            '"best" = GREATEST("a"."best", EXCLUDED."best"), '
+            '"hits" = "a"."hits" + EXCLUDED."hits", '
+            '"name" = COALESCE(EXCLUDED."name", "a"."name")',
+            query.sql(encoder=ANSIEncodings())[0]
+        )
+
+    def test_upsert_expression(self):
+        sql, args = self.query.upsert(
+            ("id", "name"), hits=F("hits") * 2 + INSERTED("hits"), best="min"
+        ).sql(encoder=ANSIEncodings())
+
+        self.assertEqual(
+            'INSERT INTO "pages" AS "a" ("best", "hits", "id", "name") '
+            'VALUES (%s, %s, %s, %s) ON CONFLICT ("id", "name") DO UPDATE SET '
+            '"best" = LEAST("a"."best", EXCLUDED."best"), '
+            '"hits" = ("a"."hits" * %s) + EXCLUDED."hits"',
+            sql
+        )
+        self.assertEqual((7, 3, 1, None, 2), args)
+
+    def test_upsert_invalid(self):
+        with self.assertRaises(InvalidQueryException):
+            self.query.upsert("id", hits="sum")
+        with self.assertRaises(InvalidQueryException):
+            self.query.on_duplicate_key_update().sql(encoder=ANSIEncodings())
+
+    def test_upsert_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        connection.execute(
+            "CREATE TABLE pages (id INTEGER PRIMARY KEY, hits INTEGER, "
+            "best INTEGER, name TEXT)"
+        )
+        connection.execute("INSERT INTO pages VALUES (1, 10, 9, 'home')")
+
+        connection.execute(*self.query.upsert(
+            "id", hits="add", best="max", name="coalesce"
+        ).sql(encoder=SQLiteEncodings()))
+        connection.execute(*self.builder.insert(
+            {"id": 2, "hits": 1, "best": 1, "name": "new"}
+        ).on_table("pages").upsert("id", hits="add").sql(
+            encoder=SQLiteEncodings()
+        ))
+
+        self.assertEqual(
+            [(1, 13, 9, "home"), (2, 1, 1, "new")],
+            connection.execute("SELECT * FROM pages ORDER BY id").fetchall()
+        )
+        connection.close()
+
+
 class SQLCompilerOffsetTestCase(BaseTestCase):
     def test__generate_offset(self):
         compiler = self.builder.select(
@@ -566,6 +1076,194 @@ class SQLCompilerCompositeTestCase(BaseTestCase):
         )
 
 
+class SQLCompilerCTETestCase(BaseTestCase):
+    def setUp(self):
+        super(SQLCompilerCTETestCase, self).setUp()
+        self.recent = self.builder.select("user_id").on_table(
+            "logins"
+        ).where(("day__gte", 20))
+
+    def test__generate_cte_join(self):
+        sql, args = self.builder.select("name").on_table("users").with_cte(
+            "recent", self.recent
+        ).join("recent", "id", "user_id").where(("name__neq", "x")).sql()
+
+        self.assertEqual(
+            "WITH `recent` AS (SELECT `c`.`user_id` FROM `logins` AS `c` "
+            "WHERE (`c`.`day` >= %s)) "
+            "SELECT `a`.`name` FROM `users` AS `a` "
+            "INNER JOIN `recent` AS `b` ON `a`.`id` = `b`.`user_id` "
+            "WHERE (`a`.`name` <> %s)",
+            sql
+        )
+        self.assertEqual((20, "x"), args)
+
+    def test__generate_multiple_cte_in_where(self):
+        sql, args = self.builder.select("name").on_table("users").with_cte(
+            "recent", self.recent
+        ).with_cte(
+            "banned", self.builder.select("user_id").on_table("bans")
+        ).where(
+            ("id__in", self.builder.select("user_id").on_table("recent")),
+            ("id__not_in", self.builder.select("user_id").on_table("banned"))
+        ).sql()
+
+        self.assertEqual(
+            "WITH `recent` AS (SELECT `b`.`user_id` FROM `logins` AS `b` "
+            "WHERE (`b`.`day` >= %s)), "
+            "`banned` AS (SELECT `c`.`user_id` FROM `bans` AS `c`) "
+            "SELECT `a`.`name` FROM `users` AS `a` "
+            "WHERE (`a`.`id` IN (SELECT `d`.`user_id` FROM `recent` AS `d`)) "
+            "AND (`a`.`id` NOT IN (SELECT `e`.`user_id` FROM `banned` AS `e`))",
+            sql
+        )
+        self.assertEqual((20,), args)
+
+
+class SQLCompilerUnionTestCase(BaseTestCase):
+    def setUp(self):
+        super(SQLCompilerUnionTestCase, self).setUp()
+        self.events = self.builder.select("id", "ts").on_table(
+            "events"
+        ).where(("kind__eq", "click"))
+
+    def test__generate_union_all_shards(self):
+        sql, args = queryapi.union_all(*[
+            self.events.on_table("events_2026_{:02}".format(month))
+            for month in (1, 2, 3)
+        ]).order_by(DESC("ts")).limit(10).sql()
+
+        self.assertEqual(
+            "SELECT `a`.`id`, `a`.`ts` FROM `events_2026_01` AS `a` "
+            "WHERE (`a`.`kind` = %s) UNION ALL "
+            "SELECT `a`.`id`, `a`.`ts` FROM `events_2026_02` AS `a` "
+            "WHERE (`a`.`kind` = %s) UNION ALL "
+            "SELECT `a`.`id`, `a`.`ts` FROM `events_2026_03` AS `a` "
+            "WHERE (`a`.`kind` = %s) "
+            "ORDER BY `ts` DESC LIMIT %s",
+            sql
+        )
+        self.assertEqual(("click", "click", "click", 10), args)
+
+    def test__generate_union_all_shards_compiled_once(self):
+        query = queryapi.union_all(*[
+            self.events.on_table("events_{}".format(shard), schema="logs")
+            for shard in range(12)
+        ])
+
+        with patch.object(
+            SQLCompiler, '_raw_sql', autospec=True,
+            side_effect=SQLCompiler._raw_sql
+        ) as raw_sql:
+            sql, args = query.sql()
+
+        # the outer query and a single select
+        self.assertEqual(2, raw_sql.call_count)
+        self.assertIn("FROM `logs`.`events_11` AS `a`", sql)
+        self.assertEqual(("click",) * 12, args)
+
+    def test__generate_union_independent_shards_compiled_once(self):
+        query = queryapi.union_all(*[
+            self.builder.select("id", "ts").on_table(
+                "events_{}".format(shard)
+            ).where(("kind__in", ["click", "view"]), ("ts__gt", F("id") + 1))
+            for shard in range(3)
+        ] + [
+            self.builder.select("id", "ts").on_table("events_3").where(
+                ("kind__in", ["click", "view"]), ("ts__gt", F("id") + True)
+            ),
+        ])
+
+        with patch.object(
+            SQLCompiler, '_raw_sql', autospec=True,
+            side_effect=SQLCompiler._raw_sql
+        ) as raw_sql:
+            sql, args = query.sql()
+
+        # the outer query, the shards with the same conditions and the last
+        self.assertEqual(3, raw_sql.call_count)
+        self.assertIn("FROM `events_2` AS `a`", sql)
+        self.assertIn("FROM `events_3` AS `b`", sql)
+        self.assertEqual(
+            ("click", "view", 1) * 3 + ("click", "view", True), args
+        )
+        self.assertIs(True, args[-1])
+
+    def test__generate_union_different_selects(self):
+        sql, args = queryapi.union(
+            self.events.limit(5),
+            self.builder.select("id", "ts").on_table("archive")
+        ).sql()
+
+        self.assertEqual(
+            "(SELECT `a`.`id`, `a`.`ts` FROM `events` AS `a` "
+            "WHERE (`a`.`kind` = %s) LIMIT %s) UNION "
+            "SELECT `b`.`id`, `b`.`ts` FROM `archive` AS `b`",
+            sql
+        )
+        self.assertEqual(("click", 5), args)
+
+    def test__generate_union_ordered_branch_sqlite(self):
+        connection = sqlite3.connect(":memory:")
+        cursor = connection.cursor()
+        for table in ("events", "archive"):
+            cursor.execute("CREATE TABLE {} (id INTEGER, ts INTEGER, "
+                           "kind TEXT)".format(table))
+            cursor.executemany(
+                "INSERT INTO {} VALUES (?, ?, ?)".format(table),
+                [(i, i * 10, "click") for i in range(5)]
+            )
+
+        sql, args = queryapi.union_all(
+            self.events.order_by(DESC("ts")).limit(2),
+            self.events.on_table("archive").order_by("ts").limit(1)
+        ).sql(encoder=SQLiteEncodings())
+
+        self.assertEqual(
+            'SELECT * FROM (SELECT "a"."id", "a"."ts" FROM "events" AS "a" '
+            'WHERE ("a"."kind" = ?) ORDER BY "a"."ts" DESC LIMIT ?) UNION ALL '
+            'SELECT * FROM (SELECT "b"."id", "b"."ts" FROM "archive" AS "b" '
+            'WHERE ("b"."kind" = ?) ORDER BY "b"."ts" LIMIT ?)',
+            sql
+        )
+        self.assertEqual(
+            [(0, 0), (3, 30), (4, 40)],
+            sorted(cursor.execute(sql, args).fetchall())
+        )
+        connection.close()
+
+    def test__generate_union_validates_each_branch(self):
+        registry = SchemaRegistry()
+        for month in (1, 2):
+            registry.add_table("events_{}".format(month), [
+                Column("id"), Column("ts"), Column("kind"),
+            ])
+        registry.add_table("events_3", [
+            Column("id"), Column("ts"), Column("kind", adapt=str.upper)
+        ])
+        registry.add_table("events_4", [Column("id"), Column("ts")])
+
+        sql, args = queryapi.union_all(*[
+            self.events.on_table("events_{}".format(month))
+            for month in (1, 2, 3)
+        ]).sql(schema=registry)
+        self.assertEqual(("click", "click", "CLICK"), args)
+
+        with self.assertRaises(UnknownColumnException):
+            queryapi.union_all(*[
+                self.events.on_table("events_{}".format(month))
+                for month in (1, 4)
+            ]).sql(schema=registry)
+        with self.assertRaises(UnknownColumnException):
+            queryapi.union_all(*[
+                self.events.on_table(table) for table in ("events_1", "other")
+            ]).sql(schema=SchemaRegistry(strict=True))
+
+    def test__generate_union_with_where_raises(self):
+        with self.assertRaises(InvalidQueryException):
+            queryapi.union(self.events).where(("id__eq", 1)).sql()
+
+
 class SQLCompilerJoinTestCase(BaseTestCase):
     def test__generate_full_join_simple_select(self):
         compiler = self.builder.select(
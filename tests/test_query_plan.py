@@ -0,0 +1,153 @@
+import sqlite3
+
+from sqlquery.queryapi import select
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class QueryPlanTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryPlanTestCase, self).setUp()
+        self.query = select("id").on_table("users").where(
+            ("id__in", [1, 2, 3])
+        )
+
+    def test_plan_below_threshold_is_single_statement(self):
+        plan = self.query.plan(in_list_threshold=3)
+
+        self.assertEqual((), plan.setup)
+        self.assertEqual((), plan.teardown)
+        self.assertEqual(self.query.sql(), plan.query)
+        self.assertEqual([self.query.sql()], plan.statements())
+
+    def test_plan_values_strategy(self):
+        plan = self.query.plan(in_list_threshold=2)
+
+        self.assertEqual((), plan.setup)
+        self.assertEqual(
+            ("SELECT `a`.`id` FROM `users` AS `a` WHERE (`a`.`id` IN "
+             "(SELECT * FROM (VALUES ROW(%s), ROW(%s), ROW(%s)) AS `b`))",
+             (1, 2, 3)),
+            plan.query
+        )
+
+    def test_plan_temp_table_strategy(self):
+        plan = self.query.plan(
+            in_list_threshold=2, in_list_strategy="temp_table", batch_size=2
+        )
+
+        self.assertEqual(
+            (
+                ("CREATE TEMPORARY TABLE `_sqlquery_in_0` (`value` BIGINT)",
+                 ()),
+                ("INSERT INTO `_sqlquery_in_0` (`value`) VALUES (%s), (%s)",
+                 (1, 2)),
+                ("INSERT INTO `_sqlquery_in_0` (`value`) VALUES (%s)",
+                 (3,)),
+            ),
+            plan.setup
+        )
+        self.assertEqual(
+            ("SELECT `a`.`id` FROM `users` AS `a` WHERE (`a`.`id` IN "
+             "(SELECT `value` FROM `_sqlquery_in_0`))", ()),
+            plan.query
+        )
+        self.assertEqual(
+            (("DROP TEMPORARY TABLE `_sqlquery_in_0`", ()),),
+            plan.teardown
+        )
+
+    def test_plan_temp_table_type_skips_nulls(self):
+        plan = select("id").on_table("users").where(
+            ("name__in", [None, "a", "b"])
+        ).plan(in_list_threshold=2, in_list_strategy="temp_table")
+
+        self.assertEqual(
+            ("CREATE TEMPORARY TABLE `_sqlquery_in_0` (`value` VARCHAR(255))",
+             ()),
+            plan.setup[0]
+        )
+
+        with self.assertRaises(InvalidQueryException):
+            select("id").on_table("users").where(
+                ("name__in", [None, None, None])
+            ).plan(in_list_threshold=2, in_list_strategy="temp_table")
+        with self.assertRaises(InvalidQueryException):
+            select("id").on_table("users").where(
+                ("name__in", [object(), object(), object()])
+            ).plan(in_list_threshold=2, in_list_strategy="temp_table")
+
+    def test_plan_unknown_strategy_raises(self):
+        with self.assertRaises(InvalidQueryException):
+            self.query.plan(in_list_strategy="bogus")
+
+
+class QueryPlanSQLiteTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryPlanSQLiteTestCase, self).setUp()
+        self.connection = sqlite3.connect(":memory:")
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+        self.cursor.executemany(
+            "INSERT INTO users VALUES (?, ?)",
+            [(i, "user{}".format(i)) for i in range(100)]
+        )
+        self.ids = list(range(0, 100, 3))
+
+    def tearDown(self):
+        self.connection.close()
+        super(QueryPlanSQLiteTestCase, self).tearDown()
+
+    def _execute(self, builder, **options):
+        return builder.plan(
+            encoder=SQLiteEncodings(), in_list_threshold=10, **options
+        ).execute(self.cursor)
+
+    def test_select_each_strategy(self):
+        for strategy in ("values", "temp_table"):
+            rows = self._execute(
+                select("id").on_table("users").where(("id__in", self.ids)),
+                in_list_strategy=strategy,
+                batch_size=7
+            )
+
+            self.assertEqual(sorted(self.ids), sorted(r[0] for r in rows))
+
+    def test_not_in_subquery_temp_table(self):
+        rows = self._execute(
+            select("id").on_table("users").where(
+                ("id__not_in", select("id").on_table("users").where(
+                    ("id__in", self.ids)
+                ))
+            ),
+            in_list_strategy="temp_table"
+        )
+
+        self.assertEqual(100 - len(self.ids), len(rows))
+        self.assertTemporaryTablesDropped()
+
+    def test_failed_setup_drops_temporary_tables(self):
+        query = select("id").on_table("users").where(
+            ("id__in", self.ids + ["x", {}])
+        )
+        with self.assertRaises(sqlite3.Error):
+            self._execute(query, in_list_strategy="temp_table", batch_size=7)
+        self.assertTemporaryTablesDropped()
+
+        # the table can be created again
+        rows = self._execute(
+            select("id").on_table("users").where(("id__in", self.ids)),
+            in_list_strategy="temp_table"
+        )
+        self.assertEqual(len(self.ids), len(rows))
+
+    def assertTemporaryTablesDropped(self):
+        # the temporary table has been dropped
+        self.assertEqual(
+            [],
+            self.cursor.execute(
+                "SELECT name FROM sqlite_temp_master"
+            ).fetchall()
+        )
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import datetime
+import decimal
+import io
+import sqlite3
+
+from sqlquery.queryapi import select, insert, F
+from sqlquery.rendering import dump, render
+from sqlquery.sqlencoding import ANSIEncodings, BasicEncodings
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class EncodeLiteralTestCase(BaseTestCase):
+    def test_basic_literals(self):
+        encode = BasicEncodings().encode_literal
+        self.assertEqual(
+            [u"NULL", u"TRUE", u"FALSE", u"42", u"-1.5", u"1.50",
+             u"'2020-01-02 03:04:05.000006'", u"'2020-01-02'", u"'03:04:05'",
+             u"X'00ff'", u"X'6162'"],
+            [encode(value) for value in (
+                None, True, False, 42, -1.5, decimal.Decimal("1.50"),
+                datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+                datetime.date(2020, 1, 2), datetime.time(3, 4, 5),
+                bytearray(b"\x00\xff"), bytearray(b"ab"),
+            )]
+        )
+
+    def test_mysql_string_escaping(self):
+        self.assertEqual(
+            u"'it\\'s \\\"a\\\"\\n\\\\ \\0 \\Z é'",
+            BasicEncodings().encode_literal(u"it's \"a\"\n\\ \0 \x1a é")
+        )
+
+    def test_ansi_string_escaping(self):
+        encode = ANSIEncodings().encode_literal
+        self.assertEqual(u"'it''s \\ \"a\"'", encode(u"it's \\ \"a\""))
+        with self.assertRaises(ValueError):
+            encode(u"\0")
+
+    def test_binary_literals(self):
+        value = bytearray(b"\x01\xff")
+        self.assertEqual(
+            [u"X'01ff'", u"decode('01ff', 'hex')", u"X'01ff'"],
+            [encoder.encode_literal(value) for encoder in (
+                BasicEncodings(), ANSIEncodings(), SQLiteEncodings()
+            )]
+        )
+
+    def test_no_literal(self):
+        encode = BasicEncodings().encode_literal
+        for value in (float("nan"), decimal.Decimal("inf"), object()):
+            with self.assertRaises(ValueError):
+                encode(value)
+
+
+class RenderTestCase(BaseTestCase):
+    def test_render(self):
+        self.assertEqual(
+            u"SELECT `a`.`id` FROM `users` AS `a` "
+            u"WHERE (`a`.`name` = 'o\\'neil') AND (`a`.`age` IN (1,2))",
+            render(select("id").on_table("users").where(
+                ("name__eq", u"o'neil"), ("age__in", [1, 2])
+            ))
+        )
+
+    def test_render_modulo(self):
+        self.assertEqual(
+            u"SELECT `a`.`id` % 2 FROM `users` AS `a`",
+            render(select(F("id") % 2).on_table("users"))
+        )
+
+    def test_placeholder_mismatch(self):
+        with self.assertRaises(ValueError):
+            BasicEncodings().render_literals(u"SELECT %s", (1, 2))
+
+    def test_dump_batches_inserts(self):
+        output = io.StringIO()
+        statements = dump(
+            [insert(*[{"id": index, "name": u"x"} for index in range(5)])
+             .on_table("users")],
+            output,
+            batch_size=2
+        )
+
+        self.assertEqual(3, statements)
+        self.assertEqual(
+            u"INSERT INTO `users` (`id`, `name`) VALUES (0, 'x'), (1, 'x');\n"
+            u"INSERT INTO `users` (`id`, `name`) VALUES (2, 'x'), (3, 'x');\n"
+            u"INSERT INTO `users` (`id`, `name`) VALUES (4, 'x');\n",
+            output.getvalue()
+        )
+
+    def test_dump_sqlite_round_trip(self):
+        rows = [
+            {"id": 1, "name": u"it's", "data": bytearray(b"\x00\x01"),
+             "price": decimal.Decimal("2.50")},
+            {"id": 2, "name": None, "data": bytearray(b""),
+             "price": decimal.Decimal("0")},
+        ]
+        output = io.StringIO()
+        dump(
+            [insert(*rows).on_table("items")],
+            output,
+            encoder=SQLiteEncodings()
+        )
+
+        connection = sqlite3.connect(":memory:")
+        connection.execute(
+            "CREATE TABLE items (id INTEGER, name TEXT, data BLOB, price REAL)"
+        )
+        connection.executescript(output.getvalue())
+
+        self.assertEqual(
+            [(1, u"it's", b"\x00\x01", 2.5), (2, None, b"", 0)],
+            [
+                (row[0], row[1], bytes(row[2]), row[3]) for row in
+                connection.execute("SELECT * FROM items ORDER BY id")
+            ]
+        )
+        connection.close()
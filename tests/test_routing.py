@@ -0,0 +1,98 @@
+from sqlquery.queryapi import select, update, insert, delete, union
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.routing import ReadWriteRouter, statement_type
+
+from tests import BaseTestCase
+
+
+class FakePool(object):
+    def __init__(self, name):
+        self.name = name
+        self.executed = []
+
+    def __call__(self, query, args):
+        self.executed.append((query, args))
+        return self.name
+
+
+class ReadWriteRouterTestCase(BaseTestCase):
+    def setUp(self):
+        super(ReadWriteRouterTestCase, self).setUp()
+        self.now = 0
+        self.primary = FakePool("primary")
+        self.replicas = [FakePool("replica1"), FakePool("replica2")]
+        self.router = ReadWriteRouter(
+            self.primary, self.replicas, clock=lambda: self.now
+        )
+        self.read = select("id").on_table("users")
+        self.write = update(name="bob").on_table("users").where(("id__eq", 1))
+
+    def test_statement_type(self):
+        self.assertEqual(
+            ["select", "insert", "update", "delete", "select"],
+            [statement_type(builder) for builder in (
+                self.read,
+                insert({"id": 1}).on_table("users"),
+                self.write,
+                delete().on_table("users"),
+                union(self.read, self.read),
+            )]
+        )
+
+    def test_reads_use_replicas_in_turn(self):
+        self.assertEqual(
+            ["replica1", "replica2", "replica1", "primary"],
+            [
+                self.router.execute(self.read),
+                self.router.execute(self.read),
+                self.router.execute(self.read),
+                self.router.execute(self.write),
+            ]
+        )
+        self.assertEqual(
+            [("UPDATE `users` AS `a` SET `a`.`name` = %s "
+              "WHERE (`a`.`id` = %s)", ("bob", 1))],
+            self.primary.executed
+        )
+
+    def test_without_replicas(self):
+        router = ReadWriteRouter(self.primary)
+        self.assertEqual("primary", router.execute(self.read))
+
+    def test_session_sticks_to_primary_after_write(self):
+        session = self.router.session()
+        other_session = self.router.session()
+
+        self.assertEqual("replica1", session.execute(self.read))
+        self.assertEqual("primary", session.execute(self.write))
+        self.assertEqual("primary", session.execute(self.read))
+        self.assertEqual("replica2", other_session.execute(self.read))
+
+        self.now = 1000
+        self.assertEqual("primary", session.execute(self.read))
+
+    def test_sticky_for(self):
+        self.router.sticky_for = 5
+        session = self.router.session()
+        session.execute(self.write)
+
+        self.now = 4
+        self.assertEqual("primary", session.execute(self.read))
+        self.now = 5
+        self.assertEqual("replica1", session.execute(self.read))
+
+    def test_route_to_overrides(self):
+        session = self.router.session()
+        self.assertEqual(
+            "primary", session.execute(self.read.route_to("primary"))
+        )
+
+        session.execute(self.write)
+        self.assertEqual(
+            "replica1", session.execute(self.read.route_to("replica"))
+        )
+
+        with self.assertRaises(InvalidQueryException):
+            session.pool_for(self.write.route_to("replica"))
+        with self.assertRaises(InvalidQueryException):
+            self.read.route_to("elsewhere")
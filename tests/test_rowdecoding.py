@@ -0,0 +1,99 @@
+import array
+import sqlite3
+from unittest import skipIf
+
+from sqlquery import rowdecoding
+from sqlquery.queryapi import select, COUNT
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.rowdecoding import RowDecoder
+from sqlquery.schema import SchemaRegistry, Column
+from sqlquery.sqlencoding import SQLiteEncodings
+
+from tests import BaseTestCase
+
+
+class RowDecoderTestCase(BaseTestCase):
+    def setUp(self):
+        super(RowDecoderTestCase, self).setUp()
+        self.decoder = RowDecoder(("id", "score", "name"),
+                                  ("BIGINT", "DOUBLE PRECISION", None))
+        self.rows = [(1, 0.5, "a"), (2, 1.5, "b")]
+
+    def test_columns_from_select(self):
+        registry = SchemaRegistry()
+        registry.add_table("users", [Column("id", "BIGINT")])
+
+        decoder = select("id", "users.name").on_table(
+            "users"
+        ).row_decoder(schema=registry)
+        count_decoder = select(COUNT("name")).on_table(
+            "users"
+        ).row_decoder(schema=registry)
+
+        self.assertEqual(("id", "name"), decoder.columns)
+        self.assertEqual(("BIGINT", None), decoder.types)
+        self.assertEqual(("count_name",), count_decoder.columns)
+        self.assertEqual((None,), count_decoder.types)
+
+    def test_duplicate_columns_renamed(self):
+        decoder = RowDecoder(("id", "id", "class"))
+
+        self.assertEqual(("id", "_1", "_2"), decoder.fields)
+
+    def test_row_decoder_requires_select(self):
+        with self.assertRaises(InvalidQueryException):
+            self.builder.on_table("users").delete().row_decoder()
+
+    def test_namedtuples_and_records(self):
+        rows = self.decoder.namedtuples(self.rows)
+        records = self.decoder.records(self.rows)
+
+        self.assertEqual(self.rows, [tuple(row) for row in rows])
+        self.assertEqual(self.rows, [tuple(row) for row in records])
+        self.assertEqual("b", rows[1].name)
+        self.assertEqual("b", records[1].name)
+        self.assertFalse(hasattr(records[1], "__dict__"))
+        self.assertEqual(
+            [{"id": 1, "score": 0.5, "name": "a"},
+             {"id": 2, "score": 1.5, "name": "b"}],
+            self.decoder.dicts(self.rows)
+        )
+
+    def test_columnar(self):
+        columns = self.decoder.columnar(self.rows + [(None, 2.5, "c")])
+
+        self.assertEqual(["id", "score", "name"], list(columns))
+        self.assertEqual([1, 2, None], columns["id"])
+        self.assertEqual(array.array('d', [0.5, 1.5, 2.5]), columns["score"])
+        self.assertEqual(["a", "b", "c"], columns["name"])
+
+    @skipIf(rowdecoding.numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        columns = self.decoder.numpy(self.rows)
+
+        self.assertEqual([1, 2], columns["id"].tolist())
+        self.assertEqual(object, columns["name"].dtype)
+
+
+class RowDecoderSQLiteTestCase(BaseTestCase):
+    def test_iter_batches(self):
+        connection = sqlite3.connect(":memory:")
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+        cursor.executemany(
+            "INSERT INTO users VALUES (?, ?)",
+            [(i, "user{}".format(i)) for i in range(25)]
+        )
+        query = select("id").on_table("users").where(("id__lt", 20))
+        cursor.execute(*query.sql(encoder=SQLiteEncodings()))
+
+        batches = list(query.row_decoder().iter_batches(
+            cursor, container="columnar", batch_size=8
+        ))
+
+        self.assertEqual([8, 8, 4], [len(batch["id"]) for batch in batches])
+        self.assertEqual(
+            list(range(20)),
+            [value for batch in batches for value in batch["id"]]
+        )
+        connection.close()
@@ -0,0 +1,91 @@
+from sqlquery.queryapi import select, update, insert, COUNT
+from sqlquery.schema import SchemaRegistry, Column, UnknownColumnException
+from sqlquery.sqlencoding import ANSIEncodings
+
+from tests import BaseTestCase
+
+
+class SchemaRegistryTestCase(BaseTestCase):
+    def setUp(self):
+        super(SchemaRegistryTestCase, self).setUp()
+        self.registry = SchemaRegistry()
+        self.registry.add_table("users", [
+            Column("id", "BIGINT", indexed=True),
+            Column("name", "VARCHAR(64)", adapt=lambda name: name.lower()),
+            Column("score", "INTEGER"),
+        ])
+        self.registry.add_table("logins", [
+            Column("user_id", "BIGINT", indexed=True),
+            Column("day", "DATE"),
+        ], schema="audit")
+
+    def test_select_declared_columns(self):
+        sql, args = select("id", "users.name").on_table("users").join(
+            "logins", "id", "user_id", schema="audit"
+        ).where(
+            ("name__eq", "BOB"), ("logins.day__gte", "2026-01-01")
+        ).sql(schema=self.registry)
+
+        self.assertEqual(
+            "SELECT `a`.`id`, `a`.`name` FROM `users` AS `a` "
+            "INNER JOIN `audit`.`logins` AS `b` ON `a`.`id` = `b`.`user_id` "
+            "WHERE (`a`.`name` = %s) AND (`b`.`day` >= %s)",
+            sql
+        )
+        self.assertEqual(("bob", "2026-01-01"), args)
+
+    def test_unknown_columns_raise(self):
+        for builder in (
+            select("nmae").on_table("users"),
+            select(COUNT("nmae")).on_table("users"),
+            select("id").on_table("users").where(("nmae__eq", 1)),
+            select("id").on_table("users").order_by("nmae"),
+            update(nmae=1).on_table("users"),
+            insert(dict(nmae=1)).on_table("users"),
+            select("id").on_table("users").join(
+                "logins", "id", "uid", schema="audit"
+            ),
+        ):
+            with self.assertRaises(UnknownColumnException):
+                builder.sql(schema=self.registry)
+
+    def test_undeclared_tables(self):
+        self.assertEqual(
+            ("SELECT `a`.`anything` FROM `other` AS `a`", ()),
+            select("anything").on_table("other").sql(schema=self.registry)
+        )
+
+        with self.assertRaises(UnknownColumnException):
+            select("anything").on_table("other").sql(
+                schema=SchemaRegistry(strict=True)
+            )
+
+    def test_quoted_columns_per_encoder(self):
+        self.assertEqual(
+            ('UPDATE "users" AS "a" SET "a"."name" = %s', ("bob",)),
+            update(name="Bob").on_table("users").sql(
+                encoder=ANSIEncodings(), schema=self.registry
+            )
+        )
+        self.assertEqual(
+            ("INSERT INTO `users` (`name`) VALUES (%s)", ("bob",)),
+            insert(dict(name="Bob")).on_table("users").sql(
+                schema=self.registry
+            )
+        )
+
+    def test_in_list_adapted_and_typed(self):
+        plan = select("id").on_table("users").where(
+            ("name__in", ["A", "B"])
+        ).plan(
+            in_list_threshold=1,
+            in_list_strategy="temp_table",
+            schema=self.registry
+        )
+
+        self.assertEqual(
+            ("CREATE TEMPORARY TABLE `_sqlquery_in_0` (`value` VARCHAR(64))",
+             ()),
+            plan.setup[0]
+        )
+        self.assertEqual(("a", "b"), plan.setup[1][1])
@@ -0,0 +1,139 @@
+import datetime
+import decimal
+import json
+import pickle
+
+from sqlquery.queryapi import select, insert, update, union, Param
+from sqlquery.queryapi import AND, OR, COUNT, DESC, F, INSERTED, ROW_NUMBER
+from sqlquery.serialization import SerializationException
+from sqlquery.serialization import from_data, to_data, dumps, loads
+from sqlquery.sqlencoding import ANSIEncodings
+from sqlquery.templates import QueryTemplate
+
+from tests import BaseTestCase
+
+
+def upper(value):
+    return value.upper()
+
+
+class UTC(datetime.tzinfo):
+    def utcoffset(self, value):
+        return datetime.timedelta(0)
+
+    def dst(self, value):
+        return datetime.timedelta(0)
+
+
+class SerializationTestCase(BaseTestCase):
+    def _round_trip(self, builder):
+        loaded = loads(dumps(builder))
+        # Params compare by identity, hence the reprs
+        self.assertEqual(repr(builder.sql()), repr(loaded.sql()))
+        self.assertEqual(
+            repr(builder.sql(encoder=ANSIEncodings())),
+            repr(loaded.sql(encoder=ANSIEncodings()))
+        )
+
+    def test_select(self):
+        self._round_trip(
+            select("name").on_table("users", schema="app").where(
+                OR(("age__gte", 18), AND(("name__like", "b%"),
+                                         ("id__in", set([1, 2])))),
+                ("created__lt", datetime.datetime(2020, 1, 2, 3, 4, 5, 6)),
+                ("day__eq", datetime.date(2020, 1, 2)),
+                ("price__gt", decimal.Decimal("1.50")),
+                ("id__in", select("user_id").on_table("bans")),
+                (F("a") * 2 + 1, "gt", F("b")),
+            ).join("teams", "team_id", "id").group_by("name").having(
+                (COUNT(), "gt", 1)
+            ).order_by(DESC("name")).limit(Param("limit")).offset(5)
+        )
+
+    def test_window_union_and_cte(self):
+        self._round_trip(
+            select(ROW_NUMBER().over(partition_by="a", order_by=DESC("b")))
+            .on_table("t")
+        )
+        self._round_trip(
+            union(
+                select("id").on_table("a"), select("id").on_table("b")
+            ).order_by("id").limit(3)
+        )
+        self._round_trip(
+            select("id").on_table("recent").with_cte(
+                "recent", select("id").on_table("events").limit(10)
+            )
+        )
+
+    def test_mutations(self):
+        self._round_trip(
+            insert({"id": 1, "hits": 1}).on_table("pages").upsert(
+                "id", hits=F("hits") + INSERTED("hits")
+            )
+        )
+        self._round_trip(
+            update(hits=F("hits") + 1).on_table("pages").where(("id__eq", 1))
+        )
+        self._round_trip(
+            update(hits=0).on_table("pages").bulk_update(
+                "id", [(1, {"hits": 2}), (2, {"hits": 3})]
+            )
+        )
+
+    def test_template(self):
+        template = QueryTemplate.from_builder(
+            select("id").on_table("users").where(
+                ("name__eq", Param("name", adapt=upper)), ("active__eq", 1)
+            )
+        )
+        loaded = loads(dumps({"by_name": template}))["by_name"]
+
+        self.assertEqual(template.sql, loaded.sql)
+        self.assertEqual(template.bind(name="bob"), loaded.bind(name="bob"))
+        self.assertEqual(("BOB", 1), loaded.function()("bob")[1])
+
+    def test_plain_data(self):
+        data = to_data(select("id").on_table("users").where(("id__eq", 1)))
+
+        # only plain types, so any format can store it
+        self.assertEqual(data, json.loads(json.dumps(data)))
+        self.assertEqual(1, data["version"])
+
+    def test_dates_and_times(self):
+        for value in (
+            datetime.date(2020, 1, 2),
+            datetime.datetime(2020, 1, 2, 3, 4, 5),
+            datetime.datetime(2020, 1, 2, 3, 4, 5, 6),
+            datetime.time(3, 4, 5, 6),
+        ):
+            loaded = loads(dumps(value))
+            self.assertEqual(value, loaded)
+            self.assertIs(type(value), type(loaded))
+
+        # timezone aware values would lose their offset
+        for value in (
+            datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=UTC()),
+            datetime.time(3, 4, 5, tzinfo=UTC()),
+        ):
+            with self.assertRaises(SerializationException):
+                dumps(value)
+
+        with self.assertRaises(SerializationException):
+            from_data({"version": 1, "value": ["date", "2020-01-02T03:04"]})
+        with self.assertRaises(SerializationException):
+            from_data({"version": 1, "value": ["dec", "ten"]})
+
+    def test_invalid(self):
+        with self.assertRaises(SerializationException):
+            to_data(select("id").on_table("t").where(("id__eq", object())))
+        with self.assertRaises(SerializationException):
+            to_data(Param("x", adapt=lambda value: value))
+        with self.assertRaises(SerializationException):
+            from_data({"version": 2, "value": None})
+        with self.assertRaises(SerializationException):
+            from_data({"version": 1, "value": ["nope"]})
+        with self.assertRaises(SerializationException):
+            loads(pickle.dumps(
+                {"version": 1, "value": ["qd", {"unknown": 1}]}
+            ))
@@ -0,0 +1,82 @@
+from sqlquery.queryapi import select, update, insert, delete, OR
+from sqlquery.sharding import ShardRouter, UnroutableQueryException
+
+from tests import BaseTestCase
+
+
+class ShardRouterTestCase(BaseTestCase):
+    def setUp(self):
+        super(ShardRouterTestCase, self).setUp()
+        self.router = ShardRouter("tenant_id", lambda tenant_id: tenant_id % 4)
+
+    def _routed_sql(self, builder):
+        return [
+            (routed.shard, routed.query.sql())
+            for routed in self.router.route(builder)
+        ]
+
+    def test_route_eq(self):
+        self.assertEqual(
+            [(2, ("SELECT `a`.`id` FROM `users_2` AS `a` "
+                  "WHERE (`a`.`tenant_id` = %s) AND (`a`.`name` = %s)",
+                  (6, "bob")))],
+            self._routed_sql(
+                select("id").on_table("users").where(
+                    ("tenant_id__eq", 6), ("name__eq", "bob")
+                )
+            )
+        )
+
+    def test_route_in_splits_per_shard(self):
+        self.assertEqual(
+            [
+                (1, ("UPDATE `users_1` AS `a` SET `a`.`active` = %s "
+                     "WHERE (`a`.`tenant_id` IN (%s,%s))", (0, 1, 5))),
+                (2, ("UPDATE `users_2` AS `a` SET `a`.`active` = %s "
+                     "WHERE (`a`.`tenant_id` IN (%s))", (0, 2))),
+            ],
+            self._routed_sql(
+                update(active=0).on_table("users").where(
+                    ("tenant_id__in", [1, 2, 5])
+                )
+            )
+        )
+
+    def test_route_custom_table_and_schema(self):
+        router = ShardRouter(
+            "tenant_id",
+            lambda tenant_id: tenant_id // 100,
+            lambda table, shard: (table.name, "shard{}".format(shard))
+        )
+
+        [routed] = router.route(
+            delete().on_table("users").where(("users.tenant_id__eq", 201))
+        )
+
+        self.assertEqual(2, routed.shard)
+        self.assertEqual("shard2", routed.query._query_data.table.schema)
+        self.assertEqual("users", routed.query._query_data.table.name)
+
+    def test_route_insert_groups_rows(self):
+        routed = self._routed_sql(
+            insert(
+                dict(tenant_id=1, name="a"),
+                dict(tenant_id=2, name="b"),
+                dict(tenant_id=5, name="c"),
+            ).on_table("users")
+        )
+
+        self.assertEqual([1, 2], [shard for shard, _ in routed])
+        self.assertEqual((u"a", 1, u"c", 5), routed[0][1][1])
+        self.assertEqual((u"b", 2), routed[1][1][1])
+
+    def test_route_without_shard_key_raises(self):
+        for builder in (
+            select("id").on_table("users").where(("id__eq", 1)),
+            select("id").on_table("users").where(
+                OR(("tenant_id__eq", 1), ("id__eq", 1))
+            ),
+            insert(dict(name="a")).on_table("users"),
+        ):
+            with self.assertRaises(UnroutableQueryException):
+                self.router.route(builder)
@@ -0,0 +1,69 @@
+from sqlquery.queryapi import select, update, insert, Param
+from sqlquery.queryapi import InvalidQueryException
+from sqlquery.schema import SchemaRegistry, Column
+from sqlquery.templates import QueryTemplate, compile_query
+
+from tests import BaseTestCase
+
+
+class QueryTemplateTestCase(BaseTestCase):
+    def setUp(self):
+        super(QueryTemplateTestCase, self).setUp()
+        self.query = select("id").on_table("users").where(
+            ("name__eq", Param("name")), ("active__eq", 1)
+        ).limit(Param("limit")).offset(Param("offset"))
+        self.template = QueryTemplate.from_builder(self.query)
+
+    def test_template(self):
+        self.assertEqual(
+            "SELECT `a`.`id` FROM `users` AS `a` WHERE (`a`.`name` = %s) "
+            "AND (`a`.`active` = %s) OFFSET %s LIMIT %s",
+            self.template.sql
+        )
+        self.assertEqual(("name", "offset", "limit"), self.template.params)
+
+    def test_bind_and_function_match(self):
+        expected = (self.template.sql, ("bob", 1, 20, 10))
+        bind = self.template.function("users_by_name")
+
+        self.assertEqual(
+            expected, self.template.bind(name="bob", limit=10, offset=20)
+        )
+        self.assertEqual(expected, bind(name="bob", limit=10, offset=20))
+        self.assertEqual(expected, bind("bob", 20, 10))
+        self.assertEqual("users_by_name", bind.__name__)
+        self.assertEqual(("name", "offset", "limit"), bind.params)
+
+    def test_missing_values(self):
+        with self.assertRaises(InvalidQueryException):
+            self.template.bind(name="bob")
+
+        with self.assertRaises(TypeError):
+            self.template.function()(name="bob")
+
+    def test_repeated_param_and_constant_query(self):
+        bind = compile_query(update(a=Param("x"), b=Param("x")).on_table("t"))
+        constant = compile_query(select("id").on_table("t").where(
+            ("id__in", [1, 2])
+        ))
+
+        self.assertEqual((5, 5), bind(x=5)[1])
+        self.assertEqual((1, 2), constant()[1])
+
+    def test_params_adapted_by_schema(self):
+        registry = SchemaRegistry()
+        registry.add_table("t", [Column("name", adapt=lambda v: v.lower())])
+        template = QueryTemplate.from_builder(
+            insert(dict(name=Param("name"))).on_table("t"), schema=registry
+        )
+
+        self.assertEqual(("bob",), template.bind(name="BOB")[1])
+        self.assertEqual(("bob",), template.function()(name="BOB")[1])
+
+    def test_invalid_identifiers(self):
+        for name in ("class", "1x", "_x", "a-b"):
+            template = QueryTemplate.from_builder(
+                select("id").on_table("t").where(("id__eq", Param(name)))
+            )
+            with self.assertRaises(InvalidQueryException):
+                template.function()
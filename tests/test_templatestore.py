@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+
+from sqlquery.queryapi import select, Param
+from sqlquery.serialization import SerializationException
+from sqlquery.sqlencoding import SQLiteEncodings
+from sqlquery.templates import QueryTemplate
+from sqlquery.templatestore import TemplateStore, write_store
+
+from tests import BaseTestCase
+
+
+def by_name():
+    return QueryTemplate.from_builder(
+        select("id").on_table("users").where(
+            ("name__eq", Param("name")), ("active__eq", 1)
+        ).limit(Param("limit"))
+    )
+
+
+class TemplateStoreTestCase(BaseTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "templates")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_named(self):
+        templates = dict(
+            ("query_{}".format(index), QueryTemplate.from_builder(
+                select("id").on_table("table_{}".format(index)).where(
+                    ("id__eq", Param("id"))
+                )
+            ))
+            for index in range(50)
+        )
+        templates["user_by_name"] = by_name()
+        self.assertEqual(51, write_store(self.path, templates))
+
+        with TemplateStore(self.path) as store:
+            self.assertEqual(51, len(store))
+            self.assertEqual(sorted(templates), sorted(store.keys()))
+            for key, template in templates.items():
+                self.assertEqual(template.sql, store[key].sql)
+            self.assertIs(store["query_7"], store["query_7"])
+
+            self.assertIn("user_by_name", store)
+            self.assertNotIn("missing", store)
+            self.assertIsNone(store.get("missing"))
+            with self.assertRaises(KeyError):
+                store["missing"]
+
+            self.assertEqual(
+                by_name().bind(name="bob", limit=10),
+                store.function("user_by_name")(name="bob", limit=10)
+            )
+
+    def test_query_strings(self):
+        encoder = SQLiteEncodings()
+
+        def query(ids):
+            return select("id").on_table("users").where(("id__in", ids))
+
+        templates = [
+            QueryTemplate.from_builder(query(ids), encoder=encoder)
+            for ids in ([1, 2, 3], [1, 2, 3, 4, 5])
+        ]
+        self.assertEqual(2, write_store(self.path, templates))
+
+        with TemplateStore(self.path) as store:
+            # queries with as many values find the template of their length
+            for ids, template in (
+                ([4, 5, 6], templates[0]), ([5, 6, 7, 8, 9], templates[1])
+            ):
+                self.assertEqual(template, store.get_sql(
+                    query(ids).sql(encoder=encoder)[0]
+                ))
+            self.assertIsNone(
+                store.get_sql(query([1, 2]).sql(encoder=encoder)[0])
+            )
+
+        # the same query compiled twice is the same template
+        self.assertEqual(1, write_store(self.path, [by_name(), by_name()]))
+        with self.assertRaises(ValueError):
+            write_store(self.path, [
+                by_name(), QueryTemplate(by_name().sql, (1, 2, 3))
+            ])
+
+    def test_replace_while_open(self):
+        write_store(self.path, {"a": by_name()})
+        store = TemplateStore(self.path)
+        write_store(self.path, {"b": by_name()})
+
+        # the open store keeps the file it mapped
+        self.assertIn("a", store)
+        store.close()
+        with TemplateStore(self.path) as store:
+            self.assertEqual(["b"], store.keys())
+        self.assertEqual(["templates"], os.listdir(self.directory))
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as store_file:
+            store_file.write(b"not a template store")
+        with self.assertRaises(SerializationException):
+            TemplateStore(self.path)
+
+        write_store(self.path, {})
+        with TemplateStore(self.path) as store:
+            self.assertEqual(0, len(store))
+            self.assertIsNone(store.get("a"))